@@ -1,45 +1,207 @@
 from __future__ import print_function
 
+import os
+import re
 import subprocess
+import sys
+import time
 
+from buckle import completion_cache
+from buckle import dot_command_cache
+from buckle import index
+from buckle import parallel
 
-def find_commands_that_start_with(prefix, functions_only=False):
-    """ Returns a sorted list of the commands with the given prefix on the path.
+# Kinds of completion
+WORD = 'word'  # A candidate for the current word
+COMPLETION_COMMAND = 'completion'  # A command that prints candidates for a command's arguments
+
+# Overrides the seconds that completion commands are given on each completion
+COMPLETION_DEADLINE_ENV_VAR = 'BUCKLE_COMPLETION_DEADLINE'
+COMPLETION_DEADLINE = 0.5
+COMPLETION_REFRESH_TIMEOUT = 30  # Seconds each completion command is given in the background
+COMPLETION_TIMEOUT = 2  # Seconds given on each completion to those that can't be cached
+COMPLETION_MAX_RUNNING = 16  # Most completion commands run at the same time
+
+
+def _find_matches(commands, prefix, current_word):
+    """ Returns the candidates for the next word of a command whose names start with prefix. """
+    matches = []
+    for name, _, _ in commands.starting_with(prefix + current_word):
+        if re.search(r'\.completion(\..*)?$', name):
+            continue
+        if not current_word and name[len(prefix):].startswith(('_', '.')):
+            continue  # Only offered once the user has typed the '_' or '.'
+        match = name[len(prefix):].split('~', 1)[0]
+        if match and match not in matches:
+            matches.append(match)
+
+    # Include results for built-in buckle commands
+    builtin_prefix = index.BUILTIN_TOOLBELT_NAME + '-' + prefix + current_word
+    matches.extend(name for name, _, _ in commands.starting_with(builtin_prefix))
+    return matches
+
+
+def _get_namespace_path(words, cword):
+    """ Returns the namespace arguments before the current word, and whether "help" was given.
+
+    Ignores the first "help" and buckle options before the first namespace.
+    """
+    namespace_path = []
+    help_found = False
+    for arg in words[1:cword]:
+        if arg == 'help' and not help_found:
+            help_found = True
+        elif not (arg.startswith('-') and not namespace_path):  # Ignore buckle options
+            namespace_path.append(arg)
+    return namespace_path, help_found
+
+
+def _get_completion_commands(commands, toolbelt_name, namespace_path):
+    """ Returns (name, location) of the completion commands of the namespaces and command given. """
+    completion_commands = []
+    command_prefix = toolbelt_name + '-'
+    for segment in namespace_path:
+        completion_commands.extend((name, location) for name, _, location in
+                                   commands.starting_with(command_prefix + segment + '.completion'))
+        command_prefix += segment + '~'
+    return completion_commands
+
+
+def get_completions(toolbelt_name, words, cword, commands=None):
+    """ Returns the completions of a word of a toolbelt command line.
 
     Args:
-        prefix: String to match the beginning of commands in path to.
-        functions_only: Bool determining whether only functions are returned.
+        toolbelt_name: name of the toolbelt.
+        words: The words of the command line, beginning with the toolbelt name.
+        cword: The index in words of the word being completed.
+        commands: The CompiledIndex to complete from.  Defaults to the toolbelt's index for $PATH.
 
     Returns:
-        A sorted list of commands that start with the given prefix.
+        A list of (kind, value) in order, where kind is WORD for a candidate for the word or
+        COMPLETION_COMMAND for the name of a command whose output are candidates for the arguments
+        of a command.
     """
+    current_word = words[cword] if cword < len(words) else ''
+    namespace_path, help_found = _get_namespace_path(words, cword)
+
+    if commands is None:
+        commands = index.load_index(toolbelt_name)
+    prefix = toolbelt_name + '-' + ''.join(segment + '~' for segment in namespace_path)
+    completions = [(WORD, match) for match in _find_matches(commands, prefix, current_word)]
+
+    completions.extend((COMPLETION_COMMAND, name) for name, _ in
+                       _get_completion_commands(commands, toolbelt_name, namespace_path))
 
-    if functions_only is False:
-        opts = '-c'
-    else:
-        opts = 'abk -A function'
+    # Add in help if current word matches 'help' and a namespace has been completed prior to it
+    if not help_found and 'help'.startswith(current_word) and _find_matches(commands, prefix, ''):
+        completions.append((WORD, 'help'))
 
-    try:
-        results = subprocess.check_output('compgen {} "{}"'.format(opts, prefix),
-                                          shell=True, executable='/bin/bash').decode('utf-8')
-    except subprocess.CalledProcessError:
-        return []
-    else:
-        return sorted(results.split())
+    return completions
 
 
-def get_executables_starting_with(prefix=''):
-    """ Returns a list of executables that start with the given nd namespace.
+def _is_sourced(completion_command):
+    """ Returns whether the completion command is sourced by the shell rather than run. """
+    return re.search(r'\.(sh|bash)$', completion_command) is not None
+
+
+def _get_args(location):
+    # Run from bash, as they were by the shell, so that scripts without a shebang line still run
+    return ['bash', '-c', '"$0"', location]
+
+
+def _parse_candidates(output):
+    return output.decode('utf-8', 'replace').split()
+
+
+def refresh_in_background(toolbelt_name, words, cword, locations):
+    """ Starts running completion commands and caching their candidates in a detached process. """
+    environment = dict(os.environ)
+    # The session of the shell being completed in rather than of this process
+    environment[dot_command_cache.SESSION_ID_ENV_VAR] = dot_command_cache.get_session_id()
+    refresh_options = []
+    for location in locations:
+        refresh_options.extend(['--refresh', location])
+    with open(os.devnull, 'r+') as devnull:
+        subprocess.Popen(
+            [sys.executable, '-m', 'buckle.commands.complete'] + refresh_options +
+            [toolbelt_name, str(cword)] + list(words),
+            stdin=devnull, stdout=devnull, stderr=devnull, close_fds=True, preexec_fn=os.setsid,
+            env=environment)
+
+
+def refresh_completion_commands(words, cword, locations):
+    """ Runs completion commands that can be cached and caches the candidates they print. """
+    preceding_words = words[:cword]
+    for i, output in parallel.iter_outputs([_get_args(location) for location in locations],
+                                           COMPLETION_REFRESH_TIMEOUT, COMPLETION_MAX_RUNNING):
+        if output is not None:
+            completion_cache.save(locations[i], preceding_words, _parse_candidates(output))
+
+
+def get_argument_completions(toolbelt_name, words, cword, deadline=None):
+    """ Returns the completions of a command's argument given by its completion commands.
+
+    Completion commands are run at the same time, with the environment given, which is expected
+    to hold the COMP_WORDS and COMP_CWORD of the shell.  Their candidates are in the order of the
+    completion commands, whichever finishes first.  Those that can be cached give their cached
+    candidates while these are fresh.  Those that can be cached but don't finish by the deadline
+    give their last cached candidates, or none, and are run again in the background for next time.
+    Those that can't be cached are waited for, deadline or not, for up to COMPLETION_TIMEOUT
+    seconds, after which they give none.  The candidates of cached completion commands are
+    filtered by the current word.
 
     Args:
-        prefix: String prefix to match the beginning of executables in path to.
+        toolbelt_name: name of the toolbelt.
+        words: The words of the command line, beginning with the toolbelt name.
+        cword: The index in words of the word being completed.
+        deadline: Time in seconds since the epoch to stop waiting for completion commands that
+            can be cached at, or None to wait for all of them.
 
     Returns:
-        A sorted list of all executables in the given nd namespace.
+        A list of (kind, value) in order, where kind is WORD for a candidate for the word or
+        COMPLETION_COMMAND for the name of a completion command that the shell must source.
     """
+    current_word = words[cword] if cword < len(words) else ''
+    preceding_words = words[:cword]
+    namespace_path, _ = _get_namespace_path(words, cword)
+    commands = index.load_index(toolbelt_name)
+    completion_commands = _get_completion_commands(commands, toolbelt_name, namespace_path)
+
+    candidates = [[] for _ in completion_commands]
+    cacheable = [False] * len(completion_commands)
+    uncached = []
+    for i, (name, location) in enumerate(completion_commands):
+        if _is_sourced(name):
+            continue
+        cacheable[i] = completion_cache.is_cacheable(location)
+        cached = completion_cache.load(location, preceding_words) if cacheable[i] else None
+        if cached:
+            candidates[i] = cached[0]
+        if not cached or not cached[1]:
+            uncached.append(i)
+
+    finished = set()
+    timeout_deadline = time.time() + COMPLETION_TIMEOUT
+    deadlines = [deadline if cacheable[i] else timeout_deadline for i in uncached]
+    for i, output in parallel.iter_outputs(
+            [_get_args(completion_commands[i][1]) for i in uncached], COMPLETION_REFRESH_TIMEOUT,
+            COMPLETION_MAX_RUNNING, deadline=deadlines):
+        i = uncached[i]
+        finished.add(i)
+        if output is None:
+            continue
+        candidates[i] = _parse_candidates(output)
+        if cacheable[i]:
+            completion_cache.save(completion_commands[i][1], preceding_words, candidates[i])
 
-    commands_list = find_commands_that_start_with(prefix)
-    functions_list = find_commands_that_start_with(prefix, functions_only=True)
+    pending = [completion_commands[i][1] for i in uncached if i not in finished and cacheable[i]]
+    if pending:
+        refresh_in_background(toolbelt_name, words, cword, pending)
 
-    namespace_executables = set(commands_list) - set(functions_list)
-    return sorted(list(namespace_executables))
+    completions = []
+    for i, (name, _) in enumerate(completion_commands):
+        if _is_sourced(name):
+            completions.append((COMPLETION_COMMAND, name))
+        completions.extend((WORD, candidate) for candidate in candidates[i]
+                           if not cacheable[i] or candidate.startswith(current_word))
+    return completions
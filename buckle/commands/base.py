@@ -14,6 +14,11 @@ import subprocess
 import sys
 import time
 
+from buckle import compiled_index
+from buckle import dispatch
+from buckle import dot_command_cache
+from buckle import index
+from buckle import parallel as parallel_commands
 from buckle import system_clock
 from buckle import message
 from buckle import path as toolbelt_path
@@ -34,10 +39,18 @@ extend the {toolbelt_name} Toolbelt.\
 """
 
 
+# Dot commands run at the same time as the others in their namespace, or as all the others
+PARALLEL_DOT_COMMANDS_CHOICES = ('namespace', 'all')
+
+
 class Command(object):
     def __init__(self, toolbelt_name):
         self._toolbelt_name = toolbelt_name
         self._message_sender = message.Sender(prefix=self._toolbelt_name + ':')
+        self._parser = None
+        self._parsed_args = {}  # Parse results keyed on the arguments, including BUCKLE_OPTS
+        self._buckle_root = None
+        self._commands = None  # CompiledIndex of the toolbelt's and the builtin commands
 
     @property
     def message(self):
@@ -47,19 +60,16 @@ class Command(object):
     def toolbelt_name(self):
         return self._toolbelt_name
 
-    def parse_args(self, argv, known_only=True):
-        """
+    def _get_commands(self):
+        """ Returns the index of the toolbelt's and the builtin commands, loaded once. """
+        if self._commands is None:
+            self._commands = index.load_index(self.toolbelt_name)
+        return self._commands
 
-        Args:
-            argv: args excluding program name
-            known_only: allow only arguments known to this version buckle
-
-        Returns:
-            Tuple:
-                - toolbelt name (buckle or BUCKLE_TOOLBELT_NAME)
-                - args
+    def _get_parser(self):
+        if self._parser is not None:
+            return self._parser
 
-        """
         parser = argparse.ArgumentParser(
             prog=self.toolbelt_name,
             formatter_class=argparse.ArgumentDefaultsHelpFormatter,
@@ -84,6 +94,10 @@ class Command(object):
 
         parser.add_argument('--skip-dot-commands', action='store_true',
                             help='Do not run dot commands.')
+        parser.add_argument('--parallel-dot-commands', choices=PARALLEL_DOT_COMMANDS_CHOICES,
+                            help='Run the dot commands of each namespace at the same time, or all '
+                                 'of them at the same time if they are independent.  Their output '
+                                 'is grouped by command.')
 
         parser.add_argument('namespace', nargs='*', default=[],
                             help='The namespace path of the command to run.')
@@ -92,37 +106,75 @@ class Command(object):
         parser.add_argument('args', nargs=argparse.REMAINDER,
                             help='Arguments to pass to the command')
 
+        self._parser = parser
+        return parser
+
+    def parse_args(self, argv, known_only=True):
+        """ Parses the arguments and resolves the command to run.
+
+        The arguments are parsed and resolved only once per process.  Later calls with the same
+        arguments reuse the result.
+
+        Args:
+            argv: args excluding program name
+            known_only: allow only arguments known to this version buckle
+
+        Returns:
+            Tuple:
+                - toolbelt name (buckle or BUCKLE_TOOLBELT_NAME)
+                - args, including the absolute path of the command's executable as
+                  args.executable, or None if it couldn't be found
+
+        """
+        parser = self._get_parser()
         args_with_opts = (shlex.split(os.getenv('BUCKLE_OPTS_' + self.toolbelt_name.upper(), '')) +
                           list(argv))
 
-        if known_only:
-            args = parser.parse_args(args_with_opts)
+        key = tuple(args_with_opts)
+        parsed = self._parsed_args.get(key)
+        if parsed:
+            toolbelt, args, unknown_args = parsed
         else:
-            args = parser.parse_known_args(args_with_opts)[0]
+            args, unknown_args = parser.parse_known_args(args_with_opts)
 
+        if known_only and unknown_args:
+            parser.error('unrecognized arguments: {}'.format(' '.join(unknown_args)))
+
+        if not parsed:
+            toolbelt = self._resolve(args)
+            self._parsed_args[key] = (toolbelt, args, unknown_args)
+
+        return toolbelt, args
+
+    def _resolve(self, args):
+        """ Resolves the command to run from the parsed arguments, updating them in place.
+
+        Returns:
+            The toolbelt name (buckle or BUCKLE_TOOLBELT_NAME)
+        """
         all_args = args.namespace + list(filter(None, [args.command])) + args.args
 
-        command = None
-        toolbelt = self.toolbelt_name
+        commands = self._get_commands()
         try:
-            namespace, command, command_args = toolbelt_path.split_path_and_command(
-                self.toolbelt_name, all_args)
+            toolbelt, namespace, command, command_args = self._split_path_and_command(
+                all_args, commands)
         except toolbelt_path.CommandOrNamespaceNotFound as original_exception:
-            try:
-                # Now search builtin commands
-                namespace, command, command_args = toolbelt_path.split_path_and_command(
-                    BUILTIN_TOOLBELT_NAME, all_args)
+            # Send help commands to help
+            if original_exception.path[-1] == 'help':
+                namespace = list(original_exception.path[:-1])
+                # Let help to deal with the extra args
+                extra_args = all_args[len(original_exception.path):]
                 toolbelt = BUILTIN_TOOLBELT_NAME
-            except toolbelt_path.CommandOrNamespaceNotFound:
-                # Send help commands to help
-                if original_exception.path[-1] == 'help':
-                    namespace = list(original_exception.path[:-1])
-                    # Let help to deal with the extra args
-                    extra_args = all_args[len(original_exception.path):]
-                    toolbelt = BUILTIN_TOOLBELT_NAME
-                    namespace, command, command_args = ([], 'help', namespace + extra_args)
-                else:
-                    sys.exit(self.message.format_error(str(original_exception)))
+                namespace, command, command_args = ([], 'help', namespace + extra_args)
+            else:
+                # Making a command executable doesn't change its directory's modification time,
+                # so the index may not know of it yet
+                commands = self._commands = index.build_index(self.toolbelt_name, rescan=True)
+                try:
+                    toolbelt, namespace, command, command_args = self._split_path_and_command(
+                        all_args, commands)
+                except toolbelt_path.CommandOrNamespaceNotFound as e:
+                    sys.exit(self.message.format_error(str(e)))
 
         # Call help on the namespace if we have no command
         if not command:
@@ -131,88 +183,180 @@ class Command(object):
 
         args.namespace, args.command, args.args = (namespace, command, command_args)
 
-        return toolbelt, args
+        # Use builtin version if available
+        name = '-{}'.format('~'.join(namespace + [command]))
+        args.executable = (self._find_executable(commands, BUILTIN_TOOLBELT_NAME + name) or
+                           self._find_executable(commands, toolbelt + name))
+
+        return toolbelt
+
+    def _split_path_and_command(self, all_args, commands):
+        """ Splits the arguments into a toolbelt's namespace, command and command arguments.
+
+        Returns:
+            Tuple of the toolbelt name, namespace, command and command arguments.  The toolbelt's
+            commands are searched before the builtin commands.
+
+        Raises:
+            CommandOrNamespaceNotFound for the toolbelt's commands if neither has the command.
+        """
+        try:
+            return (self.toolbelt_name,) + tuple(toolbelt_path.split_path_and_command(
+                self.toolbelt_name, all_args, commands=commands))
+        except toolbelt_path.CommandOrNamespaceNotFound as original_exception:
+            try:
+                # Now search builtin commands
+                return (BUILTIN_TOOLBELT_NAME,) + tuple(toolbelt_path.split_path_and_command(
+                    BUILTIN_TOOLBELT_NAME, all_args, commands=commands))
+            except toolbelt_path.CommandOrNamespaceNotFound:
+                raise original_exception
+
+    @staticmethod
+    def _find_executable(commands, name):
+        entry = commands.get(name)
+        if entry and entry[0] & compiled_index.COMMAND:
+            return entry[1]
+        return None
+
+    def _get_buckle_root(self):
+        if self._buckle_root is None:
+            self._buckle_root = os.getenv('BUCKLE_ROOT', '')
+
+            # Get the repo location from pip if it isn't already defined
+            if not self._buckle_root:
+                output = subprocess.check_output(
+                    'pip show buckle --disable-pip-version-check', shell=True).decode('utf-8')
+                matches = re.search("Location:\s+(/\S+)", output)
+                if matches:
+                    self._buckle_root = matches.group(1)
+
+        return self._buckle_root
+
+    def _get_next_update_time(self, args):
+        """ Returns the time in seconds since the epoch that buckle is next due to be updated.
+
+        Returns 0 if an update is due now, or None if buckle won't be updated.
+        """
+        if args.skip_update or not (args.auto_update or args.force_update):
+            return None
+
+        buckle_root = self._get_buckle_root()
+        if not buckle_root:
+            return None
+        if args.force_update:
+            return 0
+
+        try:
+            return os.path.getmtime(buckle_root + '/.updated') + args.update_freq
+        except OSError:  # File doesn't exist
+            return 0
+
+    def _parse_toolbelt_opts(self):
+        """ Returns the args and unknown args of just the options in $BUCKLE_OPTS_<TOOLBELT>. """
+        opts = shlex.split(os.getenv('BUCKLE_OPTS_' + self.toolbelt_name.upper(), ''))
+        return self._get_parser().parse_known_args(opts)
+
+    def get_next_check_time(self):
+        """ Returns when an update or clock check is next due for a run without arguments.
+
+        Only the options in $BUCKLE_OPTS_<TOOLBELT> are taken into account.
+
+        Returns:
+            The time in seconds since the epoch, 0 if a check is due now, or None if no checks
+            will be made.
+        """
+        args, unknown_args = self._parse_toolbelt_opts()
+        if unknown_args:
+            return 0
+
+        check_times = [self._get_next_update_time(args)]
+        if args.clock_check and not args.skip_clock_check:
+            check_times.append(system_clock.get_next_check_time(args.check_clock_freq))
+        check_times = [t for t in check_times if t is not None]
+        return min(check_times) if check_times else None
 
     def maybe_reload_with_updates(self, argv):
         # Allow unknown arguments if they may be present in future versions of nd
         _, known_args = self.parse_args(argv, known_only=False)
 
-        if known_args.skip_update or not (known_args.auto_update or known_args.force_update):
+        next_update_time = self._get_next_update_time(known_args)
+        if next_update_time is None or time.time() < next_update_time:
             return
 
-        buckle_root = os.getenv('BUCKLE_ROOT')
+        buckle_root = self._get_buckle_root()
+        updated_path = buckle_root + '/.updated'
+        subprocess.check_output(['touch', updated_path])
+        self.message.info('Checking for buckle updates...')
 
-        # Get the repo location from pip if it isn't already defined
-        if not buckle_root:
-            output = subprocess.check_output(
-                'pip show buckle --disable-pip-version-check', shell=True).decode('utf-8')
-            matches = re.search("Location:\s+(/\S+)", output)
-            if matches:
-                buckle_root = matches.group(1)
-
-        if buckle_root:
-            updated_path = buckle_root + '/.updated'
+        # Disable password prompt
+        env = os.environ.copy()
+        env.update({'GIT_ASKPASS': '/bin/echo'})
+
+        branch = subprocess.check_output(
+            'git rev-parse --abbrev-ref HEAD', cwd=buckle_root, shell=True).decode(
+            'utf-8')
+        process = subprocess.Popen('git pull origin {}'.format(branch),
+                                   cwd=buckle_root,
+                                   shell=True, stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, close_fds=True, env=env)
+        output = process.stdout.read().decode('utf-8')
+        process.communicate()  # Collect the return code
+
+        if 'Already up-to-date.' not in output and process.returncode == 0:
+            self.message.info('Installing new buckle version...')
+            # Install the new version
+            subprocess.check_output('pip install -e .', cwd=buckle_root, shell=True)
+
+            flush_file_descriptors()
+
+            env = os.environ.copy()
+            env['BUCKLE_TOOLBELT_NAME'] = self.toolbelt_name
+            # Hand off to new version
+            os.execvpe(BUILTIN_TOOLBELT_NAME,
+                       [BUILTIN_TOOLBELT_NAME] + argv, env=env)
+        elif process.returncode != 0:
+            self.message.error('Unable to update repository.')
+
+    def run_dot_commands(self, namespaces, command, args, parallel=None):
+        """ Runs the dot commands in each namespace of the command, starting from the toolbelt's.
 
+        Args:
+            namespaces: The namespace path of the command.
+            command: The name of the command.
+            args: The arguments to the command.
+            parallel: None to run the dot commands one at a time, 'namespace' to run those in each
+                namespace at the same time, or 'all' to run all of them at the same time.
+        """
+        prefixes = [self.toolbelt_name + '-' + ''.join(ns + '~' for ns in namespaces[:depth])
+                    for depth in range(len(namespaces) + 1)]
+        # Dot commands that succeeded recently enough, by their own declaration, are skipped
+        groups = [[(dot_command, location) for dot_command, location in group
+                   if not dot_command_cache.is_cached(location)]
+                  for group in self._get_commands().dot_commands(prefixes)]
+
+        if parallel == 'all':
+            groups = [sum(groups, [])]
+
+        dot_command_args = [' '.join(namespaces + [command])] + args
+        for group in groups:
             try:
-                updated_creation_date = os.path.getmtime(updated_path)
-            except OSError:  # File doesn't exist
-                needs_update = True
-            else:
-                current_time = time.time()
-                needs_update = (current_time - updated_creation_date) >= known_args.update_freq
-
-            if needs_update or known_args.force_update:
-                subprocess.check_output(['touch', updated_path])
-                self.message.info('Checking for buckle updates...')
-
-                # Disable password prompt
-                env = os.environ.copy()
-                env.update({'GIT_ASKPASS': '/bin/echo'})
-
-                branch = subprocess.check_output(
-                    'git rev-parse --abbrev-ref HEAD', cwd=buckle_root, shell=True).decode(
-                    'utf-8')
-                process = subprocess.Popen('git pull origin {}'.format(branch),
-                                           cwd=buckle_root,
-                                           shell=True, stdin=subprocess.PIPE,
-                                           stdout=subprocess.PIPE,
-                                           stderr=subprocess.STDOUT, close_fds=True, env=env)
-                output = process.stdout.read().decode('utf-8')
-                process.communicate()  # Collect the return code
-
-                if 'Already up-to-date.' not in output and process.returncode == 0:
-                    self.message.info('Installing new buckle version...')
-                    # Install the new version
-                    subprocess.check_output('pip install -e .', cwd=buckle_root, shell=True)
-
-                    flush_file_descriptors()
-
-                    env = os.environ.copy()
-                    env['BUCKLE_TOOLBELT_NAME'] = self.toolbelt_name
-                    # Hand off to new version
-                    os.execvpe(BUILTIN_TOOLBELT_NAME,
-                               [BUILTIN_TOOLBELT_NAME] + argv, env=env)
-                elif process.returncode != 0:
-                    self.message.error('Unable to update repository.')
-
-    def run_dot_commands(self, namespaces, command, args):
-        for depth, namespace in enumerate([''] + namespaces):
-            prefix = self.toolbelt_name + '-' + ''.join(ns + '~' for ns in namespaces[:depth])
-            try:
-                matches = subprocess.check_output('compgen -c "{}."'.format(prefix),
-                                                  shell=True, executable='/bin/bash').decode(
-                    'utf-8')
-            except subprocess.CalledProcessError:
-                continue  # No dot commands in current namespace
-
-            for dot_command in sorted(set(matches.split())):  # Duplicates removed
-                try:
-                    subprocess.check_call([dot_command] + [' '.join(namespaces + [command])] + args)
-                except subprocess.CalledProcessError:
-                    sys.exit(self.message.format_error(
-                        "Dot command '{}' failed.".format(dot_command)))
+                if parallel and len(group) > 1:
+                    parallel_commands.check_call_all([[dot_command] + dot_command_args
+                                                      for dot_command, _ in group])
+                    for _, location in group:
+                        dot_command_cache.record_success(location)
+                else:
+                    for dot_command, location in group:
+                        subprocess.check_call([dot_command] + dot_command_args)
+                        dot_command_cache.record_success(location)
+            except subprocess.CalledProcessError as e:
+                sys.exit(self.message.format_error(
+                    "Dot command '{}' failed.".format(e.cmd[0])))
 
     def run(self, argv):
+        fast_dispatch = os.environ.pop(dispatch.FAST_DISPATCH_ENV_VAR, None)
+
         toolbelt, args = self.parse_args(argv, known_only=False)
         self.maybe_reload_with_updates(argv)
 
@@ -220,23 +364,27 @@ class Command(object):
         if args.clock_check and not args.skip_clock_check:
             system_clock.check_system_clock(self.message, args.check_clock_freq)
 
+        if fast_dispatch:
+            # Let the shell's fast path handle the next run itself
+            dispatch.write_table(self.toolbelt_name, self._get_commands(),
+                                 os.getenv('BUCKLE_OPTS_' + self.toolbelt_name.upper(), ''),
+                                 self.get_next_check_time(),
+                                 self._parse_toolbelt_opts()[0].parallel_dot_commands)
+
         if not args.skip_dot_commands and not args.command.startswith('.'):
-            self.run_dot_commands(args.namespace, args.command, args.args)
+            self.run_dot_commands(args.namespace, args.command, args.args,
+                                  parallel=args.parallel_dot_commands)
 
         flush_file_descriptors()
-        command = '-{}'.format('~'.join(args.namespace + [args.command]))
-        path = toolbelt + command
-        # Use builtin version if available
-        buckle_path = BUILTIN_TOOLBELT_NAME + command
-        try:
-            subprocess.check_output('type ' + buckle_path, shell=True, stderr=subprocess.STDOUT)
-            path = buckle_path
-        except subprocess.CalledProcessError:
-            pass
+        if not args.executable:
+            command = '{}-{}'.format(toolbelt, '~'.join(args.namespace + [args.command]))
+            sys.exit(self.message.format_error("Command '{}' could not be run".format(command)))
+        path = os.path.basename(args.executable)
+
         env = os.environ.copy()
         env['BUCKLE_TOOLBELT_NAME'] = self.toolbelt_name
         try:
-            os.execvpe(path, [path] + args.args, env=env)  # Hand off to sub command
+            os.execve(args.executable, [path] + args.args, env)  # Hand off to sub command
         except OSError:
             sys.exit(self.message.format_error("Command '{}' could not be run".format(path)))
 
@@ -0,0 +1,100 @@
+""" buckle _complete command
+
+Prints the bash completions of a word of a toolbelt command line.
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+from buckle import autocomplete
+from buckle import index
+
+HELP_DESCRIPTION = """\
+Prints the completions of a word of a toolbelt command line for the bash completion hook.
+
+Each line is a kind and a value separated by a tab.  The kind is 'word' for a candidate for the
+word, or 'completion' for the name of a command that prints candidates for a command's arguments.
+
+With --serve, requests are read from standard input until it ends instead, one per line, and
+each is answered with the lines that would be printed for it followed by an empty line.  A request
+is the working directory, search path, toolbelt name, index of the word and words of the command
+line, separated by tabs.  Relative directories in the search path are relative to the working
+directory.
+
+With --run-completion-commands, the completion commands are run instead, with the COMP_WORDS and
+COMP_CWORD in the environment, and their candidates are printed as words.  Only those that the
+shell must source are left named.\
+"""
+
+
+def serve(requests, responses):
+    """ Answers completion requests until there are no more, keeping the indexes they use loaded.
+
+    Args:
+        requests: A file to read requests from, one per line.
+        responses: A file to write the answer to each request to.
+    """
+    indexes = {}  # CompiledIndex by toolbelt name and search path
+    for request in iter(requests.readline, ''):
+        completions = []
+        fields = request.rstrip('\n').split('\t')
+        if len(fields) >= 4 and fields[3].isdigit():
+            # The shell may have changed directory since the server started
+            search_path = index.resolve_path(fields[1], fields[0])
+            toolbelt_name, cword, words = fields[2], int(fields[3]), fields[4:]
+            commands = indexes.get((toolbelt_name, search_path))
+            if commands is None or not index.is_current(commands, toolbelt_name, search_path):
+                commands = index.load_index(toolbelt_name, search_path)
+                indexes[(toolbelt_name, search_path)] = commands
+            completions = autocomplete.get_completions(toolbelt_name, words, cword, commands)
+
+        for kind, value in completions:
+            responses.write('{}\t{}\n'.format(kind, value))
+        responses.write('\n')
+        responses.flush()
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter, description=HELP_DESCRIPTION)
+    parser.add_argument('--run-completion-commands', action='store_true',
+                        help='print the candidates of the completion commands for the word')
+    parser.add_argument('--serve', action='store_true',
+                        help='answer completion requests from standard input')
+    parser.add_argument('--refresh', action='append', help=argparse.SUPPRESS)
+    parser.add_argument('toolbelt_name', nargs='?', help='name of the toolbelt')
+    parser.add_argument('cword', nargs='?', type=int,
+                        help='index of the word to complete, as COMP_CWORD')
+    parser.add_argument('words', nargs=argparse.REMAINDER,
+                        help='words of the command line, as COMP_WORDS')
+    args = parser.parse_args(argv[1:])
+
+    if args.serve:
+        serve(sys.stdin, sys.stdout)
+        return
+    if args.toolbelt_name is None or args.cword is None:
+        parser.error('the toolbelt name and index of the word to complete are required')
+
+    if args.refresh:
+        # Cache the candidates of completion commands that didn't finish in time for a completion
+        autocomplete.refresh_completion_commands(args.words, args.cword, args.refresh)
+        return
+
+    if args.run_completion_commands:
+        deadline = time.time() + float(os.getenv(autocomplete.COMPLETION_DEADLINE_ENV_VAR,
+                                                 autocomplete.COMPLETION_DEADLINE))
+        completions = autocomplete.get_argument_completions(args.toolbelt_name, args.words,
+                                                            args.cword, deadline)
+    else:
+        completions = autocomplete.get_completions(args.toolbelt_name, args.words, args.cword)
+    for kind, value in completions:
+        print('{}\t{}'.format(kind, value))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -10,17 +10,18 @@ import argparse
 import os
 import re
 import shlex
+import subprocess
 import sys
+import time
 
-from buckle import autocomplete
+from buckle import help_cache
 from buckle import help_formatters
+from buckle import help_search
+from buckle import index
 from buckle import message
+from buckle import parallel
 from buckle import path as toolbelt_path
-
-if os.name == 'posix' and sys.version_info[0] < 3:
-    import subprocess32 as subprocess
-else:
-    import subprocess
+from buckle import static_help
 
 HELP_DESCRIPTION = """\
 {toolbelt_upper} Toolbelt Help
@@ -29,6 +30,11 @@ Showing help for {tool_names}\
 """
 
 HELP_TIMEOUT = 2  # Seconds before we terminate --help run
+HELP_MAX_RUNNING = 16  # Most --help runs at the same time
+HELP_BUDGET = 5  # Seconds before help stops waiting for commands' --help runs
+HELP_PENDING = '<help pending>'  # Shown for commands that haven't answered within the budget
+
+NAMESPACE_DESCRIPTION = '<namespace of {count} commands>'
 
 TOOLBELT_DESCRIPTION = """\
 For more details about the toolbelt, run '{toolbelt} readme'.
@@ -41,40 +47,164 @@ def truncate(s, length=75):
     return s[:length - 3] + (s[length - 3:] and '...')
 
 
-def print_help_for_all_commands(toolbelt_name, parser, args, path=()):
+def parse_help_description(help_output):
+    """ Returns the first paragraph of --help output that is not empty or a usage line, if any. """
+    return next((
+        paragraph.replace('\n', '')
+        for paragraph in re.split('\n\s*\n', help_output)
+        if paragraph.strip() and not paragraph.startswith('usage: ')), None)
+
+
+def describe_in_background(commands):
+    """ Starts finding and caching the help descriptions of commands in a detached process. """
+    with open(os.devnull, 'r+') as devnull:
+        subprocess.Popen(
+            [sys.executable, '-m', 'buckle.commands.help', '--describe'] + list(commands),
+            stdin=devnull, stdout=devnull, stderr=devnull, close_fds=True, preexec_fn=os.setsid)
+
+
+def iter_help_descriptions(toolbelt_name, commands, deadline=None):
+    """ Yields the help description of each command as soon as it's found.
+
+    Descriptions are cached, or else read from the commands' source where possible.  Only the
+    remaining commands are run with --help, in the order given.  Those that haven't answered by the
+    deadline are given their last cached description, or HELP_PENDING, and are described again in
+    the background for next time.
+
+    Args:
+        toolbelt_name: name of the toolbelt.
+        commands: A list of (name, location) of each command.
+        deadline: Time in seconds since the epoch to stop waiting for descriptions at, or None to
+            wait for all of them.
+
+    Yields:
+        (name, description) of each command, where description is None if it has none.
+    """
+    cached_descriptions = help_cache.load(toolbelt_name)
+    versions = dict((command, help_cache.get_version(location)) for command, location in commands)
+
+    new_descriptions = {}
+    uncached_commands = []
+    for command, location in commands:
+        version = versions[command]
+        if version and tuple(version) in cached_descriptions:
+            yield command, cached_descriptions[tuple(version)]
+            continue
+
+        # Reading the description from the command's source saves running it
+        description = static_help.get_description(location)
+        if description is None:
+            uncached_commands.append(command)
+            continue
+        if version:
+            new_descriptions[tuple(version)] = description
+        yield command, description
+
+    pending_commands = set(uncached_commands)
+    for i, help_output in parallel.iter_outputs(
+            ['{} --help'.format(command) for command in uncached_commands],
+            HELP_TIMEOUT, HELP_MAX_RUNNING, shell=True, deadline=deadline):
+        command = uncached_commands[i]
+        pending_commands.remove(command)
+        if help_output is None:
+            yield command, None  # Not cached, as it may succeed next time
+            continue
+        description = parse_help_description(help_output.decode('utf-8'))
+        if versions[command]:
+            new_descriptions[tuple(versions[command])] = description
+        yield command, description
+
+    if pending_commands:
+        describe_in_background(sorted(pending_commands))
+        last_descriptions = help_cache.get_last_descriptions(cached_descriptions)
+        locations = dict(commands)
+        for command in sorted(pending_commands):
+            yield command, (last_descriptions.get(os.path.realpath(locations[command])) or
+                            HELP_PENDING)
+
+    if new_descriptions:
+        help_cache.save(toolbelt_name, new_descriptions)
+
+
+def get_commands(toolbelt_name, exclude, path=()):
+    """ Returns a dict mapping the name of each command that help is shown for to its location. """
     prefix = toolbelt_name + '-' + '~'.join(path)
 
+    # The index holds both the toolbelt's and the builtin commands
+    commands = index.load_index(toolbelt_name)
+    return dict(
+        (c, location) for p in (prefix, index.BUILTIN_TOOLBELT_NAME + '-')
+        for c, _, location in commands.starting_with(p)
+        if not re.search('.completion(..*)?$', c) and c not in exclude)
+
+
+def print_search_results(toolbelt_name, args):
+    """ Prints the commands whose names or help descriptions match the terms of args.search.
+
+    Commands in the namespace of args.path are searched, and the best matches are printed first.
+    """
     sender = message.Sender(toolbelt_name)
 
-    autocompleted_commands = [
-        c for c in (autocomplete.get_executables_starting_with(prefix) +
-                    autocomplete.get_executables_starting_with('buckle-'))
-        if not re.search('.completion(..*)?$', c)]
+    # Only commands that are new or have changed since the last search need describing
+    locations = get_commands(toolbelt_name, args.exclude)
+    search_index = help_search.SearchIndex(toolbelt_name)
+    for command, description in iter_help_descriptions(toolbelt_name, [
+            (command, locations[command]) for command in search_index.get_outdated(locations)]):
+        search_index.update(command, locations[command], description)
+    search_index.save()
+
+    query = ' '.join(args.search)
+    prefix = toolbelt_name + '-' + '~'.join(args.path)
+    results = search_index.search(query, names=set(
+        command for command in locations
+        if command.startswith((prefix, index.BUILTIN_TOOLBELT_NAME + '-'))))
+    if not results:
+        sys.exit(sender.format_error("No commands match '{}'".format(query)))
+
+    columns = os.getenv('COLUMNS')
+    if not columns:
+        rows, columns = os.popen('stty size', 'r').read().split()  # Get the console window size
+
+    names = [' '.join(re.sub('^{}-'.format(toolbelt_name), '', command).split('~'))
+             for command in results]
+    max_key_length = max(len(name) for name in names)
+    for command, name in zip(results, names):
+        description = search_index.commands[command][1] or '<help not found>'
+        print(truncate(('   {:<' + str(max_key_length) + '}   {}').format(name, description),
+                       int(columns)))
+
 
-    command_list = sorted(set(autocompleted_commands) - set(args.exclude))
+def print_help_for_all_commands(toolbelt_name, parser, args, path=()):
+    start_time = time.time()
+    sender = message.Sender(toolbelt_name)
+
+    autocompleted_commands = get_commands(toolbelt_name, args.exclude, path)
+
+    command_list = sorted(autocompleted_commands)
     if not command_list:
         if not path:
             sys.exit(sender.format_error(
                 'No {} commands found on path. Check your $PATH.'.format(toolbelt_name)))
 
-    command_help_hash = {}
-    for command in command_list:
-        try:
-            command_help_text = subprocess.check_output(
-                '{} --help 2> /dev/null'.format(command), shell=True,
-                timeout=HELP_TIMEOUT).decode('utf-8')
-        except (subprocess.TimeoutExpired, subprocess.CalledProcessError):
-            help_text = None
-        else:
-            # Return first paragraph that is not empty or starts with usage
-            help_text = next((
-                paragraph.replace('\n', '')
-                for paragraph in re.split('\n\s*\n', command_help_text)
-                if paragraph.strip() and not paragraph.startswith('usage: ')), None)
-
-        command_path = re.sub('^{}-'.format(toolbelt_name), '', command).split('~')
-
-        command_help_hash[tuple(command_path)] = help_text or '<help not found>'
+    command_paths = dict(
+        (command, tuple(re.sub('^{}-'.format(toolbelt_name), '', command).split('~')))
+        for command in command_list)
+
+    # Each namespace below the one shown is collapsed into a row of its number of commands
+    namespace_sizes = {}
+    if args.collapse:
+        collapsed = set()
+        for command in command_list:
+            if len(command_paths[command]) > len(path) + 1:
+                namespace_path = command_paths[command][:len(path) + 1]
+                namespace_sizes[namespace_path] = namespace_sizes.get(namespace_path, 0) + 1
+                collapsed.add(command)
+        command_list = [command for command in command_list if command not in collapsed]
+
+    # commands without namespace first, then collapsed namespaces
+    listing = sorted([(command_paths[command], command) for command in command_list] +
+                     [(namespace_path, None) for namespace_path in namespace_sizes],
+                     key=lambda row: (len(row[0]) > 1 or row[1] is None, row[0]))
 
     print(HELP_DESCRIPTION.format(toolbelt_upper=toolbelt_name.upper(), tool_names=(
         ' '.join(path) if path else "all {} Toolbelt commands".format(toolbelt_name.upper()))))
@@ -85,24 +215,42 @@ def print_help_for_all_commands(toolbelt_name, parser, args, path=()):
     if not columns:
         rows, columns = os.popen('stty size', 'r').read().split()  # Get the console window size
 
-    max_key_length = max([0] + [len(' '.join(k)) for k in command_help_hash.keys()])
-
-    last_path = None
-
-    for command_path, value in sorted(command_help_hash.items(),
-                                      # commands without namespace first
-                                      key=lambda item: (len(item[0]) > 1, item[0])):
-        name = ' '.join(command_path)
-
-        # Insert a line if we're starting a new namespace
-        if not last_path or command_path[:-1] != last_path[:-1]:
-            print()
-
-        # Right pads keys length and truncate text to fit in window
-        print(truncate(('   {:<' + str(max_key_length) + '}   {}').format(name, value),
-                       int(columns)))
-
-        last_path = command_path
+    # Known from the names alone, so that each row can be printed as soon as it's ready
+    max_key_length = max([0] + [len(' '.join(command_path)) for command_path, _ in listing])
+
+    help_descriptions = {}
+    printed_rows = []
+
+    def print_ready_rows():
+        """ Prints the rows that are ready, in order """
+        while len(printed_rows) < len(listing):
+            command_path, command = listing[len(printed_rows)]
+            if command is None:
+                value = NAMESPACE_DESCRIPTION.format(count=namespace_sizes[command_path])
+            elif command in help_descriptions:
+                value = help_descriptions[command] or '<help not found>'
+            else:
+                return
+            name = ' '.join(command_path)
+
+            # Insert a line if we're starting a new namespace
+            if (not printed_rows or command_path[:-1] != printed_rows[-1][0][:-1] or
+                    (command is None) != (printed_rows[-1][1] is None)):
+                print()
+
+            # Right pads keys length and truncate text to fit in window
+            print(truncate(('   {:<' + str(max_key_length) + '}   {}').format(name, value),
+                           int(columns)))
+            sys.stdout.flush()
+
+            printed_rows.append((command_path, command))
+
+    for command, description in iter_help_descriptions(toolbelt_name, [
+            (command, autocompleted_commands[command]) for command in command_list],
+            deadline=start_time + args.budget if args.budget else None):
+        help_descriptions[command] = description
+        print_ready_rows()
+    print_ready_rows()
 
     print(TOOLBELT_DESCRIPTION.format(toolbelt=toolbelt_name))
 
@@ -116,11 +264,31 @@ def main(argv=sys.argv):
     parser.add_argument('path', nargs='*', help='name of {} sub-command'.format(toolbelt_name))
     parser.add_argument('--exclude', '-X', action='append', default=[],
                         help='commands to exclude from help')
+    parser.add_argument('--budget', type=float, default=HELP_BUDGET, metavar='SECONDS',
+                        help="seconds to wait for commands' descriptions, or 0 to wait for all")
+    parser.add_argument('--collapse', action='store_true',
+                        help="show each namespace's commands as a single row")
+    parser.add_argument('--describe', nargs='+', help=argparse.SUPPRESS)
+    parser.add_argument('--search', '-s', metavar='TERM', nargs='+',
+                        help='list the commands whose names or help descriptions match all terms')
 
     args_with_opts = (shlex.split(os.getenv('BUCKLE_HELP_OPTS_' + toolbelt_name.upper(), '')) +
                       list(argv[1:]))
     args = parser.parse_args(args_with_opts)
 
+    if args.describe:
+        # Cache the descriptions of commands that weren't described within a listing's budget
+        locations = get_commands(toolbelt_name, args.exclude)
+        commands = [(command, locations[command])
+                    for command in args.describe if command in locations]
+        for _ in iter_help_descriptions(toolbelt_name, commands):
+            pass
+        return
+
+    if args.search is not None:
+        print_search_results(toolbelt_name, args)
+        return
+
     path = '{}-'.format(toolbelt_name) + '~'.join(args.path)  # Handle namespaces if they exist
 
     if path in args.exclude:
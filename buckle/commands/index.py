@@ -0,0 +1,41 @@
+""" buckle index command
+
+Builds the index of toolbelt commands on the path.
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+
+from buckle import index
+from buckle import message
+
+HELP_DESCRIPTION = """\
+Manages the index of {toolbelt_name} commands on the path.
+
+The index is rebuilt automatically when a directory on the path changes.  Changing the permissions
+of a command doesn't change its directory, so run '{toolbelt_name} index build' afterwards.\
+"""
+
+
+def main(argv=sys.argv):
+    toolbelt_name = os.getenv('BUCKLE_TOOLBELT_NAME', index.BUILTIN_TOOLBELT_NAME)
+    sender = message.Sender(toolbelt_name + ':')
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description=HELP_DESCRIPTION.format(toolbelt_name=toolbelt_name))
+    subparsers = parser.add_subparsers(dest='action')
+    subparsers.required = True
+    subparsers.add_parser('build', help='Search every directory on the path and rebuild the index')
+    parser.parse_args(argv[1:])
+
+    commands = index.build_index(toolbelt_name, rescan=True)
+    sender.info('Indexed {} commands and namespaces in {}'.format(
+        len(commands), index.get_compiled_index_path(toolbelt_name)))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
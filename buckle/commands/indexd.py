@@ -0,0 +1,236 @@
+""" buckle _indexd command
+
+Serves the toolbelt commands on the path from memory, kept up to date with inotify.
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import errno
+import os
+import select
+import signal
+import socket
+import sys
+
+from buckle import index
+from buckle import inotify
+from buckle import message
+
+HELP_DESCRIPTION = """\
+Watches the directories on the path for changes to toolbelt commands so that they can be looked up
+without searching the path.
+
+While running, {toolbelt_name} commands, help and bash completion ask it for the commands on the
+path through the Unix socket at {socket_path}.  Start it in the background from your shell's login
+script with '{toolbelt_name} _indexd &'.\
+"""
+
+WATCH_MASK = (inotify.IN_ATTRIB | inotify.IN_CLOSE_WRITE | inotify.IN_CREATE | inotify.IN_DELETE |
+              inotify.IN_MOVED_FROM | inotify.IN_MOVED_TO | inotify.IN_DELETE_SELF |
+              inotify.IN_MOVE_SELF | inotify.IN_ONLYDIR)
+
+REQUEST_TIMEOUT = 1  # Seconds to wait for a client to send its request
+
+
+class Catalog(object):
+    """ The executables in watched directories that begin with a requested toolbelt prefix. """
+
+    def __init__(self, watcher):
+        self._watcher = watcher
+        self._prefixes = set()
+        self._directories = {}  # Maps each watched directory to its executables' locations
+        # Maps each watch descriptor to its directories.  Paths to the same directory, such as a
+        # symlink and its target, share a watch descriptor.
+        self._watched = {}
+
+    def _list(self, directory):
+        executables = {}
+        for prefix in self._prefixes:
+            executables.update(index.list_executables_in_directory(directory, prefix))
+        return executables
+
+    def _watch(self, directory):
+        if directory in self._directories:
+            return
+        try:
+            wd = self._watcher.add_watch(directory, WATCH_MASK)
+        except OSError:
+            return  # Missing directories are checked again on the next request
+        # Listed after the watch is added so that no changes are missed
+        self._watched.setdefault(wd, []).append(directory)
+        self._directories[directory] = self._list(directory)
+
+    def _add_prefix(self, prefix):
+        if prefix not in self._prefixes:
+            self._prefixes.add(prefix)
+            for directory in self._directories:
+                self._directories[directory] = self._list(directory)
+
+    def commands(self, toolbelt_name, search_path):
+        """ Returns a dict mapping the name of each of the toolbelt's commands to its location. """
+        prefix = toolbelt_name + '-'
+        self._add_prefix(prefix)
+
+        commands = {}
+        for directory in index.get_directories(search_path):
+            self._watch(directory)
+            for name, location in self._directories.get(directory, {}).items():
+                if name.startswith(prefix):
+                    commands.setdefault(name, location)
+        return commands
+
+    def handle_event(self, wd, mask, name):
+        if mask & inotify.IN_Q_OVERFLOW:
+            # Events were dropped so nothing can be trusted
+            for directory in self._directories:
+                self._directories[directory] = self._list(directory)
+            return
+
+        directories = self._watched.get(wd)
+        if directories is None:
+            return
+
+        if mask & (inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF | inotify.IN_IGNORED):
+            del self._watched[wd]
+            for directory in directories:
+                del self._directories[directory]
+            if not mask & inotify.IN_IGNORED:
+                self._watcher.rm_watch(wd)
+        elif name and any(name.startswith(prefix) for prefix in self._prefixes):
+            for directory in directories:
+                location = os.path.join(directory, name)
+                if os.path.isfile(location) and os.access(location, os.X_OK):
+                    self._directories[directory][name] = location
+                else:
+                    self._directories[directory].pop(name, None)
+
+
+class Server(object):
+    """ Answers requests for commands from the catalog over a Unix socket.
+
+    See buckle.index.query_daemon for the protocol.
+    """
+
+    def __init__(self, socket_path):
+        self._socket_path = socket_path
+        self._watcher = inotify.Inotify()
+        self.catalog = Catalog(self._watcher)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(socket_path)
+        os.chmod(socket_path, 0o600)
+        self._server.listen(16)
+
+    def process_events(self):
+        # A burst of changes may not fit in a single read
+        events = self._watcher.read_events()
+        while events:
+            for wd, mask, _, name in events:
+                self.catalog.handle_event(wd, mask, name)
+            events = self._watcher.read_events()
+
+    def _respond(self, connection):
+        connection.settimeout(REQUEST_TIMEOUT)
+        request = b''
+        while not request.endswith(b'\n'):
+            chunk = connection.recv(4096)
+            if not chunk:
+                return
+            request += chunk
+
+        fields = request.decode('utf-8').rstrip('\n').split('\t')
+        if len(fields) != 3 or fields[0] != 'commands':
+            connection.sendall(b'Unknown request\n')  # Clients only accept an empty last line
+            return
+
+        self.process_events()  # Changes made before the request must be reflected in the reply
+        commands = self.catalog.commands(fields[1], fields[2])
+        response = ''.join('{}\t{}\n'.format(name, commands[name]) for name in sorted(commands)
+                           if '\n' not in name and '\t' not in name)
+        connection.sendall((response + '\n').encode('utf-8'))
+
+    def handle_request(self):
+        connection, _ = self._server.accept()
+        try:
+            self._respond(connection)
+        except (socket.error, socket.timeout, UnicodeDecodeError):
+            pass  # Clients fall back to searching the path
+        finally:
+            connection.close()
+
+    def serve_once(self, timeout=None):
+        readable, _, _ = select.select([self._watcher, self._server], [], [], timeout)
+        if self._watcher in readable:
+            self.process_events()
+        if self._server in readable:
+            self.handle_request()
+
+    def serve_forever(self):
+        while True:
+            self.serve_once()
+
+    def close(self):
+        self._server.close()
+        self._watcher.close()
+        try:
+            os.remove(self._socket_path)
+        except OSError:
+            pass
+
+
+def is_running(socket_path):
+    """ Returns whether a daemon is accepting connections at socket_path. """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except socket.error:
+        return False
+    else:
+        return True
+    finally:
+        client.close()
+
+
+def _exit_on_signal(signum, frame):
+    sys.exit(0)  # Raising SystemExit lets the server clean up its socket
+
+
+def main(argv=sys.argv):
+    toolbelt_name = os.getenv('BUCKLE_TOOLBELT_NAME', index.BUILTIN_TOOLBELT_NAME)
+    sender = message.Sender(toolbelt_name + ':')
+    socket_path = index.get_daemon_socket_path()
+
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description=HELP_DESCRIPTION.format(toolbelt_name=toolbelt_name, socket_path=socket_path))
+    parser.parse_args(argv[1:])
+
+    try:
+        os.makedirs(os.path.dirname(socket_path))
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    if is_running(socket_path):
+        sys.exit(sender.format_error('buckle _indexd is already running.'))
+    elif os.path.exists(socket_path):
+        os.remove(socket_path)  # Left behind by a daemon that didn't exit cleanly
+
+    try:
+        server = Server(socket_path)
+    except inotify.InotifyUnavailable as e:
+        sys.exit(sender.format_error(str(e)))
+
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    signal.signal(signal.SIGHUP, _exit_on_signal)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -7,6 +7,7 @@ Prints shell commands for auto-complete.
 from __future__ import print_function
 
 import os
+import re
 import sys
 
 import argparse
@@ -17,17 +18,38 @@ SETUP_SCRIPT = """\
 _buckle_autocomplete_setup "{toolbelt_name}"
 """
 
+FAST_DISPATCH_SETUP_SCRIPT = """\
+_buckle_fast_dispatch_setup "{toolbelt_name}"
+"""
+
+COMPLETION_SERVER_SETUP_SCRIPT = """\
+_buckle_completion_server_setup
+"""
+
 
 def main(argv=sys.argv):
     parser = argparse.ArgumentParser(description='Sets up the bash autocomplete for a toolbelt.')
     parser.add_argument('toolbelt_name',
                         help='The required syntax for this call is "buckle init <toolbelt name>".')
+    parser.add_argument('--fast-dispatch', action='store_true',
+                        help='Define a shell function for the toolbelt that runs its commands '
+                             'without starting buckle when they are in its dispatch table.')
+    parser.add_argument('--completion-server', action='store_true',
+                        help='Start a process that stays running for the rest of the shell session '
+                             'to complete command lines, rather than one process on each Tab.')
     args = parser.parse_args(argv[1:])
     if args.toolbelt_name == '-':
         args.toolbelt_name = os.getenv('BUCKLE_TOOLBELT_NAME', os.path.basename(argv[0]))
 
+    if args.fast_dispatch and not re.match('^[A-Za-z_][A-Za-z0-9_]*$', args.toolbelt_name):
+        parser.error("--fast-dispatch requires a toolbelt name that is a valid shell identifier")
+
     print(pkg_resources.resource_string(__name__, '../init.sh').decode('utf-8'))
     print(SETUP_SCRIPT.format(toolbelt_name=args.toolbelt_name))
+    if args.fast_dispatch:
+        print(FAST_DISPATCH_SETUP_SCRIPT.format(toolbelt_name=args.toolbelt_name))
+    if args.completion_server:
+        print(COMPLETION_SERVER_SETUP_SCRIPT)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+""" Compact, sorted, memory-mappable index of a toolbelt's commands.
+
+The file is laid out as:
+
+    magic
+    uint32 number of entries
+    uint32 length of the header
+    header: JSON describing the path the index was built from
+    uint32 offset of each entry, in sorted order of entry name
+    entries: name NUL flags location NUL
+
+Names are compared as UTF-8 bytes, so an entry can be found with a binary search of the offsets
+without reading the rest of the file.
+
+"""
+
+import json
+import mmap
+import re
+import struct
+
+MAGIC = b'BUCKLEI1'
+UINT32 = struct.Struct('<I')
+UINT8 = struct.Struct('B')
+
+# Entry flags
+COMMAND = 0x01
+NAMESPACE = 0x02  # Has commands under it in its namespace path
+DOT_COMMAND = 0x04
+COMPLETION = 0x08
+
+
+class InvalidIndex(Exception):
+    pass
+
+
+def get_flags(toolbelt_names, name, namespace_separator='~'):
+    """ Returns the flags of a command from its name and the toolbelts it may belong to. """
+    flags = COMMAND
+    prefix_lengths = [len(t) + 1 for t in toolbelt_names if name.startswith(t + '-')]
+    command = name[max(prefix_lengths or [0]):].split(namespace_separator)[-1]
+    if command.startswith('.'):
+        flags |= DOT_COMMAND
+    if re.search(r'\.completion(\..*)?$', command):
+        flags |= COMPLETION
+    return flags
+
+
+def compile_index(toolbelt_names, commands, header=None, namespace_separator='~'):
+    """ Returns the bytes of an index file.
+
+    Args:
+        toolbelt_names: names of the toolbelts the commands belong to.
+        commands: A dict mapping the name of each command to its location.
+        header: JSON serializable description of where the commands came from.
+        namespace_separator: Separator of namespaces in command names.
+    """
+    entries = {}
+    for name, location in commands.items():
+        entry = entries.setdefault(name, [0, ''])
+        entry[0] |= get_flags(toolbelt_names, name, namespace_separator)
+        entry[1] = location
+        parts = name.split(namespace_separator)
+        for depth in range(1, len(parts)):
+            namespace = namespace_separator.join(parts[:depth])
+            entries.setdefault(namespace, [0, ''])[0] |= NAMESPACE
+
+    encoded_header = json.dumps(header).encode('utf-8')
+    records = [name.encode('utf-8') + b'\0' + UINT8.pack(flags) + location.encode('utf-8') + b'\0'
+               for name, (flags, location) in entries.items()]
+    records.sort()
+
+    offset = len(MAGIC) + 2 * UINT32.size + len(encoded_header) + UINT32.size * len(records)
+    offsets = []
+    for record in records:
+        offsets.append(UINT32.pack(offset))
+        offset += len(record)
+
+    return b''.join([MAGIC, UINT32.pack(len(records)), UINT32.pack(len(encoded_header)),
+                     encoded_header] + offsets + records)
+
+
+class CompiledIndex(object):
+    """ Read access to the bytes of an index file, or a memory map of one. """
+
+    def __init__(self, data):
+        self._data = data
+        if data[:len(MAGIC)] != MAGIC:
+            raise InvalidIndex('Not a buckle index.')
+        self._count = UINT32.unpack_from(data, len(MAGIC))[0]
+        header_length = UINT32.unpack_from(data, len(MAGIC) + UINT32.size)[0]
+        header_start = len(MAGIC) + 2 * UINT32.size
+        self._offsets_start = header_start + header_length
+        try:
+            self.header = json.loads(data[header_start:self._offsets_start].decode('utf-8'))
+        except ValueError:
+            raise InvalidIndex('Corrupt buckle index header.')
+
+    @classmethod
+    def open(cls, index_path):
+        """ Memory maps an index file.  Raises IOError/OSError if it can't be read. """
+        with open(index_path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(data)
+
+    def __len__(self):
+        return self._count
+
+    def _offset(self, i):
+        return UINT32.unpack_from(self._data, self._offsets_start + UINT32.size * i)[0]
+
+    def _name(self, i):
+        start = self._offset(i)
+        return self._data[start:self._data.find(b'\0', start)]
+
+    def _entry(self, i):
+        start = self._offset(i)
+        name_end = self._data.find(b'\0', start)
+        location_end = self._data.find(b'\0', name_end + 2)
+        return (self._data[start:name_end].decode('utf-8'),
+                UINT8.unpack_from(self._data, name_end + 1)[0],
+                self._data[name_end + 2:location_end].decode('utf-8'))
+
+    def _bisect(self, key):
+        """ Returns the index of the first entry with a name not less than key. """
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get(self, name):
+        """ Returns (flags, location) of the entry with the given name, or None if missing. """
+        i = self._bisect(name.encode('utf-8'))
+        if i < self._count:
+            entry_name, flags, location = self._entry(i)
+            if entry_name == name:
+                return flags, location
+        return None
+
+    def starting_with(self, prefix, flags=COMMAND):
+        """ Yields (name, flags, location) in sorted order for each entry starting with prefix.
+
+        Args:
+            prefix: String to match the beginning of entry names to.
+            flags: Only entries with any of these flags are yielded.
+        """
+        encoded_prefix = prefix.encode('utf-8')
+        for i in range(self._bisect(encoded_prefix), self._count):
+            if not self._name(i).startswith(encoded_prefix):
+                break
+            entry = self._entry(i)
+            if entry[1] & flags:
+                yield entry
+
+    def dot_commands(self, namespace_prefixes):
+        """ Returns the dot commands of each namespace in a chain of namespaces.
+
+        Args:
+            namespace_prefixes: The prefix of the names of commands in each namespace of the chain,
+                outermost first.  e.g.: ['nd-', 'nd-dev~']
+
+        Returns:
+            A list of (name, location) of each namespace's dot commands in alphabetical order, for
+            each namespace in the order given.
+        """
+        return [[(name, location) for name, _, location in self.starting_with(prefix + '.',
+                                                                              DOT_COMMAND)]
+                for prefix in namespace_prefixes]
+
+    def commands(self):
+        """ Returns a dict mapping the name of each command to its location. """
+        return dict((name, location) for name, _, location in self.starting_with(''))
@@ -0,0 +1,76 @@
+""" Reuse of the candidates printed by completion commands that declare that they can be cached.
+
+A completion command opts in with the same line as a dot command (see dot_command_cache):
+
+    # buckle-cache: ttl=60
+
+Candidates are cached for the words preceding the one being completed, so a completion command that
+opts in should print every candidate for the word, whatever has been typed of it.  Candidates that
+are no longer fresh are still kept, for when there's no time to run the completion command again.
+
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from buckle import dot_command_cache
+from buckle import index
+
+
+def _get_record_path(location, words):
+    key = json.dumps([location, list(words)])
+    key_hash = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(index.get_cache_dir(), 'completions', key_hash + '.json')
+
+
+def is_cacheable(location):
+    """ Returns whether the completion command at location declares that it can be cached. """
+    return dot_command_cache.read_policy(location) is not None
+
+
+def load(location, words):
+    """ Returns the candidates cached for the completion command at location.
+
+    Args:
+        location: The location of the completion command.
+        words: The words of the command line preceding the one being completed.
+
+    Returns:
+        (candidates, fresh), where fresh is whether all the conditions the completion command
+        declares still hold, or None if nothing is cached.
+    """
+    policy = dot_command_cache.read_policy(location)
+    if not policy:
+        return None
+
+    try:
+        with open(_get_record_path(location, words)) as f:
+            record = json.load(f)
+        conditions = dot_command_cache.get_conditions(location, policy)
+    except (IOError, OSError, ValueError):
+        return None
+
+    fresh = (record.get('conditions') == conditions and
+             (record.get('expires') is None or time.time() < record['expires']))
+    return record['candidates'], fresh
+
+
+def save(location, words, candidates):
+    """ Caches the candidates printed by the completion command at location, if it can be. """
+    policy = dot_command_cache.read_policy(location)
+    if not policy:
+        return
+
+    try:
+        conditions = dot_command_cache.get_conditions(location, policy)
+    except OSError:
+        return  # Removed while it ran
+    record = {
+        'conditions': conditions,
+        'expires': time.time() + policy.ttl if policy.ttl is not None else None,
+        'candidates': list(candidates),
+    }
+    data = json.dumps(record).encode('utf-8')
+    index.write_atomically(_get_record_path(location, words), data)
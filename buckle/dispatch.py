@@ -0,0 +1,139 @@
+""" Dispatch table for the bash fast path set up by 'buckle init --fast-dispatch'.
+
+The table is a bash script that is sourced by the _buckle_fast_dispatch function in init.sh.  It
+maps the name of each of the toolbelt's commands to the executable buckle would run for it, and each
+namespace to the dot commands that run before the commands in it, so that a command can be run
+without starting Python.
+
+The table is written by a run of buckle that the fast path fell back to.  It is only trusted while
+$PATH and $BUCKLE_OPTS_<TOOLBELT> are unchanged, no directory on the path is newer than the table,
+and no update or clock check is due.
+
+"""
+
+import hashlib
+import os
+
+from buckle import compiled_index
+from buckle import dot_command_cache
+from buckle import index
+
+try:
+    from shlex import quote
+except ImportError:  # Python < 3.3
+    from pipes import quote
+
+FAST_DISPATCH_ENV_VAR = 'BUCKLE_FAST_DISPATCH'  # Set by the fast path when it falls back to buckle
+
+TABLE_HEADER = '# buckle dispatch table '
+
+
+def get_table_path(toolbelt_name):
+    """ Returns the location of the toolbelt's dispatch table. """
+    return os.path.join(index.get_cache_dir(), 'dispatch-{}.bash'.format(toolbelt_name))
+
+
+def _is_verifiable(header):
+    """ Returns whether bash can tell from the directories on the path when the index is stale. """
+    if not isinstance(header, dict) or 'directories' not in header:
+        return False  # From buckle _indexd
+    return (all(os.path.isabs(directory) for directory in header['path'].split(os.pathsep)) and
+            all(mtime is not None for _, mtime in header['directories']))
+
+
+def render_table(toolbelt_name, commands, opts, next_check_time, parallel_dot_commands=None,
+                 namespace_separator='~'):
+    """ Returns the contents of a dispatch table.
+
+    Args:
+        toolbelt_name: name of the toolbelt.
+        commands: CompiledIndex of the toolbelt's and the builtin commands.
+        opts: The value of $BUCKLE_OPTS_<TOOLBELT> that the table is valid for.
+        next_check_time: Time in seconds since the epoch that an update or clock check is next
+            due, or None if no checks will be made.
+        parallel_dot_commands: How dot commands are run at the same time, if they are.  The fast
+            path leaves commands with dot commands that would run at the same time to buckle.
+        namespace_separator: Separator of namespaces in command names.
+    """
+    prefix = toolbelt_name + '-'
+    executables = []
+    dot_commands = {}
+    cached_dot_commands = []
+    for name, flags, location in commands.starting_with(
+            prefix, compiled_index.COMMAND | compiled_index.NAMESPACE):
+        if flags & compiled_index.DOT_COMMAND:
+            # Run for the commands in each namespace whose path is followed by the dot command
+            parts = name[len(prefix):].split(namespace_separator)
+            for depth, part in enumerate(parts):
+                if part.startswith('.'):
+                    namespace = prefix + ''.join(p + namespace_separator for p in parts[:depth])
+                    dot_commands.setdefault(namespace, []).append(location)
+            if dot_command_cache.read_policy(location):
+                cached_dot_commands.append(location)  # Left to buckle, which keeps the cache
+
+        if flags & compiled_index.NAMESPACE:
+            executables.append((name, ''))  # Resolution continues with the next argument
+            continue
+
+        # Use builtin version if available, as buckle does
+        builtin = commands.get(index.BUILTIN_TOOLBELT_NAME + name[len(toolbelt_name):])
+        if builtin and builtin[0] & compiled_index.COMMAND:
+            location = builtin[1]
+        executables.append((name, location))
+
+    lines = [
+        'declare -g _BUCKLE_DISPATCH_TOOLBELT={}'.format(quote(toolbelt_name)),
+        'declare -g _BUCKLE_DISPATCH_PATH={}'.format(quote(commands.header['path'])),
+        'declare -g _BUCKLE_DISPATCH_OPTS={}'.format(quote(opts)),
+        'declare -g _BUCKLE_DISPATCH_NEXT_CHECK_TIME={}'.format(
+            '' if next_check_time is None else int(next_check_time)),
+        'declare -g _BUCKLE_DISPATCH_PARALLEL_DOT_COMMANDS={}'.format(
+            quote(parallel_dot_commands or '')),
+        'declare -ga _BUCKLE_DISPATCH_DIRECTORIES=({})'.format(
+            ' '.join(quote(directory) for directory, _ in commands.header['directories'])),
+        'declare -gA _BUCKLE_DISPATCH_COMMANDS=({})'.format(
+            ' '.join('[{}]={}'.format(quote(name), quote(location))
+                     for name, location in executables)),
+        'declare -gA _BUCKLE_DISPATCH_DOT_COMMANDS=({})'.format(
+            ' '.join('[{}]={}'.format(quote(namespace), quote('\t'.join(locations)))
+                     for namespace, locations in sorted(dot_commands.items()))),
+        'declare -gA _BUCKLE_DISPATCH_CACHED_DOT_COMMANDS=({})'.format(
+            ' '.join('[{}]=1'.format(quote(location)) for location in cached_dot_commands)),
+    ]
+    body = '\n'.join(lines) + '\n'
+
+    generation = hashlib.sha1(body.encode('utf-8')).hexdigest()[:16]
+    return (TABLE_HEADER + generation + '\n' +
+            'declare -g _BUCKLE_DISPATCH_GENERATION={}\n'.format(generation) + body)
+
+
+def write_table(toolbelt_name, commands, opts, next_check_time, parallel_dot_commands=None):
+    """ Writes the toolbelt's dispatch table, unless it's already up to date.
+
+    Nothing is written if the commands came from a source that bash can't check is current.
+
+    Args:
+        toolbelt_name: name of the toolbelt.
+        commands: CompiledIndex of the toolbelt's and the builtin commands on the path.
+        opts: The value of $BUCKLE_OPTS_<TOOLBELT> that the table is valid for.
+        next_check_time: Time in seconds since the epoch that an update or clock check is next
+            due, or None if no checks will be made.
+        parallel_dot_commands: How dot commands are run at the same time, if they are.
+    """
+    if not _is_verifiable(commands.header):
+        return
+
+    table = render_table(toolbelt_name, commands, opts, next_check_time, parallel_dot_commands)
+    table_path = get_table_path(toolbelt_name)
+    try:
+        with open(table_path) as f:
+            if f.readline() == table[:table.index('\n') + 1]:
+                return
+    except (IOError, OSError):
+        pass  # Missing
+
+    # Dated a second after the directories' last change so that rounding of their mtimes can't
+    # make it look older.  Any later change is newer still, as it comes at least
+    # index.RACY_MTIME_WINDOW after the change that was indexed.
+    mtime = max([0] + [mtime for _, mtime in commands.header['directories']]) + 1
+    index.write_atomically(table_path, table.encode('utf-8'), mtime=mtime)
@@ -0,0 +1,160 @@
+""" Reuse of the successful results of dot commands that declare that they can be cached.
+
+A dot command opts in with a line near its top like:
+
+    # buckle-cache: ttl=300 session inputs=requirements.txt,setup.py
+
+Each of the conditions given must hold for a success to be reused:
+
+    ttl=<seconds>  for this many seconds after the dot command last succeeded
+    session        in the same shell session that it succeeded in
+    inputs=<files> while the contents of these files, relative to the current directory, are the
+                   same as when it succeeded
+
+Failures are never cached, and changing the dot command itself invalidates its cached success.
+
+"""
+
+import collections
+import hashlib
+import json
+import os
+import re
+import time
+
+from buckle import index
+
+DIRECTIVE = re.compile(br'buckle-cache:[ \t]*([^\r\n]*)')
+HEAD_SIZE = 4096  # Bytes at the start of a dot command that are searched for the directive
+
+SESSION_ID_ENV_VAR = 'BUCKLE_SESSION_ID'  # Overrides the id of the shell session
+
+Policy = collections.namedtuple('Policy', ['ttl', 'session', 'inputs'])
+
+
+class InvalidPolicy(Exception):
+    pass
+
+
+def parse_policy(directive):
+    """ Returns the Policy described by the text following 'buckle-cache:'. """
+    ttl, session, inputs = None, False, ()
+    for condition in directive.split():
+        name, _, value = condition.partition('=')
+        if name == 'ttl':
+            try:
+                ttl = float(value)
+            except ValueError:
+                raise InvalidPolicy("Invalid ttl '{}'".format(value))
+        elif name == 'session' and not value:
+            session = True
+        elif name == 'inputs' and value:
+            inputs = tuple(value.split(','))
+        else:
+            raise InvalidPolicy("Unknown condition '{}'".format(condition))
+
+    if ttl is None and not session and not inputs:
+        raise InvalidPolicy('No conditions given')
+    return Policy(ttl, session, inputs)
+
+
+def read_policy(location):
+    """ Returns the Policy declared by the dot command at location, or None if it has none. """
+    try:
+        with open(location, 'rb') as f:
+            head = f.read(HEAD_SIZE)
+    except (IOError, OSError):
+        return None
+
+    match = DIRECTIVE.search(head)
+    if not match:
+        return None
+    try:
+        return parse_policy(match.group(1).decode('utf-8', 'replace'))
+    except InvalidPolicy:
+        return None  # Never cached rather than failing the command it runs before
+
+
+def get_session_id():
+    """ Returns an id for the shell session that buckle was run from. """
+    session_id = os.getenv(SESSION_ID_ENV_VAR)
+    if session_id:
+        return session_id
+
+    # Distinguish the parent shell from any earlier process that had the same id
+    parent_id = os.getppid()
+    try:
+        with open('/proc/{}/stat'.format(parent_id)) as f:
+            start_time = f.read().rsplit(')', 1)[-1].split()[19]
+    except (IOError, OSError, IndexError):
+        start_time = ''
+    return '{}:{}'.format(parent_id, start_time)
+
+
+def _get_fingerprint(inputs):
+    fingerprint = hashlib.sha1()
+    for input_path in inputs:
+        input_path = os.path.abspath(input_path)
+        fingerprint.update(input_path.encode('utf-8') + b'\0')
+        try:
+            with open(input_path, 'rb') as f:
+                fingerprint.update(hashlib.sha1(f.read()).digest())
+        except (IOError, OSError):
+            fingerprint.update(b'missing')
+    return fingerprint.hexdigest()
+
+
+def _get_version(location):
+    """ Returns what identifies the current contents of the dot command at location. """
+    stat = os.stat(location)
+    return [stat.st_mtime, stat.st_size, stat.st_ino]
+
+
+def _get_record_path(location):
+    location_hash = hashlib.sha1(location.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(index.get_cache_dir(), 'dot-commands', location_hash + '.json')
+
+
+def get_conditions(location, policy):
+    """ Returns the values of the policy's conditions that a cached result must still match. """
+    return {
+        'location': location,
+        'version': _get_version(location),
+        'session': get_session_id() if policy.session else None,
+        'fingerprint': _get_fingerprint(policy.inputs) if policy.inputs else None,
+    }
+
+
+def is_cached(location):
+    """ Returns whether the dot command at location has a cached success that is still valid. """
+    policy = read_policy(location)
+    if not policy:
+        return False
+
+    try:
+        with open(_get_record_path(location)) as f:
+            record = json.load(f)
+        conditions = get_conditions(location, policy)
+    except (IOError, OSError, ValueError):
+        return False
+
+    if record.get('expires') is not None and time.time() >= record['expires']:
+        return False
+    return record.get('conditions') == conditions
+
+
+def record_success(location):
+    """ Caches the success of the dot command at location, if it declares that it can be. """
+    policy = read_policy(location)
+    if not policy:
+        return
+
+    try:
+        conditions = get_conditions(location, policy)
+    except OSError:
+        return  # Removed while it ran
+    record = {
+        'conditions': conditions,
+        'expires': time.time() + policy.ttl if policy.ttl is not None else None,
+    }
+    index.write_atomically(_get_record_path(location), json.dumps(record).encode('utf-8'))
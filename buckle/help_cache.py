@@ -0,0 +1,76 @@
+""" Persistent cache of the help descriptions of a toolbelt's commands.
+
+Each description is kept with the resolved path, inode, size and modification time of the
+executable it came from, and is only reused while all of them are unchanged.  The last description
+of an executable that has since changed is still kept, for when there's no time to describe it
+again.
+
+"""
+
+import json
+import os
+import time
+
+from buckle import index
+
+CACHE_VERSION = 1
+
+
+def _get_cache_path(toolbelt_name):
+    return os.path.join(index.get_cache_dir(), 'help-{}.json'.format(toolbelt_name))
+
+
+def get_version(location):
+    """ Returns what identifies the executable at location, or None if it can't be cached.
+
+    Executables that were modified too recently for a later change to be sure to alter their
+    modification time can't be cached.
+    """
+    path = os.path.realpath(location)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if time.time() - stat.st_mtime < index.RACY_MTIME_WINDOW:
+        return None
+    return [path, stat.st_ino, stat.st_size, stat.st_mtime]
+
+
+def load(toolbelt_name):
+    """ Returns a dict mapping the version of each executable to its cached help description. """
+    try:
+        with open(_get_cache_path(toolbelt_name)) as f:
+            cache = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get('version') != CACHE_VERSION:
+        return {}
+    return dict((tuple(version), description) for version, description in cache['entries'])
+
+
+def get_last_descriptions(cache):
+    """ Returns a dict mapping the resolved path of each executable to its last cached description.
+
+    The description may be of a version of the executable that has since changed.
+    """
+    return dict((version[0], description) for version, description in cache.items())
+
+
+def save(toolbelt_name, descriptions):
+    """ Adds help descriptions to the toolbelt's cache.
+
+    Descriptions cached by other runs since the cache was loaded are kept.  Only the last
+    description of each executable is kept, and those of executables that have been removed are
+    dropped.
+
+    Args:
+        toolbelt_name: name of the toolbelt.
+        descriptions: A dict mapping the version of each executable to its help description.
+    """
+    last_entries = {}
+    for version, description in list(load(toolbelt_name).items()) + list(descriptions.items()):
+        if os.path.exists(version[0]):
+            last_entries[version[0]] = [list(version), description]
+    entries = sorted(last_entries.values())
+    data = json.dumps({'version': CACHE_VERSION, 'entries': entries}).encode('utf-8')
+    index.write_atomically(_get_cache_path(toolbelt_name), data)
@@ -0,0 +1,124 @@
+""" Persistent inverted index of the names and help descriptions of a toolbelt's commands.
+
+Terms are the lowercase words of a command's name, including its namespaces, and of its help
+description.  The index records the version of the executable that each command's terms came from,
+so that only commands that have been added or changed since have to be described again.
+
+"""
+
+import json
+import os
+import re
+
+from buckle import help_cache
+from buckle import index
+
+INDEX_VERSION = 1
+
+NAME_WEIGHT = 3  # Of a term in a command's name, relative to one in its description
+PREFIX_WEIGHT = 0.5  # Of a search term that's the start of a term, relative to a whole term
+
+
+def get_terms(text):
+    """ Returns the lowercase words of text. """
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+
+def _get_index_path(toolbelt_name):
+    return os.path.join(index.get_cache_dir(), 'help-search-{}.json'.format(toolbelt_name))
+
+
+def _get_weights(toolbelt_name, name, description):
+    weights = {}
+    for term in get_terms(re.sub('^{}-'.format(re.escape(toolbelt_name)), '', name)):
+        weights[term] = weights.get(term, 0) + NAME_WEIGHT
+    for term in get_terms(description or ''):
+        weights[term] = weights.get(term, 0) + 1
+    return weights
+
+
+class SearchIndex(object):
+    """ The toolbelt's search index, as last saved. """
+
+    def __init__(self, toolbelt_name):
+        self.toolbelt_name = toolbelt_name
+        self.commands = {}  # Version and description of each command by name
+        self.postings = {}  # Weight of each command by name, by term
+        self._changed = False
+        try:
+            with open(_get_index_path(toolbelt_name)) as f:
+                saved = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if isinstance(saved, dict) and saved.get('version') == INDEX_VERSION:
+            self.commands = saved['commands']
+            self.postings = saved['postings']
+
+    def get_outdated(self, locations):
+        """ Returns the names of the commands whose terms need updating, and drops missing ones.
+
+        Args:
+            locations: A dict mapping the name of each command to its location.
+        """
+        for name in set(self.commands) - set(locations):
+            self.remove(name)
+        return sorted(name for name, location in locations.items()
+                      if name not in self.commands or
+                      self.commands[name][0] is None or
+                      self.commands[name][0] != help_cache.get_version(location))
+
+    def remove(self, name):
+        version, description = self.commands.pop(name)
+        for term in _get_weights(self.toolbelt_name, name, description):
+            postings = self.postings.get(term, {})
+            postings.pop(name, None)
+            if not postings:
+                self.postings.pop(term, None)
+        self._changed = True
+
+    def update(self, name, location, description):
+        """ Replaces the terms of a command with those of its current description.
+
+        A description of None, for help that wasn't found, is stored without a version so that the
+        command is described again on the next search.
+        """
+        if name in self.commands:
+            self.remove(name)
+        version = help_cache.get_version(location) if description is not None else None
+        self.commands[name] = [version, description]
+        for term, weight in _get_weights(self.toolbelt_name, name, description).items():
+            self.postings.setdefault(term, {})[name] = weight
+        self._changed = True
+
+    def save(self):
+        if not self._changed:
+            return
+        data = json.dumps({'version': INDEX_VERSION, 'commands': self.commands,
+                           'postings': self.postings})
+        index.write_atomically(_get_index_path(self.toolbelt_name), data.encode('utf-8'))
+        self._changed = False
+
+    def search(self, query, names=None):
+        """ Returns the names of the commands that match every term of the query, best first.
+
+        Args:
+            query: The text to search for.  Its terms also match the start of longer terms.
+            names: The names of the commands to search, or None to search all of them.
+        """
+        scores = None
+        for query_term in set(get_terms(query)):
+            term_scores = {}
+            for term, postings in self.postings.items():
+                if not term.startswith(query_term):
+                    continue
+                weight = 1 if term == query_term else PREFIX_WEIGHT
+                for name, term_weight in postings.items():
+                    term_scores[name] = max(term_scores.get(name, 0), weight * term_weight)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = dict((name, score + term_scores[name])
+                              for name, score in scores.items() if name in term_scores)
+
+        return sorted((name for name in scores or {} if names is None or name in names),
+                      key=lambda name: (-scores[name], name))
@@ -0,0 +1,362 @@
+""" Index of toolbelt commands on the path.
+
+Finds the executables on $PATH that begin with a toolbelt's prefix, or with the prefix of the
+builtin buckle commands, and keeps a persistent per-user copy of them.  The copy is keyed on $PATH
+and checked against the modification time of each directory in it, so only the directories that
+changed since the last run are listed again.
+
+The commands are compiled into a sorted index file that is memory mapped and binary searched, so
+that looking a command up doesn't require reading the whole index.  When a 'buckle _indexd'
+daemon is running it is asked for the commands instead, as it keeps them up to date as the
+directories change.
+
+"""
+
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+import socket
+import struct
+import tempfile
+import time
+
+from buckle import compiled_index
+
+try:
+    from os import scandir
+except ImportError:  # Python < 3.5
+    scandir = None
+
+CACHE_DIR_ENV_VAR = 'BUCKLE_CACHE_DIR'
+
+# Directories modified this recently may still be changing within the resolution of their mtime,
+# so their listings are never trusted on a later run.
+RACY_MTIME_WINDOW = 2  # Seconds
+
+INDEX_VERSION = 2
+
+BUILTIN_TOOLBELT_NAME = 'buckle'
+
+MISSING_MTIME = -1  # Recorded for directories on the path that don't exist
+
+DAEMON_SOCKET_NAME = 'indexd.sock'
+DAEMON_TIMEOUT = 0.5  # Seconds to wait for buckle _indexd before listing the path instead
+
+
+def get_cache_dir():
+    """ Returns the directory buckle keeps its per-user caches in. """
+    cache_dir = os.getenv(CACHE_DIR_ENV_VAR)
+    if not cache_dir:
+        cache_home = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        cache_dir = os.path.join(cache_home, 'buckle')
+    return cache_dir
+
+
+def get_daemon_socket_path():
+    """ Returns the path of the Unix socket that buckle _indexd listens on. """
+    return os.path.join(get_cache_dir(), DAEMON_SOCKET_NAME)
+
+
+def query_daemon(toolbelt_name, search_path):
+    """ Asks a running buckle _indexd for the location of each of the toolbelt's commands.
+
+    The request is a single line of 'commands', the toolbelt name and the path, separated by tabs.
+    Relative directories in the path are resolved before it's sent, as the daemon's working
+    directory isn't the caller's.
+    The daemon replies with a line of the name and location of each command, separated by a tab,
+    followed by an empty line.
+
+    Returns:
+        A dict mapping the name of each command to its absolute path, or None if the daemon isn't
+        running or didn't reply in time.
+    """
+    socket_path = get_daemon_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(DAEMON_TIMEOUT)
+    try:
+        client.connect(socket_path)
+        search_path = resolve_path(search_path)
+        client.sendall('commands\t{}\t{}\n'.format(toolbelt_name, search_path).encode('utf-8'))
+        chunks = []
+        while True:
+            chunk = client.recv(64 * 1024)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    except (socket.error, socket.timeout):
+        return None
+    finally:
+        client.close()
+
+    response = b''.join(chunks).decode('utf-8')
+    if not (response == '\n' or response.endswith('\n\n')):
+        return None  # Incomplete or error response
+
+    return dict(line.split('\t', 1) for line in response.split('\n') if line)
+
+
+def list_executables_in_directory(directory, prefix):
+    """ Yields (name, location) for each executable file in directory that starts with prefix.
+
+    Missing or unreadable directories yield nothing, as they would for a shell.
+
+    Args:
+        directory: The directory to list.
+        prefix: The prefix that names must start with.  May also be a tuple of prefixes, any of
+            which can match.
+    """
+    try:
+        if scandir:
+            entries = [(entry.name, entry.path) for entry in scandir(directory)
+                       if entry.name.startswith(prefix) and entry.is_file()]
+        else:
+            entries = [(name, os.path.join(directory, name)) for name in os.listdir(directory)
+                       if name.startswith(prefix)]
+            entries = [(name, location) for name, location in entries
+                       if os.path.isfile(location)]
+    except OSError:
+        return
+
+    for name, location in entries:
+        if os.access(location, os.X_OK):
+            yield name, location
+
+
+def get_directories(search_path, working_directory=None):
+    """ Returns the list of directories in the path, each made absolute.
+
+    Args:
+        search_path: The path to split.
+        working_directory: The directory that relative directories in the path are relative to.
+            Defaults to the current directory.
+    """
+    if working_directory is None:
+        working_directory = os.getcwd()
+    # An empty entry in the path refers to the current directory
+    return [os.path.normpath(os.path.join(working_directory, directory or os.curdir))
+            for directory in search_path.split(os.pathsep)]
+
+
+def resolve_path(search_path, working_directory=None):
+    """ Returns the path with each of its directories made absolute.
+
+    Args:
+        search_path: The path to resolve.
+        working_directory: The directory that relative directories in the path are relative to.
+            Defaults to the current directory.
+    """
+    return os.pathsep.join(get_directories(search_path, working_directory))
+
+
+def _get_mtime(directory):
+    try:
+        return os.stat(directory).st_mtime
+    except OSError:  # Directory doesn't exist
+        return MISSING_MTIME
+
+
+def _get_directory_mtimes(search_path):
+    # Racy mtimes are recorded as None so that whatever was listed with them is never trusted
+    now = time.time()
+    directories = []
+    for directory in get_directories(search_path):
+        mtime = _get_mtime(directory)
+        directories.append([directory, mtime if now - mtime >= RACY_MTIME_WINDOW else None])
+    return directories
+
+
+def _get_index_path(toolbelt_name, search_path, extension='json'):
+    path_hash = hashlib.sha1(search_path.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(get_cache_dir(),
+                        'index-{}-{}.{}'.format(toolbelt_name, path_hash, extension))
+
+
+def _read_index(index_path, search_path):
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (IOError, OSError, ValueError):  # Missing or corrupt
+        return {}
+
+    if index.get('version') != INDEX_VERSION or index.get('path') != search_path:
+        return {}
+
+    return dict((entry['directory'], entry) for entry in index['directories'])
+
+
+def write_atomically(file_path, data, mtime=None):
+    """ Atomically replaces the file so that concurrent runs never see a partial file.
+
+    Errors are ignored, as the files written this way are only caches.
+
+    Args:
+        file_path: The file to replace.  Its directory is created if it doesn't exist.
+        data: The bytes to write.
+        mtime: The modification time to give the file before it replaces the old one, if any.
+    """
+    try:
+        if not os.path.isdir(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path))
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        if mtime is not None:
+            os.utime(temp_path, (mtime, mtime))
+        os.rename(temp_path, file_path)
+    except (IOError, OSError):
+        pass  # Caches are only an optimization
+
+
+def get_toolbelt_names(toolbelt_name):
+    """ Returns the names of the toolbelts whose commands are indexed along with toolbelt_name. """
+    return sorted({toolbelt_name, BUILTIN_TOOLBELT_NAME})
+
+
+def _scan_path(toolbelt_name, search_path, rescan=False):
+    """ Lists the directories on the path that changed since they were last indexed.
+
+    Both the toolbelt's commands and the builtin buckle commands are found in the same listing.
+
+    Args:
+        toolbelt_name: name of the toolbelt.
+        search_path: The path to search.
+        rescan: Bool determining whether every directory is listed, changed or not.
+
+    Returns:
+        Tuple:
+            - A dict mapping the name of each command, or builtin command, to its absolute path
+            - A list of [directory, mtime] for each directory on the path.  The mtime is None if
+              the directory's listing can't be trusted on a later run.
+    """
+    prefix = tuple(name + '-' for name in get_toolbelt_names(toolbelt_name))
+    index_path = _get_index_path(toolbelt_name, search_path)
+    cached_directories = {} if rescan else _read_index(index_path, search_path)
+
+    now = time.time()
+    directories = []
+    stale = False
+    for directory in get_directories(search_path):
+        mtime = _get_mtime(directory)
+        cached = cached_directories.get(directory)
+        if cached is not None and cached['mtime'] == mtime:
+            directories.append(cached)
+            continue
+
+        stale = True
+        directories.append({
+            'directory': directory,
+            # Racy listings are kept for this run but will be listed again on the next
+            'mtime': mtime if now - mtime >= RACY_MTIME_WINDOW else None,
+            'executables': dict(list_executables_in_directory(directory, prefix)),
+        })
+
+    if stale:
+        index = {'version': INDEX_VERSION, 'path': search_path, 'directories': directories}
+        write_atomically(index_path, json.dumps(index).encode('utf-8'))
+
+    commands = {}
+    for entry in directories:
+        for name, location in entry['executables'].items():
+            commands.setdefault(name, location)
+
+    return commands, [[entry['directory'], entry['mtime']] for entry in directories]
+
+
+def _is_current(header, toolbelt_name, search_path):
+    if not isinstance(header, dict):
+        return False
+    directories = header.get('directories', [])
+    return (header.get('version') == INDEX_VERSION and
+            header.get('toolbelt') == toolbelt_name and
+            header.get('path') == search_path and
+            # Relative entries in the path resolve differently from another working directory
+            [directory for directory, _ in directories] == get_directories(search_path) and
+            all(mtime is not None and _get_mtime(directory) == mtime
+                for directory, mtime in directories))
+
+
+def is_current(commands, toolbelt_name, search_path=None):
+    """ Returns whether an index from load_index still holds the commands on the path.
+
+    Args:
+        commands: A CompiledIndex returned by load_index.
+        toolbelt_name: name of the toolbelt the index was loaded for.
+        search_path: The path the index was loaded for.  Defaults to $PATH.
+    """
+    if search_path is None:
+        search_path = os.getenv('PATH', '')
+    return _is_current(commands.header, toolbelt_name, search_path)
+
+
+def build_index(toolbelt_name, search_path=None, rescan=False):
+    """ Compiles the toolbelt's and the builtin commands on the path into a memory-mappable index.
+
+    Args:
+        toolbelt_name: name of the toolbelt.
+        search_path: The path to search.  Defaults to $PATH.
+        rescan: Bool determining whether every directory on the path is listed again, rather than
+            only those that changed since they were last indexed.
+
+    Returns:
+        A CompiledIndex of the commands.
+    """
+    if search_path is None:
+        search_path = os.getenv('PATH', '')
+
+    commands, directories = _scan_path(toolbelt_name, search_path, rescan=rescan)
+    header = {'version': INDEX_VERSION, 'toolbelt': toolbelt_name, 'path': search_path,
+              'directories': directories}
+    data = compiled_index.compile_index(get_toolbelt_names(toolbelt_name), commands, header)
+    write_atomically(get_compiled_index_path(toolbelt_name, search_path), data)
+    return compiled_index.CompiledIndex(data)
+
+
+def get_compiled_index_path(toolbelt_name, search_path=None):
+    """ Returns the location of the toolbelt's compiled index file for the path. """
+    if search_path is None:
+        search_path = os.getenv('PATH', '')
+    return _get_index_path(toolbelt_name, search_path, extension='idx')
+
+
+def load_index(toolbelt_name, search_path=None):
+    """ Returns a CompiledIndex of the toolbelt's and the builtin commands on the path.
+
+    Uses buckle _indexd if it's running.  Otherwise the index file is memory mapped, and is only
+    rebuilt if a directory on the path has changed since it was built.
+
+    Args:
+        toolbelt_name: name of the toolbelt.
+        search_path: The path to search.  Defaults to $PATH.
+    """
+    if search_path is None:
+        search_path = os.getenv('PATH', '')
+
+    toolbelt_names = get_toolbelt_names(toolbelt_name)
+    # Recorded before the daemon is asked so that any later change makes the index outdated
+    header = {'version': INDEX_VERSION, 'toolbelt': toolbelt_name, 'path': search_path,
+              'directories': _get_directory_mtimes(search_path)}
+    commands = {}
+    for name in toolbelt_names:
+        daemon_commands = query_daemon(name, search_path)
+        if daemon_commands is None:
+            break
+        commands.update(daemon_commands)
+    else:
+        return compiled_index.CompiledIndex(
+            compiled_index.compile_index(toolbelt_names, commands, header))
+
+    try:
+        index = compiled_index.CompiledIndex.open(get_compiled_index_path(toolbelt_name,
+                                                                          search_path))
+    except (IOError, OSError, ValueError, struct.error, compiled_index.InvalidIndex):
+        pass  # Missing, empty or corrupt
+    else:
+        if _is_current(index.header, toolbelt_name, search_path):
+            return index
+
+    return build_index(toolbelt_name, search_path)
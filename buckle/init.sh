@@ -1,64 +1,139 @@
-_buckle_autocomplete_find_matches() {
-    # Sets the variable at $1 to the possible matches for the next word of the command with the
-    # namespace path indicated in $3 and the current partial word in $4.
+# Completions of the words following each namespace, by path fingerprint and namespace
+declare -gA _BUCKLE_COMPLETION_MEMO=()
+
+_BUCKLE_COMPLETION_SERVER_TIMEOUT=2  # Seconds to wait for the completion server to answer
+
+_buckle_autocomplete_source_completion_command() {
+    # Appends the candidates printed by sourcing the completion command named $2 to the array
+    # named $1.
     local target=$1
-    local toolbelt="$2"
-    local path=("${!3}")  # Expand the array reference ("arr[@]") described in $3
-    local cword=$4
-
-    local prefix=''
-    if [[ ${#path[@]} > 0 ]]; then
-        # Joins the array with trailing tildes to gather the current namespace path
-        printf -v prefix "%s~" "${path[@]}"
+    local completion_command=$2
+
+    local arg_completions=($(source $completion_command))
+    eval "${target}+=(\"\${arg_completions[@]}\")"
+}
+
+_buckle_completion_server_start() {
+    # Starts buckle _complete --serve as a coprocess, which exits once the shell does.  The
+    # redirection keeps an interactive shell from announcing it as a job.
+    {
+        coproc _BUCKLE_COMPLETION_SERVER { exec buckle-_complete --serve 2> /dev/null; }
+    } 2> /dev/null
+    _BUCKLE_COMPLETION_SERVER_ID="$_BUCKLE_COMPLETION_SERVER_PID"
+    disown "$_BUCKLE_COMPLETION_SERVER_ID" 2> /dev/null || true
+}
+
+_buckle_completion_server_setup() {
+    _BUCKLE_COMPLETION_SERVER_ENABLED=1
+    if [[ -z "$_BUCKLE_COMPLETION_SERVER_ID" ]]; then
+        _buckle_completion_server_start
     fi
-    prefix="${toolbelt}-${prefix}"
+}
 
-    local exclude=''  # exclude nothing by default
-    if [[ -z "$cword" ]]; then
-        # When offering completions for a namespace, exclude those starting with '_'
-        exclude="${prefix}[_.].*"
+_buckle_completion_server_request() {
+    # Sets the variable named $1 to the completion server's answer for the arguments after it, as
+    # buckle _complete would print them.  Returns non-zero if the server couldn't answer.
+    local target="$1"
+    shift
+    local request
+    printf -v request '%s\t' "$PWD" "$PATH" "$@"
+    [[ "$request" != *$'\n'* ]] || return 1  # Can't be sent as a line
+
+    # Bash clears the coprocess's variables once it has exited
+    local server_id="$_BUCKLE_COMPLETION_SERVER_ID"
+    if [[ -z "$server_id" || "$_BUCKLE_COMPLETION_SERVER_PID" != "$server_id" ]] \
+        || ! kill -0 "$server_id" 2> /dev/null; then
+        _buckle_completion_server_start
     fi
+    printf '%s\n' "${request%$'\t'}" >&"${_BUCKLE_COMPLETION_SERVER[1]}" || return 1
 
-    local compgen_args=(-X "*.completion?(.*)" "${prefix}${cword}")
+    local line answer=''
+    local timeout="$_BUCKLE_COMPLETION_SERVER_TIMEOUT"
+    while IFS= read -r -t "$timeout" -u "${_BUCKLE_COMPLETION_SERVER[0]}" line; do
+        if [[ -z "$line" ]]; then
+            printf -v "$target" '%s' "${answer%$'\n'}"
+            return 0
+        fi
+        answer+="${line}"$'\n'
+    done
 
-    # Include results for built-in buckle commands
-    local builtin_results="$(compgen -c "buckle-${prefix}${cword}")"
+    # Any answer it gives later would be taken for the next request's
+    kill "$_BUCKLE_COMPLETION_SERVER_ID" 2> /dev/null || true
+    _BUCKLE_COMPLETION_SERVER_ID=''
+    return 1
+}
 
-    local results="$({
-        shopt -s extglob;
-        compgen -c "${compgen_args[@]}" | sort -u;
-        compgen -abk -A function "${compgen_args[@]}";
-        } | sort | uniq -u | sed -e s/"^${exclude}$"// -e s/"${prefix}"// -e s/~.*$//)"
+_buckle_autocomplete_request() {
+    # Sets the variable named $1 to what buckle _complete prints for the arguments after it.
+    local target="$1"
+    shift
+    if [[ -n "$_BUCKLE_COMPLETION_SERVER_ENABLED" ]] \
+        && _buckle_completion_server_request "$target" "$@"; then
+        return 0
+    fi
+    local output
+    output="$(command buckle-_complete "$@")" || return 1
+    printf -v "$target" '%s' "$output"
+}
 
-    declare -ga "${target}"="( $results $builtin_results )"
+_buckle_autocomplete_remove_stale_stamps() {
+    # Removes the memo stamps like $1 that were left behind by shells that have exited
+    local stamp stale=()
+    for stamp in "${1%-*}"-*; do
+        if [[ -e "$stamp" ]] && ! kill -0 "${stamp##*-}" 2> /dev/null; then
+            stale+=("$stamp")
+        fi
+    done
+    if (( ${#stale[@]} > 0 )); then
+        command rm -f "${stale[@]}"
+    fi
 }
 
-_buckle_autocomplete_command_arg_completions() {
-    # Sets the variable at $2 to the possible matches for the next word of the command with the
-    # namespace path indicated in $3 and the current partial word in $4.
-    local target=$1
-    local toolbelt=$2
-    local path=("${!3}")  # Expand the array reference ("arr[@]") described in $3
-
-    # Find and run any completion commands found on the path
-    local arg_completions=()
-    local nspath=''
-    for segment in "${path[@]}"; do
-        local command="${toolbelt}-${nspath}${segment}"
-        # Find any completion scripts
-        local completion_commands=($(compgen -c "${command}.completion" | sort -u))
-        for completion_command in "${completion_commands[@]}"; do
-            if [[ $completion_command =~ .(sh|bash)$ ]]; then
-                arg_completions+=($(source $completion_command))
-            else
-                arg_completions+=($(COMP_WORDS="${COMP_WORDS[@]}" COMP_CWORD=$COMP_CWORD \
-                                  $completion_command))
-            fi
-        done
-        nspath="${nspath}${segment}~"
+_buckle_autocomplete_namespace_completions() {
+    # Sets the array named $1 to the completions of an empty word following the words after it,
+    # remembered for the rest of the shell session while no directory on the path is modified.
+    local target="$1"
+    shift
+    local words=("$@")
+    local stamp="${BUCKLE_CACHE_DIR:-${XDG_CACHE_HOME:-$HOME/.cache}/buckle}/completion-memo-$$"
+
+    # Commands may have been added to or removed from any directory modified since the memo was
+    # started, or in the same second on systems that only keep whole seconds
+    local directories directory fingerprint="$PATH" current=1
+    # The extra separator keeps a trailing empty entry
+    IFS=: read -r -a directories <<< "$PATH:"
+    for directory in "${directories[@]}"; do
+        # Relative and empty entries name another directory once the shell changes directory
+        if [[ "$directory" != /* ]]; then
+            directory="$PWD${directory:+/$directory}"
+        fi
+        [[ -d "$directory" ]] || continue
+        fingerprint+=$'\n'"$directory"
+        [[ "$directory" -ot "$stamp" ]] || current=''
     done
+    if [[ -z "$current" ]]; then
+        if [[ ! -e "$stamp" ]]; then
+            _buckle_autocomplete_remove_stale_stamps "$stamp"
+        fi
+        _BUCKLE_COMPLETION_MEMO=()
+        # Nothing is remembered until the cache directory exists
+        { : > "$stamp"; } 2> /dev/null || true
+    fi
 
-    declare -ga "${target}"="(${arg_completions[*]})"
+    local key
+    printf -v key '%s\x1f' "$fingerprint" "${words[@]}"
+    local listing="${_BUCKLE_COMPLETION_MEMO[$key]}"
+    if [[ -z "${_BUCKLE_COMPLETION_MEMO[$key]+found}" ]]; then
+        if _buckle_autocomplete_request listing "${words[0]}" "${#words[@]}" "${words[@]}" '' \
+            && [[ -e "$stamp" ]]; then
+            _BUCKLE_COMPLETION_MEMO[$key]="$listing"
+        fi
+    fi
+
+    eval "${target}=()"
+    if [[ -n "$listing" ]]; then
+        mapfile -t "$target" <<< "$listing"
+    fi
 }
 
 _buckle_autocomplete_hook() {
@@ -67,34 +142,160 @@ _buckle_autocomplete_hook() {
     # Sets words_, a version of COMP_WORDS with the input characters as exclusions for word breaks
     # Also sets cword_, the index of the current word in words_
     __buckle_reassemble_comp_words_by_ref '=:'
+    local current_word="${words_[cword_]}"
 
-    local current_word="${words_[$cword_]}"
+    # Candidates for the current word and the completion commands to run, in order
+    local completions
+    if [[ "$current_word" = [_.]* ]]; then
+        # Only completed once the '_' or '.' is typed, so not in the namespace's completions
+        local listing=''
+        _buckle_autocomplete_request listing "$toolbelt" "$cword_" "${words_[@]}" || true
+        mapfile -t completions <<< "$listing"
+    else
+        _buckle_autocomplete_namespace_completions completions "$toolbelt" \
+            "${words_[@]:1:cword_-1}"
+    fi
 
-    # Gather the namespace arguments into an array. Ignores the current word and the first "help"
-    local nspath=()
-    local help_found=''
-    for arg in "${words_[@]:1:$(($cword_ - 1))}"; do
-        if [[ "$arg" = "help" && -z "$help_found" ]]; then
-            help_found=1
-        elif [[ ! ("$arg" = "-"* && -z "$nspath") ]]; then  # Ignore buckle options
-            nspath+=("$arg")
-        fi
+    COMPREPLY=()
+    local completion value completion_commands=''
+    for completion in "${completions[@]}"; do
+        value="${completion#*$'\t'}"
+        case "${completion%%$'\t'*}" in
+            word)
+                if [[ "$value" = "$current_word"* ]]; then
+                    COMPREPLY+=("$value")
+                fi
+                ;;
+            completion)
+                completion_commands=1
+                ;;
+        esac
+    done
+    [[ -n "$completion_commands" ]] || return 0
+
+    # Candidates for the arguments of the command, from its and its namespaces' completion commands
+    mapfile -t completions < <(COMP_WORDS="${COMP_WORDS[@]}" COMP_CWORD=$COMP_CWORD \
+        command buckle-_complete --run-completion-commands "$toolbelt" "$cword_" "${words_[@]}")
+    for completion in "${completions[@]}"; do
+        value="${completion#*$'\t'}"
+        case "${completion%%$'\t'*}" in
+            word)
+                COMPREPLY+=("$value")
+                ;;
+            completion)
+                _buckle_autocomplete_source_completion_command COMPREPLY "$value"
+                ;;
+        esac
     done
+}
 
-    _buckle_autocomplete_find_matches COMPREPLY "${toolbelt}" nspath[@] "$current_word"
+_buckle_fast_dispatch_load() {
+    # Loads the dispatch table for toolbelt $1 written by buckle, unless it's already loaded.
+    # Returns non-zero if there's no table for the toolbelt that is current.
+    local toolbelt="$1"
+    local table="$2"
 
-    _buckle_autocomplete_command_arg_completions _BUCKLE_COMMAND_ARG_COMPLETIONS "${toolbelt}" \
-        nspath[@]
-    COMPREPLY+=("${_BUCKLE_COMMAND_ARG_COMPLETIONS[@]}")
+    local header
+    read -r header 2> /dev/null < "$table" || return 1
+    if [[ "$header" != "# buckle dispatch table ${_BUCKLE_DISPATCH_GENERATION}" ]]; then
+        source "$table" || return 1
+    fi
+    [[ "$_BUCKLE_DISPATCH_TOOLBELT" = "$toolbelt" && "$_BUCKLE_DISPATCH_PATH" = "$PATH" ]] \
+        || return 1
+
+    local opts_variable="BUCKLE_OPTS_${toolbelt^^}"
+    [[ "${!opts_variable}" = "$_BUCKLE_DISPATCH_OPTS" ]] || return 1
+
+    if [[ -n "$_BUCKLE_DISPATCH_NEXT_CHECK_TIME" ]]; then
+        local now
+        printf -v now '%(%s)T' -1
+        (( now < _BUCKLE_DISPATCH_NEXT_CHECK_TIME )) || return 1  # An update or clock check is due
+    fi
 
-    # Add in help as an autocomplete option if current word has been started and matches 'help'
-    if [[ -z "$help_found" ]] && [[ "help" = "$current_word"* ]]; then
-        # Check to see if we have completed a namespace prior to 'help'
-        _buckle_autocomplete_find_matches _BUCKLE_HELP_MATCHES "${toolbelt}" nspath[@]
-        if [[ -n $_BUCKLE_HELP_MATCHES ]]; then
-            COMPREPLY+=("help")
+    # Commands may have been added to or removed from any directory modified since it was written
+    local directory
+    for directory in "${_BUCKLE_DISPATCH_DIRECTORIES[@]}"; do
+        [[ "$directory" -nt "$table" ]] && return 1
+    done
+    return 0
+}
+
+_buckle_fast_dispatch() {
+    # Runs the command for the arguments after the toolbelt name in $1 as buckle would, without
+    # starting buckle, if it can be found in the toolbelt's dispatch table.  Anything else, such as
+    # buckle options, namespace help or an update that is due, is left to buckle.
+    local toolbelt="$1"
+    shift
+    local argv=("$@")
+    local table="${BUCKLE_CACHE_DIR:-${XDG_CACHE_HOME:-$HOME/.cache}/buckle}/dispatch-${toolbelt}.bash"
+
+    local command='' location='' namespace=() dot_command_prefixes=()
+    if [[ $# > 0 && "$1" != -* ]] && _buckle_fast_dispatch_load "$toolbelt" "$table"; then
+        local prefix="${toolbelt}-"
+        while [[ $# > 0 ]]; do
+            dot_command_prefixes+=("$prefix")
+            [[ -n "${_BUCKLE_DISPATCH_COMMANDS[${prefix}$1]+found}" ]] || break
+            location="${_BUCKLE_DISPATCH_COMMANDS[${prefix}$1]}"
+            if [[ -n "$location" ]]; then
+                command="$1"
+                shift
+                break
+            fi
+            # A namespace
+            namespace+=("$1")
+            prefix="${prefix}$1~"
+            shift
+        done
+    fi
+
+    local dot_commands=() group dot_command
+    if [[ -n "$command" && "$command" != .* ]]; then
+        for prefix in "${dot_command_prefixes[@]}"; do
+            [[ -n "${_BUCKLE_DISPATCH_DOT_COMMANDS[$prefix]}" ]] || continue
+            IFS=$'\t' read -r -a group <<< "${_BUCKLE_DISPATCH_DOT_COMMANDS[$prefix]}"
+            if [[ "$_BUCKLE_DISPATCH_PARALLEL_DOT_COMMANDS" = namespace ]] && (( ${#group[@]} > 1 ))
+            then
+                command=''  # Leave running them at the same time to buckle
+            fi
+            for dot_command in "${group[@]}"; do
+                if [[ -n "${_BUCKLE_DISPATCH_CACHED_DOT_COMMANDS[$dot_command]}" ]]; then
+                    command=''  # Leave reusing its cached result to buckle
+                fi
+            done
+            dot_commands+=("${group[@]}")
+        done
+        if [[ "$_BUCKLE_DISPATCH_PARALLEL_DOT_COMMANDS" = all ]] && (( ${#dot_commands[@]} > 1 ))
+        then
+            command=''
         fi
     fi
+
+    if [[ -z "$command" ]]; then
+        BUCKLE_TOOLBELT_NAME="$toolbelt" BUCKLE_FAST_DISPATCH=1 command buckle "${argv[@]}"
+        return
+    fi
+
+    local words=("${namespace[@]}" "$command")
+    local IFS=' '
+    local invocation="${words[*]}"
+    for dot_command in "${dot_commands[@]}"; do
+        if ! BUCKLE_TOOLBELT_NAME="$toolbelt" "$dot_command" "$invocation" "$@"; then
+            local error="ERROR: ${toolbelt}: Dot command '${dot_command##*/}' failed."
+            if [[ -n "$TERM" ]]; then
+                error=$'\033[31m'"${error}"$'\033[0m'
+            fi
+            echo "$error" >&2
+            return 1
+        fi
+    done
+
+    (export BUCKLE_TOOLBELT_NAME="$toolbelt"; exec -a "${location##*/}" "$location" "$@")
+}
+
+_buckle_fast_dispatch_setup() {
+    # Defines a function named after the toolbelt that runs its commands through the fast path
+    local name="$1"
+    eval "${name}() { _buckle_fast_dispatch ${name} \"\$@\"; }"
 }
 
 _buckle_autocomplete_setup() {
@@ -0,0 +1,92 @@
+""" Minimal ctypes binding to Linux's inotify file system event API. """
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+
+# Events, from <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+READ_SIZE = 64 * 1024
+
+
+class InotifyUnavailable(Exception):
+    pass
+
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        for function in ('inotify_init1', 'inotify_add_watch', 'inotify_rm_watch'):
+            getattr(libc, function)
+    except (OSError, AttributeError):
+        raise InotifyUnavailable('inotify is not supported on this system.')
+    return libc
+
+
+def _raise_errno(message):
+    error = ctypes.get_errno()
+    raise OSError(error, '{}: {}'.format(message, os.strerror(error)))
+
+
+class Inotify(object):
+    """ A non-blocking inotify instance.  Poll fileno() for readability and then read_events(). """
+
+    def __init__(self):
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            _raise_errno('inotify_init1')
+
+    def fileno(self):
+        return self._fd
+
+    def add_watch(self, path, mask):
+        """ Returns the watch descriptor for path.  Raises OSError if path can't be watched. """
+        wd = self._libc.inotify_add_watch(self._fd, path.encode('utf-8'), mask)
+        if wd < 0:
+            _raise_errno("Unable to watch '{}'".format(path))
+        return wd
+
+    def rm_watch(self, wd):
+        self._libc.inotify_rm_watch(self._fd, wd)
+
+    def read_events(self):
+        """ Returns a list of (wd, mask, cookie, name) for each pending event. """
+        try:
+            data = os.read(self._fd, READ_SIZE)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return []
+            raise
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace')
+            offset += length
+            events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
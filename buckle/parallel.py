@@ -0,0 +1,164 @@
+""" Runs commands concurrently while keeping their output grouped by command. """
+
+import collections
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+POLL_INTERVAL = 0.01  # Seconds between checks for commands that have finished
+TERMINATE_TIMEOUT = 1  # Seconds to wait for stopped commands to exit before they are killed
+
+
+def _write(stream, data):
+    stream.flush()
+    getattr(stream, 'buffer', stream).write(data)
+    stream.flush()
+
+
+class _Process(object):
+    """ A command whose output is held back until it's replayed. """
+
+    def __init__(self, args, shell=False):
+        self.args = args
+        self._stdout = tempfile.TemporaryFile()
+        self._stderr = tempfile.TemporaryFile()
+        with open(os.devnull) as devnull:
+            # Started in its own process group so that anything it starts is stopped along with it
+            self.popen = subprocess.Popen(args, shell=shell, stdin=devnull, stdout=self._stdout,
+                                          stderr=self._stderr, preexec_fn=os.setpgrp)
+
+    def read_output(self):
+        self._stdout.seek(0)
+        return self._stdout.read()
+
+    def replay(self):
+        for output, stream in ((self._stdout, sys.stdout), (self._stderr, sys.stderr)):
+            output.seek(0)
+            _write(stream, output.read())
+        self.close()
+
+    def signal(self, signum):
+        try:
+            os.killpg(self.popen.pid, signum)
+        except OSError:
+            pass  # Already exited
+
+    def close(self):
+        self._stdout.close()
+        self._stderr.close()
+
+
+def _stop(processes, timeout=TERMINATE_TIMEOUT):
+    """ Asks the processes to exit, and kills any that haven't after timeout seconds. """
+    for process in processes:
+        process.signal(signal.SIGTERM)
+
+    deadline = time.time() + timeout
+    while time.time() < deadline and any(p.popen.poll() is None for p in processes):
+        time.sleep(POLL_INTERVAL)
+
+    for process in processes:
+        if process.popen.poll() is None:
+            process.signal(signal.SIGKILL)  # Not waited for, as it can't be ignored
+
+
+def check_call_all(commands):
+    """ Runs the commands at the same time, as subprocess.check_call would one after another.
+
+    The output of each command is held back and written in the order of the commands, so that it is
+    grouped as if they had run one at a time.  The commands can't read from standard input.
+
+    Args:
+        commands: A list of the arguments of each command.
+
+    Raises:
+        subprocess.CalledProcessError for the first command to fail, once the rest are stopped.
+    """
+    processes = []
+    try:
+        for args in commands:
+            processes.append(_Process(args))
+
+        replayed = 0
+        while replayed < len(processes):
+            failed = next((p for p in processes if p.popen.poll() not in (None, 0)), None)
+            if failed:
+                _stop([p for p in processes if p.popen.poll() is None])
+                for process in processes[replayed:]:
+                    if process.popen.returncode == 0:
+                        process.replay()
+                failed.replay()
+                raise subprocess.CalledProcessError(failed.popen.returncode, failed.args)
+
+            while replayed < len(processes) and processes[replayed].popen.poll() == 0:
+                processes[replayed].replay()
+                replayed += 1
+
+            if replayed < len(processes):
+                time.sleep(POLL_INTERVAL)
+    finally:
+        _stop([p for p in processes if p.popen.poll() is None])
+        for process in processes:
+            process.close()
+
+
+def iter_outputs(commands, timeout, max_running, shell=False, deadline=None):
+    """ Runs the commands, a number at a time, and yields what each writes to standard output.
+
+    Commands are started in the order given.  Anything a command that takes too long has started is
+    killed along with it.  The commands can't read from standard input and what they write to
+    standard error is discarded.
+
+    Args:
+        commands: A list of the arguments of each command.
+        timeout: Seconds each command is given to finish.
+        max_running: The most commands to run at the same time.
+        shell: Whether each command is a string to run with the shell, as for subprocess.Popen.
+        deadline: Time in seconds since the epoch to stop any commands still waiting or running
+            at, or None to run all of them.  May also be a list of one such time for each command.
+
+    Yields:
+        (i, output) as each command finishes, where i is the index of the command and output is
+        the bytes it wrote, or None if it failed or took too long.  Nothing is yielded for
+        commands stopped at their deadline.
+    """
+    deadlines = deadline if isinstance(deadline, list) else [deadline] * len(commands)
+    waiting = collections.deque(enumerate(commands))
+    running = {}  # Deadline of each running process by the index of its command
+    try:
+        while waiting or running:
+            now = time.time()
+            expired = [i for i in running if deadlines[i] is not None and now >= deadlines[i]]
+            if expired:
+                # Their time is up, so they aren't given any more to exit
+                _stop([running[i][0] for i in expired], timeout=0)
+                for i in expired:
+                    running.pop(i)[0].close()
+            waiting = collections.deque((i, args) for i, args in waiting
+                                        if deadlines[i] is None or now < deadlines[i])
+
+            while waiting and len(running) < max_running:
+                i, args = waiting.popleft()
+                running[i] = (_Process(args, shell=shell), time.time() + timeout)
+
+            for i, (process, process_deadline) in sorted(running.items()):
+                returncode = process.popen.poll()
+                if returncode is None:
+                    if time.time() < process_deadline:
+                        continue
+                    process.signal(signal.SIGKILL)
+                    process.popen.wait()
+                output = process.read_output() if returncode == 0 else None
+                process.close()
+                del running[i]
+                yield i, output
+
+            if running:
+                time.sleep(POLL_INTERVAL)
+    finally:
+        _stop([process for process, _ in running.values()])
+        for process, _ in running.values():
+            process.close()
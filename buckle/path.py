@@ -1,4 +1,5 @@
-from buckle import autocomplete
+from buckle import compiled_index
+from buckle import index
 
 
 class CommandOrNamespaceNotFound(Exception):
@@ -21,12 +22,13 @@ class CommandNotFound(CommandOrNamespaceNotFound):
     prefix = 'Command'
 
 
-def split_path_and_command(toolbelt_name, args, namespace_separator='~'):
+def split_path_and_command(toolbelt_name, args, namespace_separator='~', commands=None):
     """ Parses a list of arguments and separates a command from its arguments and namespace.
 
     Args:
         toolbelt_name: name of the toolbelt
         args: a list of arguments to be parsed.
+        commands: the CompiledIndex to look the command up in.  Defaults to the toolbelt's index.
 
     Returns:
         Tuple:
@@ -39,27 +41,24 @@ def split_path_and_command(toolbelt_name, args, namespace_separator='~'):
         CommandOrNamespaceNotFound
     """
 
-    # Try increasingly long command names until command can't be found
+    if commands is None:
+        commands = index.load_index(toolbelt_name)
+
+    # Walk down the namespaces until reaching a command or running out of arguments
     for cmd_end, arg in enumerate(args):
         path = list(args[:cmd_end])
         rest = list(args[cmd_end + 1:])
 
-        prefix = toolbelt_name + '-' + namespace_separator.join(path + [arg])
-
-        # Find executables where the prefix is the whole command or the prefix is a complete
-        # namespace
-        possible_executables = [
-            p for p in autocomplete.get_executables_starting_with(prefix)
-            if p == prefix or p.startswith(prefix + namespace_separator)]
+        entry = commands.get(toolbelt_name + '-' + namespace_separator.join(path + [arg]))
 
-        if possible_executables == [prefix]:
-            return path, arg, rest
-        elif possible_executables and not rest:
-            return path + [arg], None, []  # Namespace only
-        elif not possible_executables:
+        if entry is None:
             if rest:
                 raise CommandOrNamespaceNotFound(path + [arg])
             else:
                 raise CommandNotFound(path + [arg])
+        elif not entry[0] & compiled_index.NAMESPACE:
+            return path, arg, rest
+        elif not rest:
+            return path + [arg], None, []  # Namespace only
 
     return [], None, []  # Handle being called with no arguments
@@ -0,0 +1,120 @@
+""" Reads the help descriptions of commands from their source, without running them.
+
+A description is found, in order of preference, from:
+
+    the message of an 'eval "$(nd _help-helper <message>)"' line
+    the description given to argparse.ArgumentParser or the module docstring, for Python scripts
+    the block of comments following the shebang line, for other scripts
+
+Anything that can't be read reliably, such as a message built from shell variables or a
+description built at run time, is left to be found by running the command with --help.
+
+"""
+
+import ast
+import re
+import shlex
+
+MAX_SIZE = 256 * 1024  # Larger files are assumed not to be scripts
+
+HELP_HELPER = re.compile(
+    r'^[ \t]*eval[ \t]+"\$\([ \t]*[\w.-]+[ \t]+_help-helper[ \t]+(.*)\)"[ \t]*$', re.MULTILINE)
+PYTHON_SHEBANG = re.compile(r'^#!.*\bpython[\d.]*\b')
+COMMENT_DIRECTIVE = re.compile(r'^#\s*(shellcheck\s|buckle-cache:|vim?:|-\*-)')
+SHELL_EXPANSION_CHARACTERS = set('"$`\\')
+
+
+def _normalize(text):
+    """ Returns the first paragraph of text on a single line, or None if it's empty.
+
+    Its lines are joined as they are in descriptions parsed from --help output.
+    """
+    paragraph = re.split(r'\n\s*\n', text.strip(), 1)[0]
+    return paragraph.replace('\n', '') or None
+
+
+def _get_help_helper_description(arguments):
+    try:
+        message = ' '.join(shlex.split(arguments))
+    except ValueError:
+        return None
+    if SHELL_EXPANSION_CHARACTERS.intersection(message):
+        return None  # Only known once the shell has run
+    return _normalize(message)
+
+
+def _normalize_argparse(text):
+    # argparse's default formatter collapses the whitespace of descriptions before printing them
+    return _normalize(' '.join(re.split(r'\n\s*\n', text.strip(), 1)[0].split()))
+
+
+def _get_string(node):
+    if isinstance(node, getattr(ast, 'Constant', ())):  # Python 3.8+
+        return node.value if isinstance(node.value, str) else None
+    if isinstance(node, getattr(ast, 'Str', ())):
+        return node.s
+    return None
+
+
+def _get_python_description(source):
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError, TypeError):
+        return None
+
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        name = getattr(node.func, 'id', None) or getattr(node.func, 'attr', None)
+        if name != 'ArgumentParser':
+            continue
+        description = next((keyword.value for keyword in node.keywords
+                            if keyword.arg == 'description'), None)
+        if description is None:
+            break
+        if isinstance(description, ast.Name) and description.id == '__doc__':
+            return _normalize_argparse(ast.get_docstring(tree) or '')
+        # Built at run time if not a string
+        return _normalize_argparse(_get_string(description) or '')
+
+    return _normalize_argparse(ast.get_docstring(tree) or '')
+
+
+def _get_comment_description(source):
+    lines = []
+    for line in source.splitlines()[1:]:
+        line = line.strip()
+        if not line and not lines:
+            continue
+        if not line.startswith('#') or line == '#' and lines:
+            break
+        if not COMMENT_DIRECTIVE.match(line):
+            lines.append(line.lstrip('#'))
+    return _normalize('\n'.join(lines))
+
+
+def get_description(location):
+    """ Returns the help description read from the source of the command at location.
+
+    Returns:
+        The description, or None if it couldn't be read without running the command.
+    """
+    try:
+        with open(location, 'rb') as f:
+            data = f.read(MAX_SIZE + 1)
+    except (IOError, OSError):
+        return None
+    if len(data) > MAX_SIZE or b'\0' in data or not data.startswith(b'#!'):
+        return None
+    try:
+        source = data.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+    match = HELP_HELPER.search(source)
+    if match:
+        # Even if the message can't be read, it's what --help prints rather than any comments
+        return _get_help_helper_description(match.group(1))
+    if PYTHON_SHEBANG.match(source):
+        return _get_python_description(source)
+    return _get_comment_description(source)
@@ -11,20 +11,25 @@ CHECK_CLOCK_TIMEOUT = 2  # Only wait for ntp for 2 seconds
 MAX_CLOCK_SKEW_TIME = 60  # Time in seconds to tolerate for system clock offset
 
 
-def check_system_clock(message, check_clock_freq, ntp_host=DEFAULT_NTP_HOST,
-                       ntp_timeout=CHECK_CLOCK_TIMEOUT):
-    clock_checked_path = os.path.join(tempfile.gettempdir(), '.buckle_clock_last_checked')
-    current_time = time.time()
+def _get_clock_checked_path():
+    return os.path.join(tempfile.gettempdir(), '.buckle_clock_last_checked')
 
+
+def get_next_check_time(check_clock_freq):
+    """ Returns the time in seconds since the epoch that the clock is next due to be checked. """
     try:
-        clock_checked_date = os.path.getmtime(clock_checked_path)
+        clock_checked_date = os.path.getmtime(_get_clock_checked_path())
     except OSError:  # File doesn't exist
-        check_clock = True
-    else:
-        check_clock = (current_time - clock_checked_date >= check_clock_freq or
-                       check_clock_freq == 0)
+        return 0
+    return clock_checked_date + check_clock_freq if check_clock_freq else 0
+
+
+def check_system_clock(message, check_clock_freq, ntp_host=DEFAULT_NTP_HOST,
+                       ntp_timeout=CHECK_CLOCK_TIMEOUT):
+    clock_checked_path = _get_clock_checked_path()
+    current_time = time.time()
 
-    if check_clock:
+    if current_time >= get_next_check_time(check_clock_freq):
         message.info('Checking that the current machine time is accurate...')
 
         # Time in seconds since 1970 epoch
@@ -12,7 +12,10 @@ setup(
     scripts=['bin/buckle',
              'bin/buckle-init',
              'bin/buckle-help',
+             'bin/buckle-index',
              'bin/buckle-_help-helper',
+             'bin/buckle-_indexd',
+             'bin/buckle-_complete',
              'bin/buckle-readme',
              'bin/buckle-version',
              ],
@@ -23,11 +26,6 @@ setup(
     tests_require=[
         'pytest',
     ],
-    extras_require={
-        ':python_version < "3.3"': [
-            'subprocess32',
-        ],
-    },
     url='https://github.com/Nextdoor/buckle',
     include_package_data=True
 )
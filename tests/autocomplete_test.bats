@@ -4,6 +4,8 @@ load test_helpers
 
 setup() {
 	_shared_setup ns
+	export BUCKLE_CACHE_DIR="$TMPDIR/cache"
+	mkdir "$BUCKLE_CACHE_DIR"  # Completions are only remembered once it exists
 	source $BATS_TEST_DIRNAME/../buckle/init.sh -
 	_buckle_autocomplete_setup belt
 }
@@ -244,15 +246,143 @@ EOF
 	    = "${COMPREPLY[@]}" ]]
 }
 
-@test "_buckle_autocomplete_command_arg_completions sets completion from 'sourced' script output" {
+@test "'belt <namespace> <command>' includes autocomplete choices from a 'sourced' script" {
     make_empty_command belt-my-namespace~my-command
     make_executable_command belt-my-namespace~my-command.completion.sh <<- 'EOF'
 		echo "${COMP_WORDS[@]} word$COMP_CWORD $SOMETHING_NOT_EXPORTED"
 EOF
     SOMETHING_NOT_EXPORTED=something_not_exported
-    COMP_WORDS=(belt my-namespace my-command my-arg)
-    COMP_CWORD=3
-	NSPATH=(my-namespace my-command)
-	_buckle_autocomplete_command_arg_completions COMPLETIONS belt NSPATH[@]
-	[[ "belt my-namespace my-command my-arg word3 something_not_exported" = "${COMPLETIONS[@]}" ]]
+	COMP_WORDS=(belt my-namespace my-command my-arg)
+	COMP_CWORD=3 _buckle_autocomplete_hook
+	[[ "belt my-namespace my-command my-arg word3 something_not_exported" = "${COMPREPLY[@]}" ]]
+}
+
+@test "'belt <tab>' remembers the completions of a namespace while the path is unchanged" {
+	make_empty_command belt-my-command
+	COMP_WORDS=(belt my)
+	COMP_CWORD=1 _buckle_autocomplete_hook
+	[[ "my-command" = "${COMPREPLY[*]}" ]]
+
+	# Removing a command without changing the modification time of its directory goes unnoticed
+	rm "$TEST_DIRECTORY/belt-my-command"
+	touch -d '2000-01-01' "$TEST_DIRECTORY"
+	COMP_WORDS=(belt my-c)
+	COMP_CWORD=1 _buckle_autocomplete_hook
+	[[ "my-command" = "${COMPREPLY[*]}" ]]
+}
+
+@test "'belt <tab>' completes commands added since the completions of a namespace were remembered" {
+	make_empty_command belt-my-command
+	COMP_WORDS=(belt my)
+	COMP_CWORD=1 _buckle_autocomplete_hook
+	[[ "my-command" = "${COMPREPLY[*]}" ]]
+
+	sleep 1
+	touch "$TEST_DIRECTORY/belt-my-other-command"
+	chmod +x "$TEST_DIRECTORY/belt-my-other-command"
+	COMP_CWORD=1 _buckle_autocomplete_hook
+	[[ "my-command my-other-command" = "${COMPREPLY[*]}" ]]
+}
+
+@test "'belt <tab>' doesn't remember completions from relative path entries across directories" {
+	for directory in first second; do
+		mkdir -p "$TMPDIR/$directory/bin"
+		touch "$TMPDIR/$directory/bin/belt-my-$directory-command"
+		chmod +x "$TMPDIR/$directory/bin/belt-my-$directory-command"
+	done
+	PATH="bin:$PATH"
+	sleep 1  # So that neither directory is newer than the memo
+	cd "$TMPDIR/first"
+	COMP_WORDS=(belt my)
+	COMP_CWORD=1 _buckle_autocomplete_hook
+	[[ "my-first-command" = "${COMPREPLY[*]}" ]]
+
+	cd "$TMPDIR/second"
+	COMP_CWORD=1 _buckle_autocomplete_hook
+	[[ "my-second-command" = "${COMPREPLY[*]}" ]]
+}
+
+@test "'belt <command> <tab>' gives slow cached completion commands' candidates once refreshed in the background" {
+    make_empty_command belt-my-command
+    make_executable_command belt-my-command.completion <<- 'EOF'
+		#!/usr/bin/env bash
+		# buckle-cache: ttl=60
+		sleep 1
+		echo apple banana
+EOF
+	export BUCKLE_COMPLETION_DEADLINE=0.1
+	COMP_WORDS=(belt my-command b)
+	COMP_CWORD=2 _buckle_autocomplete_hook
+	[[ -z "${COMPREPLY[*]}" ]]
+
+	sleep 2
+	COMP_CWORD=2 _buckle_autocomplete_hook
+	[[ "banana" = "${COMPREPLY[*]}" ]]
+}
+
+@test "'belt <tab>' completes commands from the completion server" {
+	make_empty_command belt-my-command
+	_buckle_completion_server_setup
+	server_id="$_BUCKLE_COMPLETION_SERVER_ID"
+	COMP_WORDS=(belt my)
+	COMP_CWORD=1 _buckle_autocomplete_hook
+	[[ "my-command" = "${COMPREPLY[*]}" ]]
+	[[ "$_BUCKLE_COMPLETION_SERVER_ID" = "$server_id" ]]
+	kill "$server_id"
+}
+
+@test "'belt <tab>' completes commands from relative path entries in the shell's directory" {
+	mkdir "$TMPDIR/first" "$TMPDIR/second"
+	make_empty_command belt-my-command < /dev/null
+	mv "$TEST_DIRECTORY/belt-my-command" "$TMPDIR/first/"
+	touch "$TMPDIR/second/belt-my-other-command"
+	chmod +x "$TMPDIR/second/belt-my-other-command"
+	PATH=".:$PATH"
+	_buckle_completion_server_setup
+	cd "$TMPDIR/first"
+	COMP_WORDS=(belt my)
+	COMP_CWORD=1 _buckle_autocomplete_hook
+	[[ "my-command" = "${COMPREPLY[*]}" ]]
+
+	cd "$TMPDIR/second"
+	_BUCKLE_COMPLETION_MEMO=()  # Only the server is under test
+	COMP_CWORD=1 _buckle_autocomplete_hook
+	[[ "my-other-command" = "${COMPREPLY[*]}" ]]
+	kill "$_BUCKLE_COMPLETION_SERVER_ID"
+}
+
+@test "'belt <tab>' restarts the completion server if it has exited" {
+	make_empty_command belt-my-command
+	_buckle_completion_server_setup
+	server_id="$_BUCKLE_COMPLETION_SERVER_ID"
+	COMP_WORDS=(belt _)
+	COMP_CWORD=1 _buckle_autocomplete_hook
+	kill "$server_id"
+	sleep 0.5
+
+	COMP_WORDS=(belt my)
+	COMP_CWORD=1 _buckle_autocomplete_hook
+	[[ "my-command" = "${COMPREPLY[*]}" ]]
+	[[ -n "$_BUCKLE_COMPLETION_SERVER_ID" && "$_BUCKLE_COMPLETION_SERVER_ID" != "$server_id" ]]
+	kill "$_BUCKLE_COMPLETION_SERVER_ID"
+}
+
+@test "the completion server exits once the shell closes its input" {
+	_buckle_completion_server_setup
+	server_id="$_BUCKLE_COMPLETION_SERVER_ID"
+	exec {_BUCKLE_COMPLETION_SERVER[1]}>&-
+	for attempt in {1..20}; do
+		kill -0 "$server_id" 2> /dev/null || break
+		sleep 0.1
+	done
+	! kill -0 "$server_id" 2> /dev/null
+}
+
+@test "'belt <tab>' removes the completion memo stamps of shells that have exited" {
+	make_empty_command belt-my-command
+	touch "$BUCKLE_CACHE_DIR/completion-memo-999999999"
+	COMP_WORDS=(belt my)
+	COMP_CWORD=1 _buckle_autocomplete_hook
+	[[ ! -e "$BUCKLE_CACHE_DIR/completion-memo-999999999" ]]
+	[[ -e "$BUCKLE_CACHE_DIR/completion-memo-$$" ]]
 }
@@ -0,0 +1,229 @@
+""" Dispatch latency benchmarks
+
+Generates synthetic toolbelts in a temporary directory and times how long buckle takes to resolve
+a command, list help for the toolbelt and dispatch to a no-op command at different scales.
+
+Run 'python tests/benchmarks/bench_dispatch.py --help' for the available options.
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import contextlib
+import itertools
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+from buckle.commands import base
+from buckle.commands import help
+
+TOOLBELT_NAME = 'bench'
+NAMESPACE_BRANCHING = 4  # Namespaces in each namespace of a synthetic toolbelt
+
+BUCKLE_SCRIPT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../bin/buckle'))
+
+COMMAND_SCRIPT = """\
+#!/bin/sh
+if [ "$1" = "--help" ]; then
+    echo "Synthetic command {number}"
+fi
+"""
+
+DOT_COMMAND_SCRIPT = """\
+#!/bin/sh
+exit 0
+"""
+
+BENCHMARKS = ('resolve', 'resolve-cold', 'help', 'dispatch')
+
+
+class Toolbelt(object):
+    """ A synthetic toolbelt of no-op commands spread across the directories of a path. """
+
+    def __init__(self, root, commands, depth, path_dirs, dot_commands):
+        self.root = root
+        self.directories = [os.path.join(root, 'bin{}'.format(i)) for i in range(path_dirs)]
+        for directory in self.directories:
+            os.mkdir(directory)
+
+        self.command_paths = []
+        for number in range(commands):
+            namespaces = ['ns{}'.format((number // NAMESPACE_BRANCHING ** level) %
+                                        NAMESPACE_BRANCHING)
+                          for level in range(depth - 1)]
+            self.command_paths.append(namespaces + ['cmd{}'.format(number)])
+            self._make_executable(number, '~'.join(self.command_paths[-1]),
+                                  COMMAND_SCRIPT.format(number=number))
+
+        # Dot commands at each depth of the last command's namespace path
+        for number in range(dot_commands):
+            namespaces = self.command_paths[-1][:number % depth]
+            self._make_executable(number, '~'.join(namespaces + ['.check{}'.format(number)]),
+                                  DOT_COMMAND_SCRIPT)
+
+        # Backdated so that the directories aren't rescanned as too recently modified to cache
+        mtime = time.time() - 60
+        for directory in self.directories:
+            os.utime(directory, (mtime, mtime))
+
+        self.path = os.pathsep.join(self.directories + [os.getenv('PATH', '')])
+
+    def _make_executable(self, number, name, contents):
+        location = os.path.join(self.directories[number % len(self.directories)],
+                                '{}-{}'.format(TOOLBELT_NAME, name))
+        with open(location, 'w') as f:
+            f.write(contents)
+        os.chmod(location, 0o755)
+
+    @property
+    def target(self):
+        """ The arguments of the deepest command, which has the most dot commands to run. """
+        return self.command_paths[-1]
+
+
+@contextlib.contextmanager
+def environment(**variables):
+    original = dict((name, os.environ.get(name)) for name in variables)
+    os.environ.update(variables)
+    try:
+        yield
+    finally:
+        for name, value in original.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@contextlib.contextmanager
+def stdout_to_devnull():
+    saved = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            yield
+        finally:
+            sys.stdout = saved
+
+
+def time_resolve(toolbelt, cache_dir):
+    start = timeit.default_timer()
+    base.Command(TOOLBELT_NAME).parse_args(['--no-update', '--no-clock-check'] + toolbelt.target)
+    return timeit.default_timer() - start
+
+
+def time_resolve_cold(toolbelt, cache_dir):
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    return time_resolve(toolbelt, cache_dir)
+
+
+def time_help(toolbelt, cache_dir):
+    args = argparse.Namespace(path=[], exclude=[], budget=0, collapse=False)
+    with stdout_to_devnull():
+        start = timeit.default_timer()
+        help.print_help_for_all_commands(TOOLBELT_NAME, None, args)
+        return timeit.default_timer() - start
+
+
+def time_dispatch(toolbelt, cache_dir):
+    start = timeit.default_timer()
+    subprocess.check_call([sys.executable, BUCKLE_SCRIPT, '--no-update', '--no-clock-check'] +
+                          toolbelt.target)
+    return timeit.default_timer() - start
+
+
+TIMERS = {
+    'resolve': time_resolve,
+    'resolve-cold': time_resolve_cold,
+    'help': time_help,
+    'dispatch': time_dispatch,
+}
+
+
+def percentile(samples, fraction):
+    """ Returns the nearest-rank percentile of the samples. """
+    ordered = sorted(samples)
+    rank = int(math.ceil(fraction * len(ordered)))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+def summarize(samples):
+    return {
+        'n': len(samples),
+        'min': min(samples),
+        'median': percentile(samples, 0.5),
+        'p90': percentile(samples, 0.9),
+        'p99': percentile(samples, 0.99),
+        'max': max(samples),
+    }
+
+
+def run_benchmark(name, commands, depth, path_dirs, dot_commands, repeat):
+    """ Returns a summary of the timings in seconds of a benchmark on a new synthetic toolbelt. """
+    root = tempfile.mkdtemp(prefix='buckle-bench.')
+    try:
+        toolbelt = Toolbelt(root, commands, depth, path_dirs, dot_commands)
+        cache_dir = os.path.join(root, 'cache')
+        with environment(PATH=toolbelt.path, BUCKLE_TOOLBELT_NAME=TOOLBELT_NAME,
+                         BUCKLE_CACHE_DIR=cache_dir, COLUMNS='120'):
+            TIMERS[name](toolbelt, cache_dir)  # Warm up caches and the file system
+            samples = [TIMERS[name](toolbelt, cache_dir) for _ in range(repeat)]
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return summarize(samples)
+
+
+def format_row(values):
+    return '{:<14}{:>9}{:>7}{:>11}{:>14}{:>6}{:>11}{:>11}{:>11}{:>11}{:>11}'.format(*values)
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                     description='Times buckle dispatch on synthetic toolbelts.')
+    parser.add_argument('--benchmarks', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS),
+                        help='Benchmarks to run')
+    parser.add_argument('--commands', nargs='+', type=int, default=[10, 100, 1000, 5000],
+                        help='Numbers of commands in the toolbelt')
+    parser.add_argument('--depths', nargs='+', type=int, default=[1, 3, 6],
+                        help='Namespace depths of the commands, including the command itself')
+    parser.add_argument('--path-dirs', nargs='+', type=int, default=[1, 12],
+                        help='Numbers of directories on the path to spread commands across')
+    parser.add_argument('--dot-commands', nargs='+', type=int, default=[0, 5],
+                        help='Numbers of dot commands in the namespaces of the target command')
+    parser.add_argument('--help-max-commands', type=int, default=500,
+                        help='Skip the help benchmark for toolbelts with more commands')
+    parser.add_argument('--repeat', type=int, default=10, help='Timed runs of each benchmark')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON lines')
+    args = parser.parse_args(argv[1:])
+
+    if not args.json:
+        print(format_row(['benchmark', 'commands', 'depth', 'path dirs', 'dot commands', 'n',
+                          'min ms', 'median ms', 'p90 ms', 'p99 ms', 'max ms']))
+
+    for name, commands, depth, path_dirs, dot_commands in itertools.product(
+            args.benchmarks, args.commands, args.depths, args.path_dirs, args.dot_commands):
+        if name == 'help' and commands > args.help_max_commands:
+            continue
+
+        summary = run_benchmark(name, commands, depth, path_dirs, dot_commands, args.repeat)
+        if args.json:
+            summary.update(benchmark=name, commands=commands, depth=depth, path_dirs=path_dirs,
+                           dot_commands=dot_commands)
+            print(json.dumps(summary, sort_keys=True))
+        else:
+            print(format_row([name, commands, depth, path_dirs, dot_commands, summary['n']] +
+                             ['{:.2f}'.format(summary[key] * 1000)
+                              for key in ('min', 'median', 'p90', 'p99', 'max')]))
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,35 @@
+import json
+
+import pytest  # noqa
+
+import bench_dispatch
+
+
+class TestPercentile:
+    def test_nearest_rank(self):
+        samples = list(range(1, 101))
+        assert bench_dispatch.percentile(samples, 0.5) == 50
+        assert bench_dispatch.percentile(samples, 0.9) == 90
+        assert bench_dispatch.percentile(samples, 0.99) == 99
+
+    def test_single_sample(self):
+        assert bench_dispatch.percentile([3], 0.99) == 3
+
+
+class TestToolbelt:
+    def test_target_is_deepest_command(self, tmpdir):
+        toolbelt = bench_dispatch.Toolbelt(str(tmpdir), 20, 3, 2, 2)
+        assert len(toolbelt.target) == 3
+        assert tmpdir.join('bin1', 'bench-' + '~'.join(toolbelt.target)).check()
+        assert tmpdir.join('bin0', 'bench-.check0').check()
+        assert tmpdir.join('bin1', 'bench-{}~.check1'.format(toolbelt.target[0])).check()
+
+
+class TestMain:
+    def test_runs_each_benchmark(self, capsys):
+        bench_dispatch.main(['bench_dispatch.py', '--commands', '10', '--depths', '2',
+                             '--path-dirs', '2', '--dot-commands', '1', '--repeat', '1', '--json'])
+        out, _ = capsys.readouterr()
+        results = [json.loads(line) for line in out.splitlines()]
+        assert [r['benchmark'] for r in results] == list(bench_dispatch.BENCHMARKS)
+        assert all(r['n'] == 1 and r['min'] <= r['median'] <= r['p99'] for r in results)
@@ -1,7 +1,15 @@
+import argparse
+import mock
+import os
+import subprocess
+import time
+
 import pytest  # flake8: noqa
 
 from fixtures import executable_factory, run_as_child, readerr, readout
 
+from buckle import dispatch
+from buckle import index
 from buckle.commands import base
 
 
@@ -93,6 +101,19 @@ class TestBaseCommand:
             self.run_as_child(base.main, ['buckle', 'help', 'my-command'])
         assert output == 'my-command'
 
+    def test_runs_command_without_starting_a_shell(self):
+        """ The command is run directly from the location it was resolved to """
+
+        self.executable_factory('nd-my-command', '#!/bin/bash\necho my command output')
+
+        def run():
+            with mock.patch.object(subprocess, 'check_output', side_effect=AssertionError):
+                base.main(['buckle', 'my-command'])
+
+        with self.readout() as output:
+            self.run_as_child(run)
+        assert output == 'my command output\n'
+
     def test_command_or_namespace_not_found(self):
         """ Handle being given a command or namespace not in path """
 
@@ -208,6 +229,47 @@ class TestParseArgs:
         assert ('nd', ['my-namespace'], 'my-command', ['arg']) == self.split(
             'nd', 'my-namespace', 'my-command', 'arg')
 
+    def test_executable(self, executable_factory):
+        """ The location of the command's executable is resolved, favoring builtin commands """
+
+        command_path = executable_factory('nd-my-command')
+        builtin_path = executable_factory('buckle-init')
+        executable_factory('nd-init')
+        help_path = executable_factory('buckle-help')
+
+        assert base.Command('nd').parse_args(['my-command'])[1].executable == command_path
+        assert base.Command('nd').parse_args(['init'])[1].executable == builtin_path
+        assert base.Command('nd').parse_args([])[1].executable == help_path
+
+    def test_parsed_and_resolved_once(self, executable_factory):
+        """ Parsing the same arguments again reuses the first result """
+
+        executable_factory('nd-my-command')
+        command = base.Command('nd')
+        argv = ['--no-update', 'my-command', 'arg']
+
+        parse_known_args = argparse.ArgumentParser.parse_known_args
+        with mock.patch.object(index, 'load_index', wraps=index.load_index) as load_index, \
+                mock.patch.object(argparse.ArgumentParser, 'parse_known_args', autospec=True,
+                                  side_effect=parse_known_args) as parse:
+            toolbelt, args = command.parse_args(argv, known_only=False)
+            command.maybe_reload_with_updates(argv)
+            assert command.parse_args(argv, known_only=True) == (toolbelt, args)
+        assert load_index.call_count == 1
+        assert parse.call_count == 1
+        assert (toolbelt, args.command, args.args) == ('nd', 'my-command', ['arg'])
+
+    def test_unknown_arguments(self, executable_factory, readerr):
+        """ Unknown arguments are allowed unless only known arguments are requested """
+
+        executable_factory('nd-my-command')
+        command = base.Command('nd')
+
+        assert command.parse_args(['--unknown', 'my-command'], known_only=False)
+        with readerr() as errout, pytest.raises(SystemExit):
+            command.parse_args(['--unknown', 'my-command'], known_only=True)
+        assert 'unrecognized arguments: --unknown' in errout
+
     def test_missing_commands(self, executable_factory):
         """ Handle being given a missing command with or without namespaces """
         executable_factory('nd-my-namespace~my-command')
@@ -220,6 +282,19 @@ class TestParseArgs:
             self.split('nd', 'my-namespace', 'missing')
         assert "Command 'missing' not found in 'my-namespace" in str(exc_info.value)
 
+    def test_commands_made_executable_since_indexed(self, executable_factory, tmpdir):
+        """ Commands that were made executable without changing their directory are found """
+
+        location = executable_factory('nd-my-command')
+        os.chmod(location, 0o644)
+        mtime = time.time() - index.RACY_MTIME_WINDOW - 10
+        os.utime(str(tmpdir), (mtime, mtime))
+        with pytest.raises(SystemExit):
+            self.split('nd', 'my-command')
+
+        os.chmod(location, 0o755)
+        assert ('nd', [], 'my-command', []) == self.split('nd', 'my-command')
+
     def test_help(self, executable_factory):
         """ Handle being given a command or namespaces for help """
 
@@ -320,3 +395,144 @@ class TestRunDotCommands:
             self.command.run_dot_commands(['my-namespace', 'subnamespace'], '', [])
         assert output == ('parent dot command output\nchild dot command output\n'
                           'grandchild dot command output\n')
+
+    def test_dot_commands_found_with_one_index_lookup(self, executable_factory, readout):
+        """ The dot commands of every namespace come from a single load of the index """
+
+        executable_factory('nd-.my-check', '#!/bin/bash\necho parent dot command output')
+        executable_factory('nd-my-namespace~subnamespace~.my-check',
+                           '#!/bin/bash\necho grandchild dot command output')
+        with mock.patch.object(base.index, 'load_index', wraps=index.load_index) as load_index, \
+                readout() as output:
+            self.command.run_dot_commands(['my-namespace', 'subnamespace'], '', [])
+        assert load_index.call_count == 1
+        assert output == 'parent dot command output\ngrandchild dot command output\n'
+
+    def test_parallel_dot_commands_keep_order(self, executable_factory, readout):
+        """ Dot commands run at the same time have their output in the order they would run """
+
+        executable_factory('nd-.my-checkA', '#!/bin/bash\nsleep 0.2; echo dot command A output')
+        executable_factory('nd-.my-checkB', '#!/bin/bash\necho dot command B output')
+        executable_factory('nd-my-namespace~.my-check',
+                           '#!/bin/bash\necho child dot command output')
+        for parallel in base.PARALLEL_DOT_COMMANDS_CHOICES:
+            with readout() as output:
+                self.command.run_dot_commands(['my-namespace'], '', [], parallel=parallel)
+            assert output == ('dot command A output\ndot command B output\n'
+                              'child dot command output\n')
+
+    def test_parallel_dot_command_fails_triggers_system_exit(self, executable_factory, readout):
+        """ No dot commands in later namespaces run after a dot command run in parallel fails """
+
+        executable_factory('nd-.my-checkA', '#!/bin/bash\nexit 1')
+        executable_factory('nd-.my-checkB', '#!/bin/bash\necho dot command B output')
+        executable_factory('nd-my-namespace~.my-check',
+                           '#!/bin/bash\necho child dot command output')
+        with readout() as output, pytest.raises(SystemExit) as exc_info:
+            self.command.run_dot_commands(['my-namespace'], '', [], parallel='namespace')
+        assert "Dot command 'nd-.my-checkA' failed." in str(exc_info.value)
+        assert 'child dot command output' not in output
+
+    def test_cached_dot_command_is_skipped(self, executable_factory, readout):
+        """ A dot command that declares its success can be reused isn't run again """
+
+        executable_factory('nd-.my-check',
+                           '#!/bin/bash\n# buckle-cache: ttl=300\necho dot command output')
+        with readout() as output:
+            self.command.run_dot_commands([], '', [])
+            self.command.run_dot_commands([], '', [])
+        assert output == 'dot command output\n'
+
+    def test_failed_dot_command_is_not_cached(self, executable_factory, tmpdir):
+        """ A dot command that fails is run again even though it declares it can be cached """
+
+        runs = tmpdir.join('runs')
+        executable_factory('nd-.my-check', '#!/bin/bash\n# buckle-cache: ttl=300\n'
+                                           'echo run >> {}\nexit 1'.format(runs))
+        for _ in range(2):
+            with pytest.raises(SystemExit):
+                self.command.run_dot_commands([], '', [])
+        assert runs.read() == 'run\nrun\n'
+
+    def test_cached_parallel_dot_commands_are_skipped(self, executable_factory, readout):
+        """ Dot commands run at the same time have their successes cached too """
+
+        executable_factory('nd-.my-checkA', '#!/bin/bash\n# buckle-cache: session\necho A')
+        executable_factory('nd-.my-checkB', '#!/bin/bash\necho B')
+        with readout() as output:
+            self.command.run_dot_commands([], '', [], parallel='all')
+            self.command.run_dot_commands([], '', [], parallel='all')
+        assert output == 'A\nB\nB\n'
+
+
+class TestSingleIndexLookup:
+    @pytest.fixture(autouse=True)
+    def set_toolbelt_name(self, monkeypatch):
+        monkeypatch.setenv('BUCKLE_TOOLBELT_NAME', 'nd')
+
+    def test_builtin_command_resolved_from_one_index(self, executable_factory):
+        """ Builtin commands are found in the same index as the toolbelt's commands """
+
+        executable_factory('buckle-my-builtin-command')
+        executable_factory('nd-my-command')
+
+        with mock.patch.object(index, 'load_index', wraps=index.load_index) as load_index:
+            toolbelt, args = base.Command('nd').parse_args(['my-builtin-command'])
+        assert (toolbelt, args.command) == ('buckle', 'my-builtin-command')
+        load_index.assert_called_once_with('nd')
+
+
+class TestGetNextCheckTime:
+    @pytest.fixture(autouse=True)
+    def set_buckle_root(self, monkeypatch, tmpdir):
+        monkeypatch.setenv('BUCKLE_ROOT', str(tmpdir))
+        self.updated_path = tmpdir.join('.updated')
+        self.updated_path.write('')
+        os.utime(str(self.updated_path), (1000, 1000))
+
+    def test_no_checks(self, monkeypatch):
+        monkeypatch.setenv('BUCKLE_OPTS_ND', '--no-update')
+        assert base.Command('nd').get_next_check_time() is None
+
+    def test_auto_update(self, monkeypatch):
+        monkeypatch.setenv('BUCKLE_OPTS_ND', '--auto-update true --update-freq 300')
+        assert base.Command('nd').get_next_check_time() == 1300
+
+    def test_update_is_due_without_update_file(self, monkeypatch):
+        self.updated_path.remove()
+        monkeypatch.setenv('BUCKLE_OPTS_ND', '--auto-update true')
+        assert base.Command('nd').get_next_check_time() == 0
+
+    def test_clock_check(self, monkeypatch):
+        monkeypatch.setenv('BUCKLE_OPTS_ND', '--clock-check true --check-clock-freq 0')
+        assert base.Command('nd').get_next_check_time() == 0
+
+
+class TestFastDispatch:
+    @pytest.fixture(autouse=True)
+    def setup(self, monkeypatch, disable_update, disable_clock_check):
+        monkeypatch.setenv('BUCKLE_TOOLBELT_NAME', 'nd')
+        monkeypatch.setenv(dispatch.FAST_DISPATCH_ENV_VAR, '1')
+
+    def test_writes_dispatch_table(self, executable_factory, readout, run_as_child, tmpdir):
+        """ Runs that the shell's fast path falls back to write its dispatch table """
+
+        executable_factory('nd-my-command', '#!/bin/bash\necho "<$BUCKLE_FAST_DISPATCH>"')
+        mtime = time.time() - index.RACY_MTIME_WINDOW - 10
+        os.utime(str(tmpdir), (mtime, mtime))
+        with readout() as output:
+            run_as_child(base.main, ['nd', 'my-command'])
+        assert output == '<>\n'
+        with open(dispatch.get_table_path('nd')) as f:
+            assert 'OPTS={}\n'.format(dispatch.quote(os.environ['BUCKLE_OPTS_ND'])) in f.read()
+
+    def test_index_loaded_once_per_run(self, executable_factory, readout, run_as_child):
+        """ Resolving the command, its dot commands and the dispatch table share one index """
+
+        executable_factory('nd-my-command', '#!/bin/bash\necho my command output')
+        executable_factory('nd-.my-check', '#!/bin/bash\necho dot command output')
+        with mock.patch.object(index, 'load_index', wraps=index.load_index) as load_index, \
+                readout() as output, pytest.raises(run_as_child.CannotExecAsTestRunner):
+            base.Command('nd').run(['my-command'])
+        assert output == 'dot command output\n'
+        assert load_index.call_count == 1
@@ -0,0 +1,67 @@
+import io
+import mock
+import os
+import time
+
+import pytest  # flake8: noqa
+
+from buckle import index
+from buckle.commands import complete
+
+from fixtures import executable_factory  # noqa
+
+
+def serve(requests):
+    responses = io.StringIO()
+    complete.serve(io.StringIO(u''.join(request + u'\n' for request in requests)), responses)
+    return responses.getvalue()
+
+
+class TestServe:
+    @staticmethod
+    @pytest.fixture(autouse=True)
+    def set_minimal_path(monkeypatch):
+        monkeypatch.setenv('PATH', '')
+
+    def test_answers_each_request(self, executable_factory, tmpdir):
+        executable_factory('nd-my-command')
+        executable_factory('nd-other-command')
+        requests = [u'/\t{}\tnd\t1\tnd\tm'.format(tmpdir), u'/\t{}\tnd\t1\tnd\to'.format(tmpdir)]
+        assert serve(requests) == 'word\tmy-command\n\nword\tother-command\n\n'
+
+    def test_completes_from_the_path_in_the_request(self, executable_factory):
+        executable_factory('nd-my-command')
+        assert serve([u'/\t/nonexistent\tnd\t1\tnd\tm']) == '\n'
+
+    def test_resolves_relative_directories_from_the_working_directory_in_the_request(
+            self, executable_factory, tmpdir):
+        executable_factory('nd-my-command')
+        requests = [u'{}\t.\tnd\t1\tnd\tm'.format(tmpdir), u'/\t.\tnd\t1\tnd\tm']
+        assert serve(requests) == 'word\tmy-command\n\n\n'
+
+    def test_sees_commands_added_between_requests(self, executable_factory, tmpdir):
+        executable_factory('nd-my-command')
+        request = u'/\t{}\tnd\t1\tnd\tm\n'.format(tmpdir)
+        requests = [request, request, u'']
+
+        def read_request():
+            if len(requests) == 2:
+                executable_factory('nd-my-other-command')  # Added after the first is answered
+            return requests.pop(0)
+
+        responses = io.StringIO()
+        complete.serve(mock.Mock(readline=read_request), responses)
+        assert responses.getvalue() == ('word\tmy-command\n\n'
+                                        'word\tmy-command\nword\tmy-other-command\n\n')
+
+    def test_reuses_the_index_while_the_path_is_unchanged(self, executable_factory, tmpdir):
+        executable_factory('nd-my-command')
+        mtime = time.time() - index.RACY_MTIME_WINDOW - 10
+        os.utime(str(tmpdir), (mtime, mtime))
+        request = u'/\t{}\tnd\t1\tnd\tm'.format(tmpdir)
+        with mock.patch.object(index, 'load_index', wraps=index.load_index) as load_index:
+            assert serve([request, request]) == 'word\tmy-command\n\n' * 2
+        assert load_index.call_count == 1
+
+    def test_answers_invalid_requests_with_nothing(self):
+        assert serve([u'invalid', u'/\t\tnd\tone\tnd']) == '\n\n'
@@ -1,6 +1,7 @@
 import mock
 import os
 import textwrap
+import time
 
 import pytest  # flake8: noqa
 
@@ -202,3 +203,197 @@ class TestNamespaceHelp:
             with mock.patch.object(help, 'HELP_TIMEOUT', 0):
                 help.main(['nd'])
         assert 'my-command   <help not found>' in message
+
+    def test_slow_help_is_collected_at_the_same_time(self, executable_factory, readout):
+        """ Help of each command is collected at the same time as the others' """
+
+        for name in ('nd-my-a-command', 'nd-my-b-command', 'nd-my-c-command'):
+            executable_factory(name, '#!/usr/bin/env bash\nsleep 1\necho {} help'.format(name))
+        start = time.time()
+        with readout() as message:
+            help.main(['nd'])
+        assert time.time() - start < 2.9
+        assert 'my-a-command   nd-my-a-command help' in message
+        assert 'my-c-command   nd-my-c-command help' in message
+
+    def test_help_of_unchanged_commands_is_cached(self, executable_factory, readout, tmpdir):
+        """ Commands are only run again for their help once they change """
+
+        runs = tmpdir.join('runs')
+        location = executable_factory(
+            'nd-my-command', make_help_command('my help message') + '\necho >> {}'.format(runs))
+        mtime = time.time() - 60
+        os.utime(location, (mtime, mtime))
+        for _ in range(2):
+            with readout() as message:
+                help.main(['nd'])
+            assert 'my-command   my help message' in message
+        assert runs.read() == '\n'
+
+        executable_factory('nd-my-command', make_help_command('my new help message'))
+        os.utime(location, (mtime + 1, mtime + 1))
+        with readout() as message:
+            help.main(['nd'])
+        assert 'my-command   my new help message' in message
+
+    def test_help_read_from_source_without_running_command(self, executable_factory, readout):
+        """ Commands whose description can be read from their source aren't run """
+
+        executable_factory('nd-my-command', """\
+            #!/bin/bash
+            # my help message
+            echo my command output""")
+        executable_factory('nd-my-other-command', """\
+            #!/bin/bash
+            eval "$(nd _help-helper my other help message)"
+            echo my other command output""")
+        with readout() as message:
+            help.main(['nd'])
+        assert 'my-command         my help message' in message
+        assert 'my-other-command   my other help message' in message
+        assert 'output' not in message
+
+    def test_rows_printed_before_slow_help_is_found(self, executable_factory):
+        """ Rows are printed once they and the rows before them are ready """
+
+        executable_factory('nd-my-a-command', make_help_command('my a help message'))
+        executable_factory('nd-my-b-command', '#!/usr/bin/env bash\nsleep 1\necho my b help')
+        rows = {}
+
+        class TimedOutput(object):
+            def write(self, text):
+                if text.startswith('   my-'):
+                    rows[text.split()[0]] = time.time() - start
+
+            def flush(self):
+                pass
+
+        start = time.time()
+        with mock.patch('sys.stdout', TimedOutput()):
+            help.main(['nd'])
+        assert rows['my-a-command'] < rows['my-b-command'] - 0.5
+
+    def test_help_pending_after_budget(self, executable_factory, readout):
+        """ Commands that don't answer within the budget are described in the background """
+
+        executable_factory('nd-my-a-command', make_help_command('my a help message'))
+        executable_factory('nd-my-b-command', '#!/usr/bin/env bash\nsleep 5\necho my b help')
+        start = time.time()
+        with mock.patch.object(help, 'describe_in_background') as describe_in_background, \
+                readout() as message:
+            help.main(['nd', '--budget', '0.5'])
+        assert time.time() - start < 1.5
+        assert 'my-a-command   my a help message' in message
+        assert 'my-b-command   <help pending>' in message
+        describe_in_background.assert_called_once_with(['nd-my-b-command'])
+
+    def test_last_description_used_after_budget(self, executable_factory, readout, monkeypatch):
+        """ Commands that don't answer within the budget show their last description """
+
+        location = executable_factory('nd-my-command', make_help_command('my help message'))
+        mtime = time.time() - 60
+        os.utime(location, (mtime, mtime))
+        with readout():
+            help.main(['nd'])
+
+        executable_factory('nd-my-command', '#!/usr/bin/env bash\nsleep 5\necho my new help')
+        os.utime(location, (mtime + 1, mtime + 1))
+        monkeypatch.setenv('BUCKLE_HELP_OPTS_ND', '--budget 0.5')
+        with mock.patch.object(help, 'describe_in_background'), readout() as message:
+            help.main(['nd'])
+        assert 'my-command   my help message' in message
+
+    def test_describe_caches_descriptions(self, executable_factory, readout, tmpdir):
+        """ Describing commands caches their descriptions without printing anything """
+
+        runs = tmpdir.join('runs')
+        location = executable_factory(
+            'nd-my-command', make_help_command('my help message') + '\necho >> {}'.format(runs))
+        mtime = time.time() - 60
+        os.utime(location, (mtime, mtime))
+        with readout() as message:
+            help.main(['nd', '--describe', 'nd-my-command'])
+        assert message == ''
+        with readout() as message:
+            help.main(['nd'])
+        assert 'my-command   my help message' in message
+        assert runs.read() == '\n'
+
+    def test_collapsed_namespaces(self, executable_factory, readout, tmpdir):
+        """ Namespaces are listed as single rows without their commands being run """
+
+        runs = tmpdir.join('runs')
+        executable_factory('nd-my-command', make_help_command('my help message'))
+        for name in ('nd-my-namespace~my-command', 'nd-my-namespace~my-sub~my-command'):
+            executable_factory(name, '#!/bin/bash\necho >> {}\necho my help'.format(runs))
+        with readout() as message:
+            help.main(['nd', '--collapse'])
+        assert str(message).endswith(
+            '   my-command     my help message\n\n'
+            '   my-namespace   <namespace of 2 commands>\n' +
+            help.TOOLBELT_DESCRIPTION.format(toolbelt='nd') + '\n')
+        assert not runs.check()
+
+    def test_collapsed_namespaces_drill_down_one_level(self, executable_factory, readout):
+        """ The commands of a namespace are listed along with its collapsed namespaces """
+
+        executable_factory('nd-my-namespace~my-command', make_help_command('my help message'))
+        executable_factory('nd-my-namespace~my-sub~my-command', make_help_command('my help'))
+        with readout() as message:
+            help.main(['nd', 'my-namespace', '--collapse'])
+        assert ('   my-namespace my-command   my help message\n\n'
+                '   my-namespace my-sub       <namespace of 1 commands>\n') in message
+
+
+class TestSearch:
+    @staticmethod
+    @pytest.fixture(autouse=True)
+    def set_minimal_path(monkeypatch):
+        monkeypatch.setenv('PATH', '/usr/bin:/bin')
+
+    @staticmethod
+    @pytest.fixture(autouse=True)
+    def mock_terminal_size(monkeypatch):
+        monkeypatch.setenv('COLUMNS', 120)
+
+    def test_lists_matching_commands(self, executable_factory, readout):
+        """ Commands whose names or descriptions match are listed with their descriptions """
+
+        executable_factory('nd-db~migrate', make_help_command('Migrates the database'))
+        executable_factory('nd-db~dump', make_help_command('Dumps the database'))
+        executable_factory('nd-deploy', make_help_command('Deploys the service'))
+        with readout() as message:
+            help.main(['nd', '--search', 'the', 'database'])
+        assert message == ('   db dump      Dumps the database\n'
+                           '   db migrate   Migrates the database\n')
+
+    def test_in_namespace(self, executable_factory, readout):
+        """ Only commands in the given namespace are searched """
+
+        executable_factory('nd-db~migrate', make_help_command('Migrates the database'))
+        executable_factory('nd-my-namespace~check', make_help_command('Checks the database'))
+        with readout() as message:
+            help.main(['nd', 'db', '--search', 'database'])
+        assert message == '   db migrate   Migrates the database\n'
+
+    def test_only_new_and_changed_commands_are_described(self, executable_factory, tmpdir):
+        """ Commands are only described again for the search index once they change """
+
+        runs = tmpdir.join('runs')
+        location = executable_factory(
+            'nd-my-command', make_help_command('my help message') + '\necho >> {}'.format(runs))
+        mtime = time.time() - 60
+        os.utime(location, (mtime, mtime))
+        with mock.patch.object(help.help_cache, 'save'):
+            for _ in range(2):
+                with pytest.raises(SystemExit):
+                    help.main(['nd', '--search', 'missing'])
+        assert runs.read() == '\n'
+
+    def test_without_matches(self, executable_factory):
+        """ Searching without a match is an error """
+
+        executable_factory('nd-my-command', make_help_command('my help message'))
+        with pytest.raises(SystemExit) as exc_info:
+            help.main(['nd', '--search', 'missing'])
+        assert "No commands match 'missing'" in str(exc_info.value)
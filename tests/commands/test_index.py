@@ -0,0 +1,28 @@
+import pytest  # flake8: noqa
+
+from fixtures import executable_factory, readerr
+
+from buckle import index as buckle_index
+from buckle.commands import index
+
+
+@pytest.fixture(autouse=True)
+def set_toolbelt_name(monkeypatch):
+    monkeypatch.setenv('BUCKLE_TOOLBELT_NAME', 'nd')
+
+
+class TestIndexBuild:
+    def test_builds_toolbelt_and_builtin_index(self, executable_factory, readerr):
+        executable_factory('nd-my-command')
+        executable_factory('buckle-my-builtin-command')
+        with readerr() as errout:
+            index.main(['nd-index', 'build'])
+        assert 'Indexed' in errout
+
+        commands = buckle_index.load_index('nd')
+        assert commands.get('nd-my-command')
+        assert commands.get('buckle-my-builtin-command')
+
+    def test_requires_action(self):
+        with pytest.raises(SystemExit):
+            index.main(['nd-index'])
@@ -0,0 +1,189 @@
+import mock
+import os
+import threading
+import time
+
+import pytest  # flake8: noqa
+
+from buckle import index
+from buckle import inotify
+from buckle.commands import indexd
+
+try:
+    inotify.Inotify().close()
+except inotify.InotifyUnavailable:
+    pytestmark = pytest.mark.skip(reason='inotify is not available')
+
+
+def make_executable(directory, name):
+    directory.join(name).write('')
+    directory.join(name).chmod(0o755)
+
+
+@pytest.fixture
+def catalog():
+    watcher = inotify.Inotify()
+    catalog = indexd.Catalog(watcher)
+
+    def process_events():
+        for wd, mask, _, name in watcher.read_events():
+            catalog.handle_event(wd, mask, name)
+
+    catalog.process_events = process_events
+    yield catalog
+    watcher.close()
+
+
+@pytest.fixture
+def server():
+    server = indexd.Server(index.get_daemon_socket_path())
+    stopped = threading.Event()
+
+    def serve():
+        while not stopped.is_set():
+            server.serve_once(timeout=0.05)
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    yield server
+    stopped.set()
+    thread.join()
+    server.close()
+
+
+class TestCatalog:
+    def test_lists_toolbelt_commands(self, catalog, tmpdir):
+        make_executable(tmpdir, 'nd-my-command')
+        make_executable(tmpdir, 'other-command')
+
+        assert catalog.commands('nd', str(tmpdir)) == {
+            'nd-my-command': str(tmpdir.join('nd-my-command'))}
+
+    def test_earlier_directories_shadow_later_ones(self, catalog, tmpdir):
+        first, second = tmpdir.mkdir('first'), tmpdir.mkdir('second')
+        make_executable(first, 'nd-my-command')
+        make_executable(second, 'nd-my-command')
+
+        search_path = os.pathsep.join([str(first), str(second)])
+        assert catalog.commands('nd', search_path) == {
+            'nd-my-command': str(first.join('nd-my-command'))}
+
+    def test_updates_when_commands_are_added_and_removed(self, catalog, tmpdir):
+        catalog.commands('nd', str(tmpdir))
+
+        make_executable(tmpdir, 'nd-my-command')
+        catalog.process_events()
+        assert list(catalog.commands('nd', str(tmpdir))) == ['nd-my-command']
+
+        tmpdir.join('nd-my-command').remove()
+        catalog.process_events()
+        assert catalog.commands('nd', str(tmpdir)) == {}
+
+    def test_updates_when_commands_are_chmodded(self, catalog, tmpdir):
+        tmpdir.join('nd-my-command').write('')
+        assert catalog.commands('nd', str(tmpdir)) == {}
+
+        tmpdir.join('nd-my-command').chmod(0o755)
+        catalog.process_events()
+        assert list(catalog.commands('nd', str(tmpdir))) == ['nd-my-command']
+
+        tmpdir.join('nd-my-command').chmod(0o644)
+        catalog.process_events()
+        assert catalog.commands('nd', str(tmpdir)) == {}
+
+    def test_updates_every_path_to_a_directory(self, catalog, tmpdir):
+        directory = tmpdir.mkdir('bin')
+        tmpdir.join('link').mksymlinkto(directory)
+        search_path = os.pathsep.join([str(tmpdir.join('link')), str(directory)])
+        catalog.commands('nd', search_path)
+
+        make_executable(directory, 'nd-my-command')
+        catalog.process_events()
+        assert catalog.commands('nd', search_path) == {
+            'nd-my-command': str(tmpdir.join('link', 'nd-my-command'))}
+        assert catalog.commands('nd', str(directory)) == {
+            'nd-my-command': str(directory.join('nd-my-command'))}
+
+    def test_watches_directories_created_after_the_first_request(self, catalog, tmpdir):
+        directory = tmpdir.join('bin')
+        assert catalog.commands('nd', str(directory)) == {}
+
+        directory.mkdir()
+        make_executable(directory, 'nd-my-command')
+        assert list(catalog.commands('nd', str(directory))) == ['nd-my-command']
+
+    def test_forgets_removed_directories(self, catalog, tmpdir):
+        directory = tmpdir.mkdir('bin')
+        make_executable(directory, 'nd-my-command')
+        catalog.commands('nd', str(directory))
+
+        directory.remove()
+        catalog.process_events()
+        assert catalog.commands('nd', str(directory)) == {}
+
+
+class TestServer:
+    def test_query_daemon(self, server, tmpdir):
+        make_executable(tmpdir, 'nd-my-command')
+
+        assert index.query_daemon('nd', str(tmpdir)) == {
+            'nd-my-command': str(tmpdir.join('nd-my-command'))}
+
+    def test_reply_reflects_changes_made_before_the_request(self, server, tmpdir):
+        assert index.query_daemon('nd', str(tmpdir)) == {}
+
+        make_executable(tmpdir, 'nd-my-command')
+        assert list(index.query_daemon('nd', str(tmpdir))) == ['nd-my-command']
+
+    def test_relative_directories_are_resolved_by_the_client(self, server, tmpdir, monkeypatch):
+        monkeypatch.chdir(tmpdir)
+        with mock.patch.object(server.catalog, 'commands', return_value={}) as commands:
+            index.query_daemon('nd', os.pathsep.join(['bin', '']))
+        commands.assert_called_once_with(
+            'nd', os.pathsep.join([str(tmpdir.join('bin')), str(tmpdir)]))
+
+    def test_processes_every_pending_event(self, tmpdir):
+        server = indexd.Server(index.get_daemon_socket_path())
+        try:
+            server.catalog.commands('nd', str(tmpdir))
+            for i in range(50):
+                make_executable(tmpdir, 'nd-my-command-{}'.format(i))
+
+            with mock.patch.object(inotify, 'READ_SIZE', 1024):
+                server.process_events()
+            assert len(server.catalog.commands('nd', str(tmpdir))) == 50
+        finally:
+            server.close()
+
+    def test_load_index_is_current_until_a_directory_changes(self, server, tmpdir):
+        mtime = time.time() - index.RACY_MTIME_WINDOW - 10
+        os.utime(str(tmpdir), (mtime, mtime))
+        commands = index.load_index('nd', str(tmpdir))
+        assert index.is_current(commands, 'nd', str(tmpdir))
+
+        make_executable(tmpdir, 'nd-my-command')
+        assert not index.is_current(commands, 'nd', str(tmpdir))
+
+    def test_load_index_uses_daemon(self, server, tmpdir):
+        make_executable(tmpdir, 'nd-my-command')
+
+        with mock.patch.object(index, '_read_index') as read_index:
+            commands = index.load_index('nd', str(tmpdir))
+        assert [name for name, _, _ in commands.starting_with('nd-')] == ['nd-my-command']
+        assert not read_index.called
+
+    def test_query_daemon_without_daemon(self, tmpdir):
+        assert index.query_daemon('nd', str(tmpdir)) is None
+
+    def test_query_daemon_with_stale_socket(self, tmpdir):
+        server = indexd.Server(index.get_daemon_socket_path())
+        server._server.close()  # Socket file remains but nothing is listening
+        try:
+            assert index.query_daemon('nd', str(tmpdir)) is None
+        finally:
+            server.close()
+
+    def test_exits_if_already_running(self, server):
+        with pytest.raises(SystemExit) as exc_info:
+            indexd.main(['buckle-_indexd'])
+        assert 'buckle _indexd is already running.' in str(exc_info.value)
@@ -1,4 +1,12 @@
 import os
 import sys
 
+import pytest  # flake8: noqa
+
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), './fixtures')))
+
+
+@pytest.fixture(autouse=True)
+def isolate_cache_dir(monkeypatch, tmpdir_factory):
+    """ Keep each test's persistent caches out of the user's home directory """
+    monkeypatch.setenv('BUCKLE_CACHE_DIR', str(tmpdir_factory.mktemp('cache')))
@@ -0,0 +1,156 @@
+#!/usr/bin/env bats
+
+load test_helpers
+
+setup() {
+	_shared_setup belt
+	unalias belt
+	export BUCKLE_CACHE_DIR="$TMPDIR/cache"
+	eval "$(buckle init --fast-dispatch belt)"
+}
+
+_age_test_directories() {
+	# Directories modified in the last couple of seconds are never trusted by the dispatch table
+	local directory
+	for directory in ${PATH//:/ }; do
+		if [[ "$directory" = "$TMPDIR"/* ]]; then
+			touch -d "1 minute ago" "$directory"
+		fi
+	done
+}
+
+make_null_command() {
+	make_executable_command $1 <<- 'EOF'
+		#!/usr/bin/env bash
+EOF
+}
+
+_stub_buckle() {
+	# Makes the fast path's fallback to buckle visible
+	local stub="$TMPDIR/buckle-stub"
+	printf '#!/usr/bin/env bash\necho "buckle $*"\n' > "$stub"
+	chmod +x "$stub"
+	hash -p "$stub" buckle
+}
+
+@test "'belt <command>' runs 'belt-<command>' without buckle once its table is written" {
+	make_executable_command belt-my-command <<- 'EOF'
+		#!/usr/bin/env bash
+		echo "$BUCKLE_TOOLBELT_NAME $*"
+EOF
+	_age_test_directories
+
+	result="$(belt my-command -a --b c)"
+	[[ "$result" = "belt -a --b c" ]]
+	[[ -f "$BUCKLE_CACHE_DIR/dispatch-belt.bash" ]]
+
+	_stub_buckle
+	result="$(belt my-command -a --b c)"
+	[[ "$result" = "belt -a --b c" ]]
+}
+
+@test "'belt <namespace> <command>' runs dot commands without buckle" {
+	make_executable_command belt-.my-check <<- 'EOF'
+		#!/usr/bin/env bash
+		echo "check $*"
+EOF
+	make_executable_command belt-my-namespace~.my-namespace-check <<- 'EOF'
+		#!/usr/bin/env bash
+		echo "namespace check $*"
+EOF
+	make_executable_command belt-my-namespace~my-command <<- 'EOF'
+		#!/usr/bin/env bash
+		echo "command $*"
+EOF
+	_age_test_directories
+	expected=$'check my-namespace my-command arg\nnamespace check my-namespace my-command arg\ncommand arg'
+
+	result="$(belt my-namespace my-command arg)"
+	[[ "$result" = "$expected" ]]
+
+	_stub_buckle
+	result="$(belt my-namespace my-command arg)"
+	[[ "$result" = "$expected" ]]
+}
+
+@test "'belt <command>' stops when a dot command fails without buckle" {
+	make_executable_command belt-.my-check <<- 'EOF'
+		#!/usr/bin/env bash
+		exit 1
+EOF
+	make_executable_command belt-my-command <<- 'EOF'
+		#!/usr/bin/env bash
+		echo my command output
+EOF
+	_age_test_directories
+	belt my-command || true
+
+	_stub_buckle
+	run belt my-command
+	[[ $status != 0 && "$output" = *"Dot command 'belt-.my-check' failed."* ]]
+}
+
+@test "'belt' falls back to buckle for options, namespaces and unknown commands" {
+	make_null_command belt-my-namespace~my-command
+	_age_test_directories
+	belt my-namespace my-command
+
+	_stub_buckle
+	[[ "$(belt --no-update my-namespace my-command)" = "buckle --no-update my-namespace my-command" ]]
+	[[ "$(belt my-namespace)" = "buckle my-namespace" ]]
+	[[ "$(belt unknown-command)" = "buckle unknown-command" ]]
+	[[ "$(belt)" = "buckle " ]]
+}
+
+@test "'belt' falls back to buckle after commands are added to the path" {
+	make_null_command belt-my-command
+	_age_test_directories
+	belt my-command
+
+	make_executable_command belt-my-new-command <<- 'EOF'
+		#!/usr/bin/env bash
+		echo my new command output
+EOF
+	[[ "$(belt my-new-command)" = "my new command output" ]]
+}
+
+@test "'belt' falls back to buckle when an update is due" {
+	make_null_command belt-my-command
+	_age_test_directories
+	export BUCKLE_OPTS_BELT='--auto-update true --update-freq 3600'
+	touch -d "3597 seconds ago" "$BUCKLE_ROOT/.updated"
+	belt my-command
+
+	_stub_buckle
+	[[ "$(belt my-command)" = "" ]]
+
+	sleep 3
+	[[ "$(belt my-command)" = "buckle my-command" ]]
+}
+
+@test "'belt' falls back to buckle to run dot commands in parallel" {
+	make_null_command belt-.my-check
+	make_null_command belt-.my-other-check
+	make_null_command belt-my-command
+	_age_test_directories
+	export BUCKLE_OPTS_BELT='--parallel-dot-commands namespace'
+	belt my-command
+
+	_stub_buckle
+	[[ "$(belt my-command)" = "buckle my-command" ]]
+}
+
+@test "'belt' falls back to buckle to reuse the results of dot commands" {
+	make_executable_command belt-.my-check <<- 'EOF'
+		#!/usr/bin/env bash
+		# buckle-cache: ttl=300
+		echo my check output
+EOF
+	make_null_command belt-my-command
+	_age_test_directories
+	[[ "$(belt my-command)" = "my check output" ]]
+	[[ "$(belt my-command)" = "" ]]
+
+	_stub_buckle
+	[[ "$(belt my-command)" = "buckle my-command" ]]
+}
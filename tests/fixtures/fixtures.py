@@ -8,6 +8,7 @@ import mock
 import os
 import stat
 import textwrap
+import time
 import traceback
 
 import pytest  # flake8: noqa
@@ -96,6 +97,39 @@ def executable_factory(monkeypatch, tmpdir):
     return factory
 
 
+@pytest.fixture()
+def old_executable_factory(tmpdir):
+    """ Factory for executable files that are too old to still be changing, so they can be indexed
+    and cached.  The file and the directory under tmpdir that it's created in are both aged.  Also
+    dedents the contents.
+
+    Calling factory.directory(name, *executables) creates an aged directory of empty executables.
+    """
+
+    def age(path):
+        mtime = time.time() - 60
+        os.utime(path, (mtime, mtime))
+
+    def factory(name, contents='', directory=''):
+        parent = tmpdir.join(directory).ensure(dir=True)
+        location = parent.join(name)
+        location.write(textwrap.dedent(contents))
+        location.chmod(0o755)
+        age(str(location))
+        age(str(parent))
+        return str(location)
+
+    def make_directory(name, *executables):
+        directory = tmpdir.join(name).ensure(dir=True)
+        for executable in executables:
+            factory(executable, directory=name)
+        age(str(directory))
+        return str(directory)
+
+    factory.directory = make_directory
+    return factory
+
+
 @pytest.yield_fixture(autouse=True)
 def run_as_child():
     """ A fixture that yields a callable for running a function as a child process.
@@ -147,6 +181,7 @@ def run_as_child():
                 os.close(error_pipe_out)
 
     with mock.patch.object(os, 'execv', prevent_execv_as_test_runner(os.execv)), \
+         mock.patch.object(os, 'execve', prevent_execv_as_test_runner(os.execve)), \
          mock.patch.object(os, 'execvp', prevent_execv_as_test_runner(os.execvp)):
         child_runner.CannotExecAsTestRunner = CannotExecAsTestRunner
         child_runner.ChildError = ChildError
@@ -3,6 +3,7 @@ from __future__ import print_function
 import os
 import subprocess
 import sys
+import time
 
 import pytest  # flake8: noqa
 
@@ -30,6 +31,10 @@ class TestRunAsChild:
         with pytest.raises(run_as_child.CannotExecAsTestRunner) as error:
             os.execvp(['bash'])
 
+    def test_cannot_execve_as_test_runner(self, run_as_child):
+        with pytest.raises(run_as_child.CannotExecAsTestRunner) as error:
+            os.execve('/bin/bash', ['bash'], {})
+
 
 class TestExecutableFactory:
     def test_executable_contents(self, executable_factory):
@@ -72,6 +77,22 @@ class TestExecutableFactory:
         assert contents == '            This command is not indented\n            No way!'
 
 
+class TestOldExecutableFactory:
+    def test_executable_is_old(self, old_executable_factory, tmpdir):
+        path = old_executable_factory('my-command', 'my content', directory='bin')
+        with open(path) as f:
+            contents = f.read()
+        assert contents == 'my content'
+        assert os.access(path, os.X_OK)
+        assert os.path.getmtime(path) < time.time() - 10
+        assert os.path.getmtime(str(tmpdir.join('bin'))) < time.time() - 10
+
+    def test_directory_is_old(self, old_executable_factory):
+        directory = old_executable_factory.directory('bin', 'my-command', 'my-other-command')
+        assert sorted(os.listdir(directory)) == ['my-command', 'my-other-command']
+        assert os.path.getmtime(directory) < time.time() - 10
+
+
 class TestReadout:
     def test_capture(self, readout):
         print('before context')
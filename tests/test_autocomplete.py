@@ -1,42 +1,183 @@
 import mock
 import stat
-import subprocess
+import time
 
 import pytest  # noqa
 
 from buckle import autocomplete
+from buckle import completion_cache
 
 from fixtures import executable_factory   # noqa
 
 STAT_OWNER_EXECUTABLE = stat.S_IEXEC
 
 
-class TestGetExecutablesStartingWith(object):
+class TestGetCompletions(object):
     @staticmethod
     @pytest.fixture(autouse=True)
     def set_minimal_path(monkeypatch):
         monkeypatch.setenv('PATH', None)
 
-    def test_returns_sorted_list(self, executable_factory):
-        executable_factory('nd-c')
-        executable_factory('nd-a')
-        executable_factory('nd-b')
-        result = autocomplete.get_executables_starting_with('nd-')
-        assert result == ['nd-a', 'nd-b', 'nd-c']
-
-    def test_functions_excluded(self):
-        ordered_return_list = ['nd-init nd-help nd-function'.encode(), 'nd-function'.encode()]
-        with mock.patch.object(subprocess, 'check_output', side_effect=ordered_return_list):
-            result = autocomplete.get_executables_starting_with()
-            assert result == ['nd-help', 'nd-init']
-
-    def test_returns_empty_list_if_no_results(self):
-        ordered_return_list = ['nd-delete-me'.encode(), 'nd-delete-me'.encode()]
-        with mock.patch.object(subprocess, 'check_output', side_effect=ordered_return_list):
-            result = autocomplete.get_executables_starting_with()
-            assert not result
-
-    def test_finds_commands_in_path(self, executable_factory):
-        executable_factory('nd-my-test-command')
-        result = autocomplete.get_executables_starting_with(prefix='nd-my-test-command')
-        assert result == ['nd-my-test-command']
+    def test_completes_commands(self, executable_factory):
+        executable_factory('nd-my-command')
+        executable_factory('nd-other-command')
+        assert autocomplete.get_completions('nd', ['nd', 'my'], 1) == [
+            (autocomplete.WORD, 'my-command')]
+
+    def test_completes_namespaces_once(self, executable_factory):
+        executable_factory('nd-my-namespace~a')
+        executable_factory('nd-my-namespace~b')
+        assert autocomplete.get_completions('nd', ['nd', 'my'], 1) == [
+            (autocomplete.WORD, 'my-namespace')]
+
+    def test_completes_commands_in_namespace(self, executable_factory):
+        executable_factory('nd-my-namespace~my-command')
+        completions = autocomplete.get_completions('nd', ['nd', 'my-namespace', ''], 2)
+        assert completions == [(autocomplete.WORD, 'my-command'), (autocomplete.WORD, 'help')]
+
+    def test_hidden_commands_need_a_typed_prefix(self, executable_factory):
+        executable_factory('nd-_private')
+        executable_factory('nd-.dot')
+        executable_factory('nd-my-command.completion')
+        assert (autocomplete.WORD, '_private') not in autocomplete.get_completions('nd', ['nd'], 1)
+        assert autocomplete.get_completions('nd', ['nd', '_'], 1) == [
+            (autocomplete.WORD, '_private')]
+
+    def test_help_is_skipped_in_namespace_path(self, executable_factory):
+        executable_factory('nd-my-namespace~my-command')
+        completions = autocomplete.get_completions('nd', ['nd', 'help', 'my-namespace', 'my'], 3)
+        assert completions == [(autocomplete.WORD, 'my-command')]
+
+    def test_leading_options_are_skipped(self, executable_factory):
+        executable_factory('nd-my-command')
+        assert autocomplete.get_completions('nd', ['nd', '-v', 'my'], 2) == [
+            (autocomplete.WORD, 'my-command')]
+
+    def test_includes_completion_commands_of_each_segment(self, executable_factory):
+        executable_factory('nd-my-namespace~my-command')
+        executable_factory('nd-my-namespace.completion.sh')
+        executable_factory('nd-my-namespace~my-command.completion')
+        completions = autocomplete.get_completions(
+            'nd', ['nd', 'my-namespace', 'my-command', 'arg'], 3)
+        assert completions == [
+            (autocomplete.COMPLETION_COMMAND, 'nd-my-namespace.completion.sh'),
+            (autocomplete.COMPLETION_COMMAND, 'nd-my-namespace~my-command.completion')]
+
+
+class TestGetArgumentCompletions(object):
+    @staticmethod
+    @pytest.fixture(autouse=True)
+    def set_minimal_path(monkeypatch):
+        monkeypatch.setenv('PATH', '/bin:/usr/bin')
+
+    @staticmethod
+    @pytest.fixture(autouse=True)
+    def refresh_in_background():
+        with mock.patch.object(autocomplete, 'refresh_in_background') as refresh:
+            yield refresh
+
+    @staticmethod
+    @pytest.fixture
+    def counted_completion_command(executable_factory, tmpdir):
+        """ Factory for a completion command that counts its runs in a file """
+        def factory(name, candidates, directive='', sleep=0):
+            executable_factory(name, """\
+                #!/bin/bash
+                {}
+                sleep {}
+                echo run >> {}
+                echo {}
+                """.format(directive, sleep, tmpdir.join(name + '.runs'), candidates))
+            return lambda: len(tmpdir.join(name + '.runs').readlines()) \
+                if tmpdir.join(name + '.runs').exists() else 0
+        return factory
+
+    def test_runs_completion_commands_in_order(self, executable_factory):
+        executable_factory('nd-my-command')
+        executable_factory('nd-my-namespace~my-command')
+        executable_factory('nd-my-namespace.completion', '#!/bin/bash\necho a\n')
+        executable_factory('nd-my-namespace~my-command.completion', '#!/bin/bash\necho b c\n')
+        completions = autocomplete.get_argument_completions(
+            'nd', ['nd', 'my-namespace', 'my-command', ''], 3)
+        assert completions == [(autocomplete.WORD, 'a'), (autocomplete.WORD, 'b'),
+                               (autocomplete.WORD, 'c')]
+
+    def test_runs_completion_commands_at_the_same_time(self, executable_factory):
+        executable_factory('nd-my-namespace~my-command')
+        executable_factory('nd-my-namespace.completion', '#!/bin/bash\nsleep 0.5\necho a\n')
+        executable_factory('nd-my-namespace~my-command.completion',
+                           '#!/bin/bash\nsleep 0.5\necho b\n')
+        executable_factory('nd-my-namespace~my-command.completion.fast', '#!/bin/bash\necho c\n')
+        start = time.time()
+        completions = autocomplete.get_argument_completions(
+            'nd', ['nd', 'my-namespace', 'my-command', ''], 3)
+        assert time.time() - start < 0.9
+        assert completions == [(autocomplete.WORD, 'a'), (autocomplete.WORD, 'b'),
+                               (autocomplete.WORD, 'c')]
+
+    def test_names_sourced_completion_commands(self, executable_factory):
+        executable_factory('nd-my-command')
+        executable_factory('nd-my-command.completion.sh', 'echo a\n')
+        completions = autocomplete.get_argument_completions('nd', ['nd', 'my-command', ''], 2)
+        assert completions == [(autocomplete.COMPLETION_COMMAND, 'nd-my-command.completion.sh')]
+
+    def test_reuses_fresh_cached_candidates(self, counted_completion_command):
+        runs = counted_completion_command('nd-my-command.completion', 'apple banana',
+                                          '# buckle-cache: ttl=60')
+        autocomplete.get_argument_completions('nd', ['nd', 'my-command', ''], 2)
+        completions = autocomplete.get_argument_completions('nd', ['nd', 'my-command', 'b'], 2)
+        assert completions == [(autocomplete.WORD, 'banana')]
+        assert runs() == 1
+
+    def test_uncached_candidates_are_not_filtered(self, counted_completion_command):
+        runs = counted_completion_command('nd-my-command.completion', 'apple banana')
+        autocomplete.get_argument_completions('nd', ['nd', 'my-command', ''], 2)
+        completions = autocomplete.get_argument_completions('nd', ['nd', 'my-command', 'b'], 2)
+        assert completions == [(autocomplete.WORD, 'apple'), (autocomplete.WORD, 'banana')]
+        assert runs() == 2
+
+    def test_slow_completion_command_gives_stale_candidates(self, counted_completion_command,
+                                                            refresh_in_background):
+        counted_completion_command('nd-my-command.completion', 'apple', '# buckle-cache: ttl=0',
+                                   sleep=1)
+        words = ['nd', 'my-command', '']
+        autocomplete.get_argument_completions('nd', words, 2)
+        completions = autocomplete.get_argument_completions('nd', words, 2,
+                                                            deadline=time.time() + 0.2)
+        assert completions == [(autocomplete.WORD, 'apple')]
+        refresh_in_background.assert_called_once_with('nd', words, 2, [mock.ANY])
+
+    def test_slow_cacheable_completion_command_without_cache_gives_nothing(
+            self, counted_completion_command, refresh_in_background):
+        counted_completion_command('nd-my-command.completion', 'apple', '# buckle-cache: ttl=0',
+                                   sleep=1)
+        words = ['nd', 'my-command', '']
+        completions = autocomplete.get_argument_completions('nd', words, 2,
+                                                            deadline=time.time() + 0.2)
+        assert completions == []
+        refresh_in_background.assert_called_once_with('nd', words, 2, [mock.ANY])
+
+    def test_slow_completion_command_that_cant_be_cached_is_waited_for(
+            self, counted_completion_command, refresh_in_background):
+        counted_completion_command('nd-my-command.completion', 'apple', sleep=0.5)
+        completions = autocomplete.get_argument_completions('nd', ['nd', 'my-command', ''], 2,
+                                                            deadline=time.time() + 0.2)
+        assert completions == [(autocomplete.WORD, 'apple')]
+        assert not refresh_in_background.called
+
+    def test_completion_command_that_cant_be_cached_times_out(
+            self, counted_completion_command, refresh_in_background, monkeypatch):
+        monkeypatch.setattr(autocomplete, 'COMPLETION_TIMEOUT', 0.2)
+        counted_completion_command('nd-my-command.completion', 'apple', sleep=1)
+        start = time.time()
+        completions = autocomplete.get_argument_completions('nd', ['nd', 'my-command', ''], 2)
+        assert time.time() - start < 0.9
+        assert completions == []
+        assert not refresh_in_background.called
+
+    def test_refresh_caches_candidates(self, executable_factory):
+        location = executable_factory('nd-my-command.completion',
+                                      '#!/bin/bash\n# buckle-cache: ttl=60\necho apple\n')
+        words = ['nd', 'my-command', '']
+        autocomplete.refresh_completion_commands(words, 2, [location])
+        assert completion_cache.load(location, words[:2]) == (['apple'], True)
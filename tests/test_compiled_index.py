@@ -0,0 +1,96 @@
+import pytest  # noqa
+
+from buckle import compiled_index
+from buckle.compiled_index import COMMAND, COMPLETION, DOT_COMMAND, NAMESPACE
+
+
+@pytest.fixture
+def commands():
+    return compiled_index.CompiledIndex(compiled_index.compile_index(['nd'], {
+        'nd-my-command': '/bin/nd-my-command',
+        'nd-my-command.completion': '/bin/nd-my-command.completion',
+        'nd-.my-check': '/bin/nd-.my-check',
+        'nd-my-namespace~my-command': '/usr/bin/nd-my-namespace~my-command',
+        'nd-my-namespace~.my-check': '/usr/bin/nd-my-namespace~.my-check',
+    }, header={'my': 'header'}))
+
+
+class TestCompiledIndex(object):
+    def test_header(self, commands):
+        assert commands.header == {'my': 'header'}
+
+    def test_get(self, commands):
+        assert commands.get('nd-my-command') == (COMMAND, '/bin/nd-my-command')
+        assert commands.get('nd-my-namespace') == (NAMESPACE, '')
+        assert commands.get('nd-my-missing-command') is None
+        assert commands.get('nd-my') is None
+
+    def test_flags(self, commands):
+        assert commands.get('nd-my-command.completion')[0] == COMMAND | COMPLETION
+        assert commands.get('nd-.my-check')[0] == COMMAND | DOT_COMMAND
+        assert commands.get('nd-my-namespace~.my-check')[0] == COMMAND | DOT_COMMAND
+
+    def test_flags_of_multiple_toolbelts(self):
+        commands = compiled_index.CompiledIndex(compiled_index.compile_index(['buckle', 'nd'], {
+            'nd-.my-check': '/bin/nd-.my-check',
+            'buckle-.my-check': '/bin/buckle-.my-check',
+        }))
+        assert commands.get('nd-.my-check')[0] == COMMAND | DOT_COMMAND
+        assert commands.get('buckle-.my-check')[0] == COMMAND | DOT_COMMAND
+
+    def test_command_that_is_also_a_namespace(self):
+        commands = compiled_index.CompiledIndex(compiled_index.compile_index(['nd'], {
+            'nd-my-name~my-command': '/bin/nd-my-name~my-command',
+            'nd-my-name': '/bin/nd-my-name',
+        }))
+        assert commands.get('nd-my-name') == (COMMAND | NAMESPACE, '/bin/nd-my-name')
+
+    def test_starting_with_returns_sorted_commands(self, commands):
+        assert [name for name, _, _ in commands.starting_with('nd-my-')] == [
+            'nd-my-command', 'nd-my-command.completion', 'nd-my-namespace~.my-check',
+            'nd-my-namespace~my-command']
+
+    def test_starting_with_flags(self, commands):
+        assert list(commands.starting_with('nd-my-namespace', NAMESPACE)) == [
+            ('nd-my-namespace', NAMESPACE, '')]
+        assert [name for name, _, _ in commands.starting_with('nd-', DOT_COMMAND)] == [
+            'nd-.my-check', 'nd-my-namespace~.my-check']
+
+    def test_starting_with_missing_prefix(self, commands):
+        assert list(commands.starting_with('nd-missing')) == []
+        assert list(commands.starting_with('zz')) == []
+
+    def test_dot_commands_of_namespace_chain(self, commands):
+        assert commands.dot_commands(['nd-', 'nd-my-namespace~', 'nd-my-namespace~missing~']) == [
+            [('nd-.my-check', '/bin/nd-.my-check')],
+            [('nd-my-namespace~.my-check', '/usr/bin/nd-my-namespace~.my-check')],
+            []]
+
+    def test_dot_commands_sorted_in_each_namespace(self):
+        commands = compiled_index.CompiledIndex(compiled_index.compile_index(['nd'], {
+            'nd-.b-check': '/bin/nd-.b-check',
+            'nd-.a-check': '/usr/bin/nd-.a-check',
+            'nd-a-command': '/bin/nd-a-command',
+        }))
+        assert commands.dot_commands(['nd-']) == [
+            [('nd-.a-check', '/usr/bin/nd-.a-check'), ('nd-.b-check', '/bin/nd-.b-check')]]
+
+    def test_commands(self, commands):
+        assert commands.commands()['nd-my-command'] == '/bin/nd-my-command'
+        assert 'nd-my-namespace' not in commands.commands()
+
+    def test_empty_index(self):
+        commands = compiled_index.CompiledIndex(compiled_index.compile_index(['nd'], {}))
+        assert len(commands) == 0
+        assert commands.get('nd-my-command') is None
+        assert list(commands.starting_with('')) == []
+
+    def test_open_memory_maps_file(self, commands, tmpdir):
+        index_file = tmpdir.join('index.idx')
+        index_file.write_binary(compiled_index.compile_index(['nd'], {'nd-a': '/bin/nd-a'}))
+        assert compiled_index.CompiledIndex.open(str(index_file)).get('nd-a') == (
+            COMMAND, '/bin/nd-a')
+
+    def test_invalid_index(self):
+        with pytest.raises(compiled_index.InvalidIndex):
+            compiled_index.CompiledIndex(b'not an index file')
@@ -0,0 +1,53 @@
+import time
+
+import pytest  # noqa
+
+from buckle import completion_cache
+from fixtures import old_executable_factory  # noqa
+
+
+@pytest.fixture
+def make_completion_command(old_executable_factory):
+    """ Factory for a completion command that declares the given caching conditions """
+    def factory(conditions):
+        contents = '#!/bin/bash\n# buckle-cache: {}\necho a b\n'.format(conditions)
+        return old_executable_factory('nd-my-command.completion', contents)
+    return factory
+
+
+class TestIsCacheable:
+    def test_with_directive(self, make_completion_command):
+        assert completion_cache.is_cacheable(make_completion_command('ttl=60'))
+
+    def test_without_directive(self, tmpdir):
+        location = tmpdir.join('nd-my-command.completion')
+        location.write('#!/bin/bash\necho a b\n')
+        assert not completion_cache.is_cacheable(str(location))
+
+
+class TestLoad:
+    def test_nothing_cached(self, make_completion_command):
+        location = make_completion_command('ttl=60')
+        assert completion_cache.load(location, ['nd', 'my-command']) is None
+
+    def test_fresh_after_save(self, make_completion_command):
+        location = make_completion_command('ttl=60')
+        completion_cache.save(location, ['nd', 'my-command'], ['a', 'b'])
+        assert completion_cache.load(location, ['nd', 'my-command']) == (['a', 'b'], True)
+
+    def test_keyed_by_preceding_words(self, make_completion_command):
+        location = make_completion_command('ttl=60')
+        completion_cache.save(location, ['nd', 'my-command'], ['a', 'b'])
+        assert completion_cache.load(location, ['nd', 'my-command', 'a']) is None
+
+    def test_stale_after_ttl(self, make_completion_command):
+        location = make_completion_command('ttl=0.1')
+        completion_cache.save(location, ['nd', 'my-command'], ['a', 'b'])
+        time.sleep(0.2)
+        assert completion_cache.load(location, ['nd', 'my-command']) == (['a', 'b'], False)
+
+    def test_never_cached_without_directive(self, tmpdir):
+        location = tmpdir.join('nd-my-command.completion')
+        location.write('#!/bin/bash\necho a b\n')
+        completion_cache.save(str(location), ['nd', 'my-command'], ['a', 'b'])
+        assert completion_cache.load(str(location), ['nd', 'my-command']) is None
@@ -0,0 +1,86 @@
+import os
+
+import pytest  # noqa
+
+from buckle import compiled_index
+from buckle import dispatch
+from buckle import index
+from fixtures import old_executable_factory  # noqa
+
+
+def entry(key, value):
+    return '[{}]={}'.format(dispatch.quote(key), dispatch.quote(value))
+
+
+def read_table():
+    with open(dispatch.get_table_path('nd')) as f:
+        return f.read()
+
+
+class TestRenderTable:
+    def test_maps_commands_and_namespaces(self, old_executable_factory):
+        directory = old_executable_factory.directory(
+            'bin', 'nd-my-command', 'nd-my-namespace~my-command')
+        table = dispatch.render_table('nd', index.build_index('nd', directory), '', None)
+        assert entry('nd-my-command', os.path.join(directory, 'nd-my-command')) in table
+        assert entry('nd-my-namespace', '') in table
+
+    def test_prefers_builtin_commands(self, old_executable_factory):
+        directory = old_executable_factory.directory('bin', 'nd-help', 'buckle-help')
+        table = dispatch.render_table('nd', index.build_index('nd', directory), '', None)
+        assert entry('nd-help', os.path.join(directory, 'buckle-help')) in table
+
+    def test_groups_dot_commands_by_namespace(self, old_executable_factory):
+        directory = old_executable_factory.directory(
+            'bin', 'nd-.check', 'nd-my-namespace~.check', 'nd-my-namespace~.other')
+        table = dispatch.render_table('nd', index.build_index('nd', directory), '', None)
+        assert entry('nd-', os.path.join(directory, 'nd-.check')) in table
+        assert entry('nd-my-namespace~', '\t'.join([
+            os.path.join(directory, 'nd-my-namespace~.check'),
+            os.path.join(directory, 'nd-my-namespace~.other')])) in table
+
+    def test_marks_cached_dot_commands(self, old_executable_factory):
+        directory = old_executable_factory.directory('bin', 'nd-.check', 'nd-.cached-check')
+        with open(os.path.join(directory, 'nd-.cached-check'), 'w') as f:
+            f.write('# buckle-cache: ttl=60\n')
+        table = dispatch.render_table('nd', index.build_index('nd', directory), '', None)
+        assert '_BUCKLE_DISPATCH_CACHED_DOT_COMMANDS=([{}]=1)\n'.format(
+            dispatch.quote(os.path.join(directory, 'nd-.cached-check'))) in table
+
+    def test_records_options_and_next_check_time(self, old_executable_factory):
+        directory = old_executable_factory.directory('bin', 'nd-my-command')
+        table = dispatch.render_table('nd', index.build_index('nd', directory),
+                                      '--no-update', 1234.5)
+        assert "_BUCKLE_DISPATCH_OPTS=--no-update\n" in table
+        assert "_BUCKLE_DISPATCH_NEXT_CHECK_TIME=1234\n" in table
+
+    def test_generation_changes_with_contents(self, old_executable_factory):
+        commands = index.build_index('nd', old_executable_factory.directory('bin', 'nd-my-command'))
+        first = dispatch.render_table('nd', commands, '', None).splitlines()[0]
+        second = dispatch.render_table('nd', commands, '', 1).splitlines()[0]
+        assert first.startswith(dispatch.TABLE_HEADER) and first != second
+
+
+class TestWriteTable:
+    def test_dated_after_directories(self, old_executable_factory):
+        directory = old_executable_factory.directory('bin', 'nd-my-command')
+        dispatch.write_table('nd', index.build_index('nd', directory), '', None)
+        assert os.path.getmtime(dispatch.get_table_path('nd')) > os.path.getmtime(directory)
+        assert entry('nd-my-command', os.path.join(directory, 'nd-my-command')) in read_table()
+
+    def test_skips_racy_directories(self, old_executable_factory):
+        directory = old_executable_factory.directory('bin', 'nd-my-command')
+        os.utime(directory, None)
+        dispatch.write_table('nd', index.build_index('nd', directory), '', None)
+        assert not os.path.exists(dispatch.get_table_path('nd'))
+
+    def test_skips_relative_directories(self, old_executable_factory, tmpdir):
+        old_executable_factory.directory('bin', 'nd-my-command')
+        with tmpdir.as_cwd():
+            dispatch.write_table('nd', index.build_index('nd', 'bin'), '', None)
+        assert not os.path.exists(dispatch.get_table_path('nd'))
+
+    def test_skips_commands_from_daemon(self):
+        commands = compiled_index.CompiledIndex(compiled_index.compile_index(['nd'], {}))
+        dispatch.write_table('nd', commands, '', None)
+        assert not os.path.exists(dispatch.get_table_path('nd'))
@@ -0,0 +1,87 @@
+import os
+import time
+
+import pytest  # noqa
+
+from buckle import dot_command_cache
+from fixtures import old_executable_factory  # noqa
+
+
+@pytest.fixture
+def make_dot_command(old_executable_factory):
+    """ Factory for a dot command that declares the given caching conditions """
+    def factory(conditions):
+        contents = '#!/bin/bash\n# buckle-cache: {}\ntrue\n'.format(conditions)
+        return old_executable_factory('nd-.my-check', contents)
+    return factory
+
+
+class TestParsePolicy:
+    def test_parses_all_conditions(self):
+        policy = dot_command_cache.parse_policy('ttl=300 session inputs=a.txt,b/c.lock')
+        assert policy == dot_command_cache.Policy(300, True, ('a.txt', 'b/c.lock'))
+
+    @pytest.mark.parametrize('directive', ['', 'ttl=soon', 'forever', 'session=yes', 'inputs='])
+    def test_rejects_invalid_directives(self, directive):
+        with pytest.raises(dot_command_cache.InvalidPolicy):
+            dot_command_cache.parse_policy(directive)
+
+
+class TestReadPolicy:
+    def test_without_directive(self, tmpdir):
+        location = tmpdir.join('nd-.my-check')
+        location.write('#!/bin/bash\ntrue\n')
+        assert dot_command_cache.read_policy(str(location)) is None
+
+    def test_invalid_directive_is_ignored(self, make_dot_command):
+        assert dot_command_cache.read_policy(make_dot_command('ttl=soon')) is None
+
+    def test_missing_dot_command(self, tmpdir):
+        assert dot_command_cache.read_policy(str(tmpdir.join('missing'))) is None
+
+
+class TestIsCached:
+    def test_not_cached_before_success(self, make_dot_command):
+        assert not dot_command_cache.is_cached(make_dot_command('ttl=300'))
+
+    def test_cached_after_success(self, make_dot_command):
+        location = make_dot_command('ttl=300')
+        dot_command_cache.record_success(location)
+        assert dot_command_cache.is_cached(location)
+
+    def test_never_cached_without_directive(self, tmpdir):
+        location = tmpdir.join('nd-.my-check')
+        location.write('#!/bin/bash\ntrue\n')
+        dot_command_cache.record_success(str(location))
+        assert not dot_command_cache.is_cached(str(location))
+
+    def test_expires_after_ttl(self, make_dot_command):
+        location = make_dot_command('ttl=0.1')
+        dot_command_cache.record_success(location)
+        time.sleep(0.2)
+        assert not dot_command_cache.is_cached(location)
+
+    def test_limited_to_session(self, make_dot_command, monkeypatch):
+        location = make_dot_command('session')
+        monkeypatch.setenv(dot_command_cache.SESSION_ID_ENV_VAR, 'first')
+        dot_command_cache.record_success(location)
+        assert dot_command_cache.is_cached(location)
+        monkeypatch.setenv(dot_command_cache.SESSION_ID_ENV_VAR, 'second')
+        assert not dot_command_cache.is_cached(location)
+
+    def test_invalidated_by_changed_inputs(self, make_dot_command, tmpdir):
+        location = make_dot_command('inputs=requirements.txt')
+        with tmpdir.as_cwd():
+            tmpdir.join('requirements.txt').write('mock==1.0\n')
+            dot_command_cache.record_success(location)
+            assert dot_command_cache.is_cached(location)
+            tmpdir.join('requirements.txt').write('mock==2.0\n')
+            assert not dot_command_cache.is_cached(location)
+
+    def test_invalidated_by_changed_dot_command(self, make_dot_command):
+        location = make_dot_command('ttl=300')
+        dot_command_cache.record_success(location)
+        with open(location, 'a') as f:
+            f.write('echo changed\n')
+        os.utime(location, (time.time() + 1, time.time() + 1))
+        assert not dot_command_cache.is_cached(location)
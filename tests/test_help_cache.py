@@ -0,0 +1,66 @@
+import os
+
+import pytest  # noqa
+
+from buckle import help_cache
+from fixtures import old_executable_factory  # noqa
+
+
+class TestGetVersion:
+    def test_identifies_resolved_executable(self, old_executable_factory, tmpdir):
+        location = old_executable_factory('nd-my-command')
+        link = tmpdir.join('nd-my-link')
+        link.mksymlinkto(location)
+        stat = os.stat(location)
+        assert help_cache.get_version(str(link)) == [
+            location, stat.st_ino, stat.st_size, stat.st_mtime]
+
+    def test_recently_modified_executable(self, tmpdir):
+        location = tmpdir.join('nd-my-command')
+        location.write('#!/bin/bash\n')
+        assert help_cache.get_version(str(location)) is None
+
+    def test_missing_executable(self, tmpdir):
+        assert help_cache.get_version(str(tmpdir.join('missing'))) is None
+
+
+class TestCache:
+    def test_empty(self):
+        assert help_cache.load('nd') == {}
+
+    def test_saved_descriptions_are_loaded(self, old_executable_factory):
+        version = tuple(help_cache.get_version(old_executable_factory('nd-my-command')))
+        help_cache.save('nd', {version: 'my help message'})
+        assert help_cache.load('nd') == {version: 'my help message'}
+
+    def test_keeps_descriptions_saved_by_other_runs(self, old_executable_factory):
+        first = tuple(help_cache.get_version(old_executable_factory('nd-my-command')))
+        second = tuple(help_cache.get_version(old_executable_factory('nd-my-other-command')))
+        help_cache.save('nd', {first: 'my help message'})
+        help_cache.save('nd', {second: None})
+        assert help_cache.load('nd') == {first: 'my help message', second: None}
+
+    def test_keeps_last_description_of_changed_executables(self, old_executable_factory):
+        location = old_executable_factory('nd-my-command')
+        help_cache.save('nd', {tuple(help_cache.get_version(location)): 'my help message'})
+        old_executable_factory('nd-my-command', '#!/bin/bash\necho changed\n')
+        help_cache.save('nd', {})
+        assert help_cache.get_version(location) not in [list(v) for v in help_cache.load('nd')]
+        assert help_cache.get_last_descriptions(help_cache.load('nd')) == {
+            location: 'my help message'}
+
+        version = tuple(help_cache.get_version(location))
+        help_cache.save('nd', {version: 'my new help message'})
+        assert help_cache.load('nd') == {version: 'my new help message'}
+
+    def test_drops_descriptions_of_removed_executables(self, old_executable_factory):
+        location = old_executable_factory('nd-my-command')
+        help_cache.save('nd', {tuple(help_cache.get_version(location)): 'my help message'})
+        os.remove(location)
+        help_cache.save('nd', {})
+        assert help_cache.load('nd') == {}
+
+    def test_corrupt_cache(self):
+        with open(os.path.join(help_cache.index.get_cache_dir(), 'help-nd.json'), 'w') as f:
+            f.write('{not json')
+        assert help_cache.load('nd') == {}
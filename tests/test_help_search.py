@@ -0,0 +1,61 @@
+
+import pytest  # noqa
+
+from buckle import help_search
+from fixtures import old_executable_factory  # noqa
+
+
+class TestSearchIndex:
+    def test_matches_all_terms_of_names_and_descriptions(self, old_executable_factory):
+        search_index = help_search.SearchIndex('nd')
+        search_index.update(
+            'nd-db~migrate', old_executable_factory('nd-db~migrate'), 'Migrates tables')
+        search_index.update('nd-db~dump', old_executable_factory('nd-db~dump'), 'Dumps tables')
+        assert search_index.search('db tables') == ['nd-db~dump', 'nd-db~migrate']
+        assert search_index.search('migrates tables') == ['nd-db~migrate']
+        assert search_index.search('nd') == []
+
+    def test_ranks_names_then_whole_terms_first(self, old_executable_factory):
+        search_index = help_search.SearchIndex('nd')
+        search_index.update('nd-a', old_executable_factory('nd-a'), 'Runs the deployment')
+        search_index.update('nd-b', old_executable_factory('nd-b'), 'Runs the deploy')
+        search_index.update('nd-deploy', old_executable_factory('nd-deploy'), 'Runs it')
+        assert search_index.search('deploy') == ['nd-deploy', 'nd-b', 'nd-a']
+
+    def test_limited_to_names(self, old_executable_factory):
+        search_index = help_search.SearchIndex('nd')
+        search_index.update('nd-a', old_executable_factory('nd-a'), 'Runs it')
+        search_index.update('nd-b', old_executable_factory('nd-b'), 'Runs it')
+        assert search_index.search('runs', names={'nd-b'}) == ['nd-b']
+
+    def test_saved_index_is_loaded(self, old_executable_factory):
+        search_index = help_search.SearchIndex('nd')
+        search_index.update('nd-a', old_executable_factory('nd-a'), 'Runs it')
+        search_index.save()
+        assert help_search.SearchIndex('nd').search('runs') == ['nd-a']
+
+    def test_outdated_commands(self, old_executable_factory, tmpdir):
+        location = old_executable_factory('nd-a')
+        search_index = help_search.SearchIndex('nd')
+        search_index.update('nd-a', location, 'Runs it')
+        search_index.update('nd-b', old_executable_factory('nd-b'), 'Runs it')
+        search_index.update('nd-c', old_executable_factory('nd-c'), 'Runs it')
+        old_executable_factory('nd-a', '#!/bin/bash\necho changed\n')
+        new_location = old_executable_factory('nd-d')
+        assert search_index.get_outdated({'nd-a': location, 'nd-b': str(tmpdir.join('nd-b')),
+                                          'nd-d': new_location}) == ['nd-a', 'nd-d']
+        assert search_index.search('runs') == ['nd-a', 'nd-b']
+
+    def test_commands_without_description_stay_outdated(self, old_executable_factory):
+        search_index = help_search.SearchIndex('nd')
+        location = old_executable_factory('nd-my-command')
+        search_index.update('nd-my-command', location, None)
+        assert search_index.get_outdated({'nd-my-command': location}) == ['nd-my-command']
+        assert search_index.search('my-command') == ['nd-my-command']
+
+    def test_update_replaces_terms(self, old_executable_factory):
+        search_index = help_search.SearchIndex('nd')
+        search_index.update('nd-a', old_executable_factory('nd-a'), 'Runs it')
+        search_index.update('nd-a', old_executable_factory('nd-a'), 'Stops it')
+        assert search_index.search('runs') == []
+        assert search_index.search('stops') == ['nd-a']
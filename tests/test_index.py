@@ -0,0 +1,158 @@
+import mock
+import os
+import time
+
+import pytest  # noqa
+
+from buckle import compiled_index
+from buckle import index
+from fixtures import old_executable_factory  # noqa
+
+
+def load_commands(search_path):
+    """ Returns the toolbelt's commands from an index built from the persistent index """
+    return dict((name, location) for name, _, location
+                in index.build_index('nd', search_path).starting_with('nd-'))
+
+
+def age_directory(directory):
+    mtime = time.time() - index.RACY_MTIME_WINDOW - 10
+    os.utime(directory, (mtime, mtime))
+
+
+class TestScanPath(object):
+    def test_returns_toolbelt_commands(self, old_executable_factory):
+        directory = old_executable_factory.directory('bin', 'nd-my-command', 'other-command')
+        assert load_commands(search_path=directory) == {
+            'nd-my-command': os.path.join(directory, 'nd-my-command')}
+
+    def test_earlier_directories_shadow_later_ones(self, old_executable_factory):
+        first = old_executable_factory.directory('first', 'nd-my-command')
+        second = old_executable_factory.directory('second', 'nd-my-command')
+        result = load_commands(search_path=os.pathsep.join([first, second]))
+        assert result == {'nd-my-command': os.path.join(first, 'nd-my-command')}
+
+    def test_unchanged_directories_are_not_listed_again(self, old_executable_factory):
+        directory = old_executable_factory.directory('bin', 'nd-my-command')
+        load_commands(search_path=directory)
+
+        with mock.patch.object(index, 'list_executables_in_directory') as list_executables:
+            result = load_commands(search_path=directory)
+        assert not list_executables.called
+        assert list(result) == ['nd-my-command']
+
+    def test_changed_directories_are_listed_again(self, old_executable_factory, tmpdir):
+        first = old_executable_factory.directory('first', 'nd-my-command')
+        second = old_executable_factory.directory('second')
+        search_path = os.pathsep.join([first, second])
+        load_commands(search_path=search_path)
+
+        tmpdir.join('second', 'nd-my-new-command').write('')
+        tmpdir.join('second', 'nd-my-new-command').chmod(0o755)
+        os.utime(second, (time.time() - 100, time.time() - 100))
+
+        listed = []
+        list_executables = index.list_executables_in_directory
+
+        def spy(directory, prefix):
+            listed.append(directory)
+            return list_executables(directory, prefix)
+
+        with mock.patch.object(index, 'list_executables_in_directory', side_effect=spy):
+            result = load_commands(search_path=search_path)
+        assert listed == [second]
+        assert sorted(result) == ['nd-my-command', 'nd-my-new-command']
+
+    def test_recently_modified_directories_are_listed_again(self, tmpdir):
+        directory = tmpdir.mkdir('bin')
+        directory.join('nd-my-command').write('')
+        directory.join('nd-my-command').chmod(0o755)
+        load_commands(search_path=str(directory))
+
+        # Added within the same mtime tick as the first listing
+        directory.join('nd-my-other-command').write('')
+        directory.join('nd-my-other-command').chmod(0o755)
+        result = load_commands(search_path=str(directory))
+        assert sorted(result) == ['nd-my-command', 'nd-my-other-command']
+
+    def test_index_is_keyed_on_path(self, old_executable_factory):
+        first = old_executable_factory.directory('first', 'nd-my-command')
+        second = old_executable_factory.directory('second', 'nd-my-other-command')
+        assert list(load_commands(search_path=first)) == ['nd-my-command']
+        assert list(load_commands(search_path=second)) == ['nd-my-other-command']
+
+    def test_missing_directories_are_indexed(self, old_executable_factory, tmpdir):
+        missing = str(tmpdir.join('missing'))
+        load_commands(search_path=missing)
+
+        with mock.patch.object(index, 'list_executables_in_directory') as list_executables:
+            assert load_commands(search_path=missing) == {}
+        assert not list_executables.called
+
+    def test_corrupt_index_is_ignored(self, old_executable_factory):
+        directory = old_executable_factory.directory('bin', 'nd-my-command')
+        with open(index._get_index_path('nd', directory), 'w') as f:
+            f.write('{not json')
+        assert list(load_commands(search_path=directory)) == ['nd-my-command']
+
+    def test_unwritable_cache_dir_is_ignored(self, old_executable_factory, monkeypatch, tmpdir):
+        cache_file = tmpdir.join('not-a-directory')
+        cache_file.write('')
+        monkeypatch.setenv('BUCKLE_CACHE_DIR', str(cache_file))
+        directory = old_executable_factory.directory('bin', 'nd-my-command')
+        assert list(load_commands(search_path=directory)) == ['nd-my-command']
+
+
+class TestLoadIndex(object):
+    def test_returns_toolbelt_commands(self, old_executable_factory):
+        directory = old_executable_factory.directory(
+            'bin', 'nd-my-command', 'nd-my-namespace~my-command')
+        commands = index.load_index('nd', search_path=directory)
+        assert commands.get('nd-my-command')[1] == os.path.join(directory, 'nd-my-command')
+        assert commands.get('nd-my-namespace')[0] & compiled_index.NAMESPACE
+
+    def test_unchanged_index_is_memory_mapped(self, old_executable_factory):
+        directory = old_executable_factory.directory('bin', 'nd-my-command')
+        index.load_index('nd', search_path=directory)
+
+        with mock.patch.object(index, '_scan_path') as scan_path:
+            commands = index.load_index('nd', search_path=directory)
+        assert not scan_path.called
+        assert [name for name, _, _ in commands.starting_with('nd-')] == ['nd-my-command']
+
+    def test_rebuilt_when_a_directory_changes(self, old_executable_factory, tmpdir):
+        directory = old_executable_factory.directory('bin', 'nd-my-command')
+        index.load_index('nd', search_path=directory)
+
+        tmpdir.join('bin', 'nd-my-new-command').write('')
+        tmpdir.join('bin', 'nd-my-new-command').chmod(0o755)
+        age_directory(directory)
+        commands = index.load_index('nd', search_path=directory)
+        assert [name for name, _, _ in commands.starting_with('nd-')] == [
+            'nd-my-command', 'nd-my-new-command']
+
+    def test_rebuilt_when_corrupt(self, old_executable_factory):
+        directory = old_executable_factory.directory('bin', 'nd-my-command')
+        with open(index.get_compiled_index_path('nd', directory), 'w') as f:
+            f.write('')
+        assert index.load_index('nd', search_path=directory).get('nd-my-command')
+
+    def test_rebuilt_when_a_relative_directory_moves(self, old_executable_factory, monkeypatch):
+        first = old_executable_factory.directory('first', 'nd-my-command')
+        second = old_executable_factory.directory('second')
+        monkeypatch.chdir(first)
+        assert index.load_index('nd', search_path=os.curdir).get('nd-my-command')
+
+        monkeypatch.chdir(second)
+        assert not index.load_index('nd', search_path=os.curdir).get('nd-my-command')
+        assert not index.load_index('nd', search_path='').get('nd-my-command')
+
+    def test_build_index_rescans_every_directory(self, old_executable_factory, tmpdir):
+        directory = old_executable_factory.directory('bin', 'nd-my-command')
+        index.load_index('nd', search_path=directory)
+
+        # Doesn't change the directory's mtime
+        tmpdir.join('bin', 'nd-my-command').chmod(0o644)
+        assert index.load_index('nd', search_path=directory).get('nd-my-command')
+        index.build_index('nd', search_path=directory, rescan=True)
+        assert not index.load_index('nd', search_path=directory).get('nd-my-command')
@@ -0,0 +1,108 @@
+import subprocess
+import time
+
+import pytest  # noqa
+
+from fixtures import readerr, readout  # noqa
+
+from buckle import parallel
+
+
+class TestCheckCallAll:
+    def test_output_grouped_in_order_of_commands(self, readout):
+        with readout() as output:
+            parallel.check_call_all([
+                ['bash', '-c', 'sleep 0.2; echo first; echo first again'],
+                ['bash', '-c', 'echo second; sleep 0.1; echo second again'],
+            ])
+        assert output == 'first\nfirst again\nsecond\nsecond again\n'
+
+    def test_error_output_grouped_in_order_of_commands(self, readerr):
+        with readerr() as errout:
+            parallel.check_call_all([
+                ['bash', '-c', 'sleep 0.2; echo first >&2'],
+                ['bash', '-c', 'echo second >&2'],
+            ])
+        assert errout == 'first\nsecond\n'
+
+    def test_runs_at_the_same_time(self):
+        start = time.time()
+        parallel.check_call_all([['sleep', '0.5']] * 4)
+        assert time.time() - start < 1.5
+
+    def test_first_failure_stops_the_rest(self, tmpdir, readout):
+        finished = tmpdir.join('finished')
+        with readout() as output, pytest.raises(subprocess.CalledProcessError) as exc_info:
+            parallel.check_call_all([
+                ['bash', '-c', 'sleep 1; touch {}'.format(finished)],
+                ['bash', '-c', 'echo failing; exit 3'],
+            ])
+        assert exc_info.value.cmd == ['bash', '-c', 'echo failing; exit 3']
+        assert exc_info.value.returncode == 3
+        assert output == 'failing\n'
+        time.sleep(1.2)
+        assert not finished.check()
+
+    def test_stops_processes_started_by_commands(self, tmpdir):
+        finished = tmpdir.join('finished')
+        with pytest.raises(subprocess.CalledProcessError):
+            parallel.check_call_all([
+                ['bash', '-c', '(sleep 0.5; touch {}) & wait'.format(finished)],
+                ['bash', '-c', 'sleep 0.1; exit 1'],
+            ])
+        time.sleep(0.8)
+        assert not finished.check()
+
+    def test_commands_do_not_read_standard_input(self, readout):
+        with readout() as output:
+            parallel.check_call_all([['cat'], ['cat']])
+        assert output == ''
+
+
+class TestIterOutputs:
+    def test_failed_and_slow_commands_have_no_output(self):
+        assert sorted(parallel.iter_outputs([
+            ['bash', '-c', 'echo failing; exit 1'],
+            ['bash', '-c', 'echo slow; sleep 5'],
+            ['echo', 'fine'],
+        ], 0.5, 3)) == [(0, None), (1, None), (2, b'fine\n')]
+
+    def test_outputs_as_commands_finish(self):
+        assert list(parallel.iter_outputs([
+            ['bash', '-c', 'sleep 0.3; echo first'],
+            ['echo', 'second'],
+        ], 1, 2)) == [(1, b'second\n'), (0, b'first\n')]
+
+    def test_stops_at_deadline(self):
+        start = time.time()
+        assert list(parallel.iter_outputs([
+            ['echo', 'first'],
+            ['sleep', '5'],
+            ['sleep', '5'],
+        ], 10, 2, deadline=time.time() + 0.5)) == [(0, b'first\n')]
+        assert time.time() - start < 1.5
+
+    def test_commands_ignoring_termination_are_killed_at_deadline(self):
+        start = time.time()
+        assert list(parallel.iter_outputs([
+            ['bash', '-c', 'trap "" TERM; sleep 5'],
+        ], 10, 1, deadline=time.time() + 0.2)) == []
+        assert time.time() - start < 0.2 + parallel.TERMINATE_TIMEOUT
+
+    def test_stops_each_command_at_its_deadline(self):
+        assert list(parallel.iter_outputs([
+            ['sleep', '5'],
+            ['bash', '-c', 'sleep 0.5; echo second'],
+        ], 10, 2, deadline=[time.time() + 0.2, None])) == [(1, b'second\n')]
+
+    def test_runs_at_most_max_running(self):
+        start = time.time()
+        list(parallel.iter_outputs([['sleep', '0.3']] * 4, 1, 2))
+        assert 0.6 <= time.time() - start < 1.2
+
+    def test_slow_commands_stopped_with_processes_they_started(self, tmpdir):
+        finished = tmpdir.join('finished')
+        list(parallel.iter_outputs(['(sleep 0.5; touch {}) & wait'.format(finished)], 0.1, 1,
+                                   shell=True))
+        time.sleep(0.8)
+        assert not finished.check()
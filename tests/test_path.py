@@ -59,3 +59,24 @@ class TestSplitPathAndCommand(object):
         executable_factory('nd-my-command-two')
 
         assert split('my-command') == ([], 'my-command', [])
+
+    def test_namespace_with_the_same_name_as_a_command(self, executable_factory):
+        """ A name that is both a command and a namespace is treated as a namespace """
+        executable_factory('nd-my-name')
+        executable_factory('nd-my-name~my-command')
+
+        assert split('my-name') == (['my-name'], None, [])
+        assert split('my-name', 'my-command', 'arg') == (['my-name'], 'my-command', ['arg'])
+
+    def test_deep_namespaces(self, executable_factory):
+        """ Handle commands nested several namespaces deep """
+        executable_factory('nd-a~b~c~d~e~my-command')
+
+        assert split('a', 'b', 'c') == (['a', 'b', 'c'], None, [])
+        assert split('a', 'b', 'c', 'd', 'e', 'my-command', 'arg') == (
+            ['a', 'b', 'c', 'd', 'e'], 'my-command', ['arg'])
+
+        with pytest.raises(path.CommandOrNamespaceNotFound) as e:
+            split('a', 'b', 'missing', 'e', 'my-command')
+        assert e.value.path == ('a', 'b', 'missing')
+
@@ -0,0 +1,130 @@
+import textwrap
+
+import pytest  # noqa
+
+from buckle import static_help
+
+
+@pytest.fixture
+def make_command(tmpdir):
+    """ Factory for a command from its dedented source """
+    def factory(source):
+        location = tmpdir.join('nd-my-command')
+        location.write_binary(textwrap.dedent(source).encode('utf-8'))
+        return str(location)
+    return factory
+
+
+class TestHelpHelper:
+    def test_reads_message(self, make_command):
+        assert static_help.get_description(make_command("""\
+            #!/usr/bin/env bash
+            eval "$(nd _help-helper "My help" 'message')"
+            date""")) == 'My help message'
+
+    def test_message_spacing_matches_help_output(self, make_command):
+        assert static_help.get_description(make_command("""\
+            #!/usr/bin/env bash
+            eval "$(nd _help-helper "My  help message")"
+            """)) == 'My  help message'
+
+    def test_message_with_shell_expansions_is_not_read(self, make_command):
+        assert static_help.get_description(make_command("""\
+            #!/usr/bin/env bash
+            eval "$(nd _help-helper "Runs in $HOME")"
+            """)) is None
+
+    def test_message_with_shell_expansions_is_not_replaced_by_comments(self, make_command):
+        assert static_help.get_description(make_command("""\
+            #!/usr/bin/env bash
+            # My comment
+            eval "$(nd _help-helper "Runs in $HOME")"
+            """)) is None
+
+    def test_preferred_to_comments(self, make_command):
+        assert static_help.get_description(make_command("""\
+            #!/usr/bin/env bash
+            # My comment
+            eval "$(nd _help-helper My help message)"
+            """)) == 'My help message'
+
+
+class TestPython:
+    def test_reads_argparse_description(self, make_command):
+        assert static_help.get_description(make_command('''\
+            #!/usr/bin/env python
+            """ My module docstring """
+            import argparse
+            parser = argparse.ArgumentParser(description="My help message")
+            ''')) == 'My help message'
+
+    def test_reads_module_docstring_used_as_description(self, make_command):
+        assert static_help.get_description(make_command('''\
+            #!/usr/bin/env python3
+            """ My help
+            message
+
+            More details.
+            """
+            from argparse import ArgumentParser
+            ArgumentParser(description=__doc__).parse_args()
+            ''')) == 'My help message'
+
+    def test_reads_module_docstring(self, make_command):
+        assert static_help.get_description(make_command('''\
+            #!/usr/bin/env python
+            """ My help message """
+            print('my output')
+            ''')) == 'My help message'
+
+    def test_description_built_at_run_time_is_not_read(self, make_command):
+        assert static_help.get_description(make_command('''\
+            #!/usr/bin/env python
+            import argparse
+            argparse.ArgumentParser(description='My {} message'.format('help'))
+            ''')) is None
+
+    def test_invalid_python_is_not_read(self, make_command):
+        assert static_help.get_description(make_command('''\
+            #!/usr/bin/env python
+            """ My help message """
+            def (:
+            ''')) is None
+
+    def test_comments_are_not_read(self, make_command):
+        assert static_help.get_description(make_command('''\
+            #!/usr/bin/env python
+            # -*- coding: utf-8 -*-
+            # My comment
+            print('my output')
+            ''')) is None
+
+
+class TestComments:
+    def test_reads_first_paragraph_of_comment_block(self, make_command):
+        assert static_help.get_description(make_command("""\
+            #!/usr/bin/env bash
+
+            # shellcheck disable=SC2034
+            # My help
+            # message
+            #
+            # More details.
+            date""")) == 'My help message'
+
+    def test_without_comments(self, make_command):
+        assert static_help.get_description(make_command("""\
+            #!/usr/bin/env bash
+            set -e
+            # Not a description
+            date""")) is None
+
+
+class TestGetDescription:
+    def test_binary_is_not_read(self, tmpdir):
+        location = tmpdir.join('nd-my-command')
+        location.write_binary(b'\x7fELF\0\0# My comment')
+        assert static_help.get_description(str(location)) is None
+
+    def test_missing_command(self, tmpdir):
+        assert static_help.get_description(str(tmpdir.join('missing'))) is None